@@ -1,172 +1,1329 @@
+import asyncio
 import socket
+import ssl
 import time
 import os
 import threading
-import statistics
 import json
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
+
+from resolver_cache import ResolverCache
+from sample_store import ERROR_MESSAGES, ErrorKind, SampleStore, classify_error
+from streaming_statistics import StreamingStatistics
+from target_sweep import VERDICTS, SweepResult, verdict_for
+from tcp_echo import EchoConnectionPool
+from udp_probe import UDPProber
+
+# Probe engines available to perform_parallel_tests
+ENGINES = ('async', 'thread', 'process')
+
+# Probe types: TCP connect, + TLS handshake, + HTTP request to first byte
+PROBE_TYPES = ('tcp', 'tls', 'http', 'https')
+
+# Family labels used by perform_dual_stack_tests
+FAMILY_NAMES = {socket.AF_INET: 'ipv4', socket.AF_INET6: 'ipv6'}
+
+# RFC 8305 connection attempt delay: how long a Happy Eyeballs client gives IPv6 a head start
+HAPPY_EYEBALLS_DELAY_MS = 250
+
+# TLS sessions kept for resumption; sweeps evict the least recently used target's first
+MAX_TLS_SESSIONS = 10000
+
+def _json_default(obj):
+    """Serialise columnar sample stores as lists of result dicts."""
+    if isinstance(obj, SampleStore):
+        return obj.to_list()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def _elapsed_ms(start_ns, end_ns):
+    """Convert a perf_counter_ns interval to milliseconds."""
+    return (end_ns - start_ns) / 1e6
+
+class ProbeRecorder:
+    """
+    Collects the probe outcomes of one test run.
+    
+    Every outcome feeds the overall StreamingStatistics accumulator and one
+    accumulator per measured phase (e.g. ``dns``, ``connect``, ``tls``,
+    ``ttfb``); the columnar SampleStore is only filled when per-probe results
+    are kept. TLS session resumption is counted when probes report it. When a
+    ResultLogWriter or HistoryStore is attached, every outcome is passed to
+    it as it arrives, and so is every listener callable.
+    """
+    def __init__(self, keep_samples=True, target=None, result_log=None, history_store=None, listeners=()):
+        self.keep_samples = keep_samples
+        self.target = target
+        self.result_log = result_log
+        self.history_store = history_store
+        self.listeners = listeners  # callables (target, latency_ms, error_kind, error, phases)
+        self.samples = SampleStore()
+        self.accumulator = StreamingStatistics()
+        self.phase_accumulators = {}  # phase name -> StreamingStatistics
+        self.tls_handshakes = 0
+        self.tls_resumed = 0
+        
+    def record(self, latency_ms, error_kind, error, phases=None, tls_resumed=None):
+        """Record one probe outcome as returned by the probe methods."""
+        if error_kind == ErrorKind.NONE:
+            self.accumulator.add(latency_ms)
+        else:
+            self.accumulator.add_failure()
+        self._record_phases(phases)
+        if tls_resumed is not None:
+            self.tls_handshakes += 1
+            self.tls_resumed += tls_resumed
+        if self.keep_samples:
+            self.samples.append(latency_ms, error_kind, error, phases=phases)
+        if self.result_log is not None:
+            self.result_log.record_probe(self.target, latency_ms, error_kind, error, phases)
+        if self.history_store is not None:
+            self.history_store.record_probe(self.target, latency_ms, error_kind, error, phases)
+        for listener in self.listeners:
+            listener(self.target, latency_ms, error_kind, error, phases)
+            
+    def record_result(self, result):
+        """Record a perform_single_test style result dict."""
+        self.accumulator.add_result(result)
+        self._record_phases({key[:-3]: value for key, value in result.items()
+                             if key.endswith('_ms') and key not in ('latency_ms', 'rtt_ms')})
+        if result.get('tls_resumed') is not None:
+            self.tls_handshakes += 1
+            self.tls_resumed += result['tls_resumed']
+        if self.keep_samples:
+            self.samples.append_result(result)
+            
+    def _record_phases(self, phases):
+        for name, duration_ms in (phases or {}).items():
+            if duration_ms is not None:
+                if name not in self.phase_accumulators:
+                    self.phase_accumulators[name] = StreamingStatistics()
+                self.phase_accumulators[name].add(duration_ms)
+                
+    def merge(self, other):
+        """Combine the aggregates of another recorder (samples are not merged)."""
+        self.accumulator.merge(other.accumulator)
+        for name, accumulator in other.phase_accumulators.items():
+            if name not in self.phase_accumulators:
+                self.phase_accumulators[name] = StreamingStatistics()
+            self.phase_accumulators[name].merge(accumulator)
+        self.tls_handshakes += other.tls_handshakes
+        self.tls_resumed += other.tls_resumed
+        return self
+        
+    def to_state(self):
+        """Return the aggregates as a compact picklable dict, without samples."""
+        return {
+            'accumulator': self.accumulator.to_state(),
+            'phases': {name: accumulator.to_state() for name, accumulator in self.phase_accumulators.items()},
+            'tls_handshakes': self.tls_handshakes,
+            'tls_resumed': self.tls_resumed,
+        }
+        
+    @classmethod
+    def from_state(cls, state, target=None):
+        """Rebuild a sample-less recorder from to_state output."""
+        recorder = cls(keep_samples=False, target=target)
+        recorder.accumulator = StreamingStatistics.from_state(state['accumulator'])
+        recorder.phase_accumulators = {
+            name: StreamingStatistics.from_state(phase_state) for name, phase_state in state['phases'].items()
+        }
+        recorder.tls_handshakes = state['tls_handshakes']
+        recorder.tls_resumed = state['tls_resumed']
+        return recorder
+
+def _relative_half_width(interval, estimate):
+    """Half the width of a confidence interval relative to its estimate (inf when undefined)."""
+    if interval is None or not estimate:
+        return float('inf')
+    return (interval[1] - interval[0]) / 2 / estimate
+
+def _split_count(total, parts):
+    """Split ``total`` into at most ``parts`` near-equal positive counts."""
+    parts = max(1, min(parts, total))
+    return [total // parts + (1 if index < total % parts else 0) for index in range(parts)]
+
+def _probe_shard(settings, shards):
+    """
+    Worker-process entry point for the process engine.
+    
+    Builds a sample-less tester from ``settings``, probes every shard on one
+    event loop and returns only the recorder aggregates.
+    
+    Args:
+        settings (dict): AdvancedLatencyTester keyword arguments plus an
+            optional picklable ``ssl_context_factory``
+        shards (list): (key, host, port, num_tests, timeout, probe) tuples
+        
+    Returns:
+        list: (key, ProbeRecorder state) pairs, one per shard
+    """
+    settings = dict(settings)
+    ssl_context_factory = settings.pop('ssl_context_factory', None)
+    tester = AdvancedLatencyTester(keep_individual_results=False,
+                                   ssl_context=ssl_context_factory() if ssl_context_factory else None,
+                                   **settings)
+    in_flight = max(1, tester.max_in_flight // len(shards))
+    
+    async def run_shards():
+        recorders = [ProbeRecorder(keep_samples=False, target=f"{host}:{port}")
+                     for _, host, port, _, _, _ in shards]
+        await asyncio.gather(*(
+            tester._drive_async(recorder, host, port, num_tests, timeout, in_flight, probe)
+            for recorder, (_, host, port, num_tests, timeout, probe) in zip(recorders, shards)
+        ))
+        return recorders
+    
+    recorders = asyncio.run(run_shards())
+    return [(shard[0], recorder.to_state()) for shard, recorder in zip(shards, recorders)]
 
 class AdvancedLatencyTester:
-    def __init__(self, max_workers=15):
+    def __init__(self, max_workers=15, max_in_flight=1000, engine='async', keep_individual_results=True,
+                 history_limit=1000, resolver=None, ssl_context=None, tls_session_reuse=False,
+                 http_path='/', result_log=None, processes=None, ssl_context_factory=None, metrics=None,
+                 history_store=None, circuit_breaker=None, address_family=socket.AF_INET):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
         self.results = {}  # Dictionary to store comprehensive test results
-        self.test_history = []  # List to store historical test data
+        self.test_history = deque(maxlen=history_limit)  # Most recent test records (None keeps all)
         self.max_workers = max_workers  # Maximum threads for parallel testing
+        self.max_in_flight = max_in_flight  # Maximum concurrent probes for the async engine
+        self.engine = engine  # Default engine used by perform_parallel_tests
+        self.keep_individual_results = keep_individual_results  # Retain per-probe results in statistics
+        self.resolver = resolver or ResolverCache()  # Shared name resolution cache
+        if ssl_context is None:
+            ssl_context = ssl_context_factory() if ssl_context_factory else ssl.create_default_context()
+        self.ssl_context = ssl_context  # Used by tls/https probes
+        self.tls_session_reuse = tls_session_reuse  # Resume the last TLS session per target
+        self.http_path = http_path  # Request path for http/https probes
+        self._tls_sessions = {}  # (host, port) -> ssl.SSLSession from the last handshake, oldest first
+        self._tls_sessions_lock = threading.Lock()  # Guards _tls_sessions eviction across probe threads
+        self.result_log = result_log  # ResultLogWriter receiving every probe as it completes
+        self.processes = processes or os.cpu_count() or 1  # Worker processes for the process engine
+        self.ssl_context_factory = ssl_context_factory  # Picklable callable building worker SSL contexts
+        self.metrics = metrics  # LatencyTesterMetrics updated on the hot paths (None disables instrumentation)
+        self.history_store = history_store  # HistoryStore persisting probes and run summaries
+        self.listeners = []  # callables (target, latency_ms, error_kind, error, phases) fed every probe
+        self.circuit_breaker = circuit_breaker  # CircuitBreaker short-circuiting unresponsive targets
+        self.address_family = address_family  # Family probes resolve names in (AF_UNSPEC uses the resolver's first)
+        self._echo_pools = {}  # (host, port) -> EchoConnectionPool kept open between echo runs
         
-    def perform_single_test(self, host, port, timeout=5):
+    def perform_single_test(self, host, port, timeout=5, probe='tcp'):
         """
         Perform a single latency test and return detailed metrics.
         
+        Phases are timed with the monotonic ``time.perf_counter_ns`` clock.
+        ``latency_ms`` covers every phase after name resolution; each phase
+        is also reported as ``<phase>_ms``.
+        
         Args:
             host (str): Target hostname or IP address
             port (int): Target port number
             timeout (int): Connection timeout in seconds
+            probe (str): 'tcp', 'tls', 'http' or 'https'
             
         Returns:
             dict: Detailed test results including RTT, success status, and timestamp
         """
-        try:
-            client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            client_socket.settimeout(timeout)
+        self._check_probe_type(probe)
+        with self._timed('perform_single_test'):
+            outcome = self._probe(host, port, timeout, probe)
+            with self._timed('result_dict'):
+                return self._result_dict(*outcome)
+
+    async def perform_single_test_async(self, host, port, timeout=5, probe='tcp'):
+        """
+        Perform a single latency test using non-blocking sockets.
+        
+        The socket is driven by the running event loop, so no thread is held
+        while the handshake is outstanding.
+        
+        Args:
+            host (str): Target hostname or IP address
+            port (int): Target port number
+            timeout (int): Connection timeout in seconds
+            probe (str): 'tcp', 'tls', 'http' or 'https'
             
-            start_time = time.time()
-            client_socket.connect((host, port))
-            end_time = time.time()
+        Returns:
+            dict: Detailed test results in the same shape as perform_single_test
+        """
+        self._check_probe_type(probe)
+        outcome = await self._probe_async(host, port, timeout, probe)
+        with self._timed('result_dict'):
+            return self._result_dict(*outcome)
+
+    @staticmethod
+    def _check_probe_type(probe):
+        if probe not in PROBE_TYPES:
+            raise ValueError(f"Unknown probe type '{probe}', expected one of {PROBE_TYPES}")
+
+    def _timed(self, call):
+        """Context manager timing ``call`` into self.metrics, or a no-op without metrics."""
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.timed(call)
+
+    def _family_for(self, host):
+        """Address family to resolve ``host`` in; IPv6 literals always resolve as IPv6."""
+        return socket.AF_UNSPEC if ':' in host else self.address_family
+
+    def _http_request(self, host):
+        if ':' in host:
+            host = f"[{host}]"
+        return (f"GET {self.http_path} HTTP/1.1\r\nHost: {host}\r\n"
+                f"User-Agent: AdvancedLatencyTester\r\nConnection: close\r\n\r\n").encode('ascii')
+
+    def _probe(self, host, port, timeout, probe='tcp'):
+        """
+        Run one blocking probe against the cached address of ``host``.
+        
+        With a circuit breaker attached, probes of a target whose circuit is
+        open fail at once with ErrorKind.CIRCUIT_OPEN, and the timeout may be
+        shortened from the target's observed latency.
+        
+        Returns:
+            tuple: (latency_ms, ErrorKind, error message or None, phases dict,
+            TLS session reused flag or None)
+        """
+        breaker = self.circuit_breaker
+        if breaker is not None:
+            target = f"{host}:{port}"
+            allowed = breaker.allow(target)
+            if not allowed:
+                return self._short_circuit(probe)
+            timeout = breaker.timeout_for(target, timeout)
+        if self.metrics is None:
+            outcome = self._run_probe(host, port, timeout, probe)
+        else:
+            started = self.metrics.probe_started()
+            outcome = self._run_probe(host, port, timeout, probe)
+            self.metrics.probe_finished(probe, outcome, started)
+        if breaker is not None:
+            breaker.record(target, outcome[0], outcome[1], allowed)
+        return outcome
+
+    def _short_circuit(self, probe):
+        """Outcome of a probe skipped because its target's circuit is open."""
+        if self.metrics is not None:
+            self.metrics.probes.inc(probe, 'circuit_open')
+        return None, ErrorKind.CIRCUIT_OPEN, ERROR_MESSAGES[ErrorKind.CIRCUIT_OPEN], {}, None
+
+    def _run_probe(self, host, port, timeout, probe):
+        phases = {}
+        tls_resumed = None
+        try:
+            resolve_start = time.perf_counter_ns()
+            family, address = self.resolver.resolve(host, port, self._family_for(host))[0]
+            phases['dns'] = _elapsed_ms(resolve_start, time.perf_counter_ns())
             
-            latency_ms = (end_time - start_time) * 1000
-            client_socket.close()
+            stream = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                stream.settimeout(timeout)
+                
+                start_time = time.perf_counter_ns()
+                stream.connect(address)
+                mark = time.perf_counter_ns()
+                phases['connect'] = _elapsed_ms(start_time, mark)
+                
+                if probe in ('tls', 'https'):
+                    stream = self.ssl_context.wrap_socket(
+                        stream, server_hostname=host, do_handshake_on_connect=False,
+                        session=self._tls_sessions.get((host, port)) if self.tls_session_reuse else None)
+                    stream.do_handshake()
+                    handshake_done = time.perf_counter_ns()
+                    phases['tls'] = _elapsed_ms(mark, handshake_done)
+                    tls_resumed = stream.session_reused
+                    mark = handshake_done
+                
+                if probe in ('http', 'https'):
+                    stream.sendall(self._http_request(host))
+                    if not stream.recv(1):
+                        raise ConnectionResetError("Connection closed before first byte")
+                    first_byte = time.perf_counter_ns()
+                    phases['ttfb'] = _elapsed_ms(mark, first_byte)
+                    mark = first_byte
+                
+                if tls_resumed is not None and self.tls_session_reuse:
+                    # Read after the request so TLS 1.3 session tickets have been processed
+                    self._remember_tls_session(host, port, stream.session)
+            finally:
+                stream.close()
             
-            return {
-                'success': True,
-                'latency_ms': latency_ms,
-                'rtt_ms': latency_ms,  # RTT is same as latency for TCP connections
-                'timestamp': datetime.now().isoformat(),
-                'error': None
-            }
+            return _elapsed_ms(start_time, mark), ErrorKind.NONE, None, phases, tls_resumed
             
         except socket.timeout:
-            return {
-                'success': False,
-                'latency_ms': float('inf'),
-                'rtt_ms': float('inf'),
-                'timestamp': datetime.now().isoformat(),
-                'error': 'Connection timeout'
-            }
+            return float('inf'), ErrorKind.TIMEOUT, 'Connection timeout', phases, tls_resumed
         except Exception as e:
-            return {
-                'success': False,
-                'latency_ms': None,
-                'rtt_ms': None,
-                'timestamp': datetime.now().isoformat(),
-                'error': str(e)
-            }
+            return None, classify_error(e), str(e), phases, tls_resumed
+
+    async def _probe_async(self, host, port, timeout, probe='tcp', resolved=None):
+        """
+        Run one non-blocking probe against the cached address of ``host``.
+        
+        TLS is driven through an ssl.SSLObject and memory BIOs so the
+        handshake and first-byte wait stay on the event loop. The circuit
+        breaker applies as in _probe. Pass ``resolved`` as a (family,
+        sockaddr) pair to probe one specific address of ``host``.
+        
+        Returns:
+            tuple: (latency_ms, ErrorKind, error message or None, phases dict,
+            TLS session reused flag or None)
+        """
+        breaker = self.circuit_breaker
+        if breaker is not None:
+            target = f"{host}:{port}" if resolved is None else f"{host}:{port}@{resolved[1][0]}"
+            allowed = breaker.allow(target)
+            if not allowed:
+                return self._short_circuit(probe)
+            timeout = breaker.timeout_for(target, timeout)
+        started = None if self.metrics is None else self.metrics.probe_started()
+        try:
+            outcome = await self._run_probe_async(host, port, timeout, probe, resolved)
+        except asyncio.CancelledError:
+            if started is not None:
+                self.metrics.probes_in_flight.dec()
+            if breaker is not None:
+                breaker.release(target, allowed)
+            raise
+        if started is not None:
+            self.metrics.probe_finished(probe, outcome, started)
+        if breaker is not None:
+            breaker.record(target, outcome[0], outcome[1], allowed)
+        return outcome
+
+    async def _run_probe_async(self, host, port, timeout, probe, resolved=None):
+        loop = asyncio.get_running_loop()
+        phases = {}
+        tls_state = {'resumed': None}
+        client_socket = None
+        try:
+            if resolved is None:
+                resolve_start = time.perf_counter_ns()
+                family, address = (await self.resolver.resolve_async(host, port, self._family_for(host)))[0]
+                phases['dns'] = _elapsed_ms(resolve_start, time.perf_counter_ns())
+            else:
+                family, address = resolved
+            
+            client_socket = socket.socket(family, socket.SOCK_STREAM)
+            client_socket.setblocking(False)
+            
+            start_time = time.perf_counter_ns()
+            end_time = await asyncio.wait_for(
+                self._exchange_async(loop, client_socket, address, host, port, probe, phases, tls_state),
+                timeout)
+            
+            return _elapsed_ms(start_time, end_time), ErrorKind.NONE, None, phases, tls_state['resumed']
+            
+        except asyncio.TimeoutError as e:
+            # Drop tracebacks now: they hold event loop frames in reference cycles that
+            # would otherwise pile up until the next full garbage collection
+            e.__traceback__ = None
+            return float('inf'), ErrorKind.TIMEOUT, 'Connection timeout', phases, tls_state['resumed']
+        except Exception as e:
+            e.__traceback__ = None
+            return None, classify_error(e), str(e), phases, tls_state['resumed']
+        finally:
+            if client_socket is not None:
+                client_socket.close()
 
-    def perform_parallel_tests(self, host, port, num_tests=10, timeout=5):
+    async def _exchange_async(self, loop, client_socket, address, host, port, probe, phases, tls_state):
+        """Connect and run the TLS/HTTP phases of an async probe; returns the end time in ns."""
+        start_time = time.perf_counter_ns()
+        await loop.sock_connect(client_socket, address)
+        mark = time.perf_counter_ns()
+        phases['connect'] = _elapsed_ms(start_time, mark)
+        
+        tls_object = None
+        if probe in ('tls', 'https'):
+            incoming, outgoing = ssl.MemoryBIO(), ssl.MemoryBIO()
+            tls_object = self.ssl_context.wrap_bio(
+                incoming, outgoing, server_hostname=host,
+                session=self._tls_sessions.get((host, port)) if self.tls_session_reuse else None)
+            while True:
+                try:
+                    tls_object.do_handshake()
+                    break
+                except ssl.SSLWantReadError:
+                    await self._tls_flush(loop, client_socket, outgoing)
+                    await self._tls_fill(loop, client_socket, incoming)
+            await self._tls_flush(loop, client_socket, outgoing)
+            handshake_done = time.perf_counter_ns()
+            phases['tls'] = _elapsed_ms(mark, handshake_done)
+            tls_state['resumed'] = tls_object.session_reused
+            mark = handshake_done
+        
+        if probe in ('http', 'https'):
+            request = self._http_request(host)
+            if tls_object is None:
+                await loop.sock_sendall(client_socket, request)
+                if not await loop.sock_recv(client_socket, 1):
+                    raise ConnectionResetError("Connection closed before first byte")
+            else:
+                tls_object.write(request)
+                await self._tls_flush(loop, client_socket, outgoing)
+                while True:
+                    try:
+                        if not tls_object.read(1):
+                            raise ConnectionResetError("Connection closed before first byte")
+                        break
+                    except ssl.SSLWantReadError:
+                        await self._tls_fill(loop, client_socket, incoming)
+            first_byte = time.perf_counter_ns()
+            phases['ttfb'] = _elapsed_ms(mark, first_byte)
+            mark = first_byte
+        
+        if tls_object is not None and self.tls_session_reuse:
+            self._remember_tls_session(host, port, tls_object.session)
+        return mark
+
+    def _remember_tls_session(self, host, port, session):
+        """Keep ``session`` for resumption, evicting the least recently used target past MAX_TLS_SESSIONS."""
+        key = (host, port)
+        with self._tls_sessions_lock:
+            self._tls_sessions.pop(key, None)
+            if len(self._tls_sessions) >= MAX_TLS_SESSIONS:
+                del self._tls_sessions[next(iter(self._tls_sessions))]
+            self._tls_sessions[key] = session
+
+    @staticmethod
+    async def _tls_flush(loop, client_socket, outgoing):
+        data = outgoing.read()
+        if data:
+            await loop.sock_sendall(client_socket, data)
+
+    @staticmethod
+    async def _tls_fill(loop, client_socket, incoming):
+        data = await loop.sock_recv(client_socket, 65536)
+        if not data:
+            raise ConnectionResetError("Connection closed during TLS exchange")
+        incoming.write(data)
+
+    @staticmethod
+    def _result_dict(latency_ms, error_kind, error, phases=None, tls_resumed=None):
+        """Build the public per-probe result dict from a probe outcome."""
+        result = {
+            'success': error_kind == ErrorKind.NONE,
+            'latency_ms': latency_ms,
+            'rtt_ms': latency_ms,  # RTT is same as latency for TCP connections
+            'timestamp': datetime.now().isoformat(),
+            'error': error
+        }
+        for name, duration_ms in (phases or {}).items():
+            result[f'{name}_ms'] = duration_ms
+        if tls_resumed is not None:
+            result['tls_resumed'] = tls_resumed
+        return result
+
+    async def perform_async_tests(self, host, port, num_tests=10, timeout=5, max_in_flight=None,
+                                  probe='tcp'):
+        """
+        Perform multiple latency tests concurrently on the running event loop.
+        
+        A fixed pool of worker coroutines pulls probe slots from a shared
+        counter, so at most ``max_in_flight`` connects are outstanding and
+        memory does not depend on ``num_tests``. Each in-flight probe holds a
+        file descriptor, so the limit must stay below the process fd limit.
+        Results feed a ProbeRecorder as they finish.
+        
+        Args:
+            host (str): Target hostname or IP address
+            port (int): Target port number
+            num_tests (int): Number of tests to perform
+            timeout (int): Connection timeout in seconds
+            max_in_flight (int): Concurrent probe limit (defaults to self.max_in_flight)
+            probe (str): 'tcp', 'tls', 'http' or 'https'
+            
+        Returns:
+            dict: Comprehensive test statistics
+        """
+        self._check_probe_type(probe)
+        recorder = ProbeRecorder(self.keep_individual_results, f"{host}:{port}", self.result_log,
+                                 self.history_store, self.listeners)
+        await self._drive_async(recorder, host, port, num_tests, timeout, max_in_flight, probe)
+        return self.calculate_statistics(recorder.samples, recorder)
+
+    async def _drive_async(self, recorder, host, port, num_tests, timeout, max_in_flight, probe):
+        """Feed ``num_tests`` probe outcomes into ``recorder`` from a pool of worker coroutines."""
+        max_in_flight = max_in_flight or self.max_in_flight
+        remaining = iter(range(num_tests))
+        
+        async def worker():
+            # All workers share one iterator, so every slot is probed exactly once
+            for _ in remaining:
+                outcome = await self._probe_async(host, port, timeout, probe)
+                recorder.record(*outcome)
+        
+        await asyncio.gather(*(worker() for _ in range(min(max_in_flight, num_tests))))
+
+    async def perform_adaptive_tests_async(self, host, port, relative_error=0.05, percentile=0.95,
+                                           confidence=0.95, max_probes=1000, deadline=None, timeout=5,
+                                           probe='tcp', wave_size=10, min_probes=20):
+        """
+        Probe in waves until the latency estimate is precise enough.
+        
+        Probes are sent in waves with at most ``wave_size`` in flight, so the
+        target is never loaded harder than that. After each wave, confidence
+        intervals for the mean and for the ``percentile`` quantile are updated.
+        Probing stops as soon as both half-widths are within ``relative_error`` of their
+        estimates (after at least ``min_probes`` probes), once ``max_probes``
+        probes are used, once ``deadline`` seconds have passed (checked between
+        waves), or when the first ``min_probes`` probes all failed. Interval
+        widths shrink with the square root of the sample count, so each new
+        wave is sized to reach the target from the current width, at most
+        doubling the probes used so far. While too few samples exist for a
+        percentile interval at all (73 for p95 at 95% confidence) the probes
+        used so far are doubled. A stable target therefore stops after
+        about a hundred probes and only noisy ones use their whole budget.
+        Percentile intervals are read from the 1% histogram, so
+        ``relative_error`` should stay above 0.01.
+        
+        Args:
+            host (str): Target hostname or IP address
+            port (int): Target port number
+            relative_error (float): Target half-width of both intervals, relative to the estimate
+            percentile (float): Quantile whose interval must converge besides the mean (0-1)
+            confidence (float): Confidence level of the intervals
+            max_probes (int): Probe budget
+            deadline (float): Seconds after which no new wave is started (None for no limit)
+            timeout (int): Connection timeout in seconds
+            probe (str): 'tcp', 'tls', 'http' or 'https'
+            wave_size (int): Smallest number of probes per wave
+            min_probes (int): Probes sent before convergence is first checked
+            
+        Returns:
+            dict: Comprehensive test statistics plus an ``adaptive`` section with
+            ``probes_used``, ``stop_reason`` ('converged', 'budget', 'deadline'
+            or 'no_successes') and the final intervals
+        """
+        self._check_probe_type(probe)
+        if not 0 < relative_error < 1:
+            raise ValueError("relative_error must be between 0 and 1")
+        recorder = ProbeRecorder(self.keep_individual_results, f"{host}:{port}", self.result_log,
+                                 self.history_store, self.listeners)
+        accumulator = recorder.accumulator
+        start = time.perf_counter()
+        stop_reason = 'budget'
+        wave = wave_size
+        
+        while accumulator.total_tests < max_probes:
+            if deadline is not None and time.perf_counter() - start >= deadline:
+                stop_reason = 'deadline'
+                break
+            await self._drive_async(recorder, host, port, min(wave, max_probes - accumulator.total_tests),
+                                    timeout, wave_size, probe)
+            if accumulator.total_tests < min_probes:
+                continue
+            if not accumulator.count:
+                stop_reason = 'no_successes'
+                break
+            error = max(
+                _relative_half_width(accumulator.mean_interval(confidence), accumulator.mean),
+                _relative_half_width(accumulator.percentile_interval(percentile, confidence),
+                                     accumulator.percentile(percentile)))
+            if error <= relative_error:
+                stop_reason = 'converged'
+                break
+            # An undefined interval (too few samples for the percentile bounds) doubles the probes
+            needed = accumulator.count * (error / relative_error) ** 2
+            wave = int(max(wave_size, min(needed - accumulator.count, accumulator.total_tests)))
+        
+        mean_interval = accumulator.mean_interval(confidence)
+        percentile_interval = accumulator.percentile_interval(percentile, confidence)
+        stats = self.calculate_statistics(recorder.samples, recorder)
+        stats['adaptive'] = {
+            'probes_used': accumulator.total_tests,
+            'stop_reason': stop_reason,
+            'relative_error_target': relative_error,
+            'confidence': confidence,
+            'mean_interval_ms': mean_interval,
+            'mean_relative_error': _relative_half_width(mean_interval, accumulator.mean),
+            'percentile': percentile,
+            'percentile_ms': accumulator.percentile(percentile),
+            'percentile_interval_ms': percentile_interval,
+            'percentile_relative_error': _relative_half_width(percentile_interval,
+                                                              accumulator.percentile(percentile)),
+            'duration_s': time.perf_counter() - start,
+        }
+        return stats
+
+    def perform_adaptive_tests(self, host, port, relative_error=0.05, percentile=0.95, confidence=0.95,
+                               max_probes=1000, deadline=None, timeout=5, probe='tcp', wave_size=10,
+                               min_probes=20):
+        """
+        Run perform_adaptive_tests_async to completion from synchronous code.
+        
+        Example: ``perform_adaptive_tests(host, 443, relative_error=0.02, max_probes=2000, deadline=30)``
+        
+        Returns:
+            dict: Comprehensive test statistics with an ``adaptive`` section
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.perform_adaptive_tests_async(
+                host, port, relative_error, percentile, confidence, max_probes, deadline, timeout, probe,
+                wave_size, min_probes))
+        raise RuntimeError("An event loop is already running; await perform_adaptive_tests_async instead")
+
+    def perform_parallel_tests(self, host, port, num_tests=10, timeout=5, engine=None, probe='tcp',
+                               relative_error=None):
+        """
+        Perform multiple latency tests in parallel.
+        
+        The async engine keeps up to ``self.max_in_flight`` non-blocking
+        connects outstanding on one event loop. The thread engine runs blocking
+        connects on a pool of ``self.max_workers`` threads. The process engine
+        splits the probes across ``self.processes`` worker processes (see
+        perform_sharded_tests). When called from inside a running event loop
+        (e.g. a notebook) the async engine falls back to the thread engine;
+        await perform_async_tests directly there instead.
+        
+        With ``relative_error`` set, probing is adaptive instead: ``num_tests``
+        becomes the probe budget of perform_adaptive_tests, which stops early
+        once the mean and p95 are known to that relative precision. Adaptive
+        waves only run on the async engine; inside a running event loop they
+        run on a helper thread with its own loop.
+        
+        Args:
+            host (str): Target hostname or IP address
+            port (int): Target port number
+            num_tests (int): Number of tests to perform
+            timeout (int): Connection timeout in seconds
+            engine (str): 'async', 'thread' or 'process' (defaults to self.engine)
+            probe (str): 'tcp', 'tls', 'http' or 'https'
+            relative_error (float): Stop early at this precision (async probes only)
+            
+        Returns:
+            dict: Comprehensive test statistics
+        """
+        engine = engine or self.engine
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+        
+        if relative_error is not None and engine != 'async':
+            raise ValueError(f"Adaptive sampling runs on the async engine, not '{engine}'")
+        
+        with self._timed('perform_parallel_tests'):
+            if relative_error is not None:
+                adaptive = self.perform_adaptive_tests_async(host, port, relative_error, max_probes=num_tests,
+                                                             timeout=timeout, probe=probe)
+                try:
+                    asyncio.get_running_loop()
+                except RuntimeError:
+                    return asyncio.run(adaptive)
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    return executor.submit(asyncio.run, adaptive).result()
+            
+            if engine == 'process':
+                return self.perform_sharded_tests([(host, port)], num_tests, timeout, probe=probe)[f"{host}:{port}"]
+            
+            if engine == 'async':
+                try:
+                    asyncio.get_running_loop()
+                except RuntimeError:
+                    return asyncio.run(self.perform_async_tests(host, port, num_tests, timeout, probe=probe))
+            
+            return self.perform_threaded_tests(host, port, num_tests, timeout, probe)
+
+    def perform_threaded_tests(self, host, port, num_tests=10, timeout=5, probe='tcp'):
         """
         Perform multiple latency tests in parallel using threading.
         
+        At most twice ``max_workers`` probes are queued at once and results
+        feed a ProbeRecorder as they complete.
+        
         Args:
             host (str): Target hostname or IP address
             port (int): Target port number
             num_tests (int): Number of tests to perform
             timeout (int): Connection timeout in seconds
+            probe (str): 'tcp', 'tls', 'http' or 'https'
             
         Returns:
             dict: Comprehensive test statistics
         """
-        test_results = []
+        self._check_probe_type(probe)
+        recorder = ProbeRecorder(self.keep_individual_results, f"{host}:{port}", self.result_log,
+                                 self.history_store, self.listeners)
+        remaining = iter(range(num_tests))
         
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Submit all test tasks
-            future_to_test = {
-                executor.submit(self.perform_single_test, host, port, timeout): i 
-                for i in range(num_tests)
+            # Keep a bounded window of submitted tasks instead of one future per test
+            pending = {
+                executor.submit(self._probe, host, port, timeout, probe)
+                for _ in islice(remaining, self.max_workers * 2)
             }
             
-            # Collect results as they complete
-            for future in as_completed(future_to_test):
-                test_id = future_to_test[future]
-                try:
-                    result = future.result()
-                    test_results.append(result)
-                except Exception as e:
-                    test_results.append({
-                        'success': False,
-                        'latency_ms': None,
-                        'rtt_ms': None,
-                        'timestamp': datetime.now().isoformat(),
-                        'error': str(e)
-                    })
+            # Collect results as they complete and top the window back up
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        outcome = future.result()
+                    except Exception as e:
+                        outcome = (None, ErrorKind.OTHER, str(e), None)
+                    recorder.record(*outcome)
+                for _ in islice(remaining, len(done)):
+                    pending.add(executor.submit(self._probe, host, port, timeout, probe))
+                if self.metrics is not None:
+                    self.metrics.executor_queue_depth.set(max(0, len(pending) - self.max_workers))
         
-        return self.calculate_statistics(test_results)
+        return self.calculate_statistics(recorder.samples, recorder)
 
-    def calculate_statistics(self, test_results):
+    def perform_sharded_tests(self, targets, num_tests=10, timeout=5, processes=None, probe='tcp'):
         """
-        Calculate comprehensive statistics from test results.
+        Probe many targets from a pool of worker processes.
+        
+        Each target's probes are split into shards of at most
+        ``ceil(total probes / processes)`` and the shards are spread over the
+        workers so every process gets a similar share. Each worker runs its
+        shards on its own event loop with up to ``self.max_in_flight`` probes in
+        flight and sends back only mergeable StreamingStatistics aggregates, not
+        per-probe results, so ``individual_results`` is empty and no result log
+        is written. SSL contexts cannot be pickled, so workers build theirs
+        with ``self.ssl_context_factory`` (a module-level callable) or fall back
+        to ``ssl.create_default_context()``.
         
         Args:
-            test_results (list): List of individual test results
+            targets (list): (host, port) pairs
+            num_tests (int): Number of tests per target
+            timeout (int): Connection timeout in seconds
+            processes (int): Worker processes (defaults to self.processes)
+            probe (str): 'tcp', 'tls', 'http' or 'https'
             
         Returns:
-            dict: Comprehensive statistics including jitter, packet loss, etc.
+            dict: {"host:port": comprehensive test statistics}
         """
-        successful_tests = [r for r in test_results if r['success']]
-        failed_tests = [r for r in test_results if not r['success']]
+        self._check_probe_type(probe)
+        processes = processes or self.processes
+        targets = [(host, int(port)) for host, port in targets]
+        keys = [f"{host}:{port}" for host, port in targets]
         
-        latencies = [r['latency_ms'] for r in successful_tests]
+        # Cut every target into shards, then hand the largest shards out first
+        # to the least loaded worker
+        total = num_tests * len(targets)
+        shard_limit = max(1, -(-total // processes))
+        shards = [
+            (key, host, port, count, timeout, probe)
+            for key, (host, port) in zip(keys, targets)
+            for count in _split_count(num_tests, -(-num_tests // shard_limit))
+        ]
+        assignments = [[] for _ in range(min(processes, len(shards)))]
+        loads = [0] * len(assignments)
+        for shard in sorted(shards, key=lambda shard: -shard[3]):
+            worker = loads.index(min(loads))
+            assignments[worker].append(shard)
+            loads[worker] += shard[3]
         
-        # Calculate basic statistics
-        stats = {
-            'total_tests': len(test_results),
-            'successful_tests': len(successful_tests),
-            'failed_tests': len(failed_tests),
-            'packet_loss_percentage': (len(failed_tests) / len(test_results)) * 100 if test_results else 0,
-            'test_timestamp': datetime.now().isoformat()
+        settings = {
+            'max_in_flight': self.max_in_flight,
+            'tls_session_reuse': self.tls_session_reuse,
+            'http_path': self.http_path,
+            'ssl_context_factory': self.ssl_context_factory,
+            'address_family': self.address_family,
         }
+        recorders = {key: ProbeRecorder(keep_samples=False, target=key) for key in keys}
+        with ProcessPoolExecutor(max_workers=len(assignments)) as executor:
+            for partials in executor.map(_probe_shard, [settings] * len(assignments), assignments):
+                for key, state in partials:
+                    recorders[key].merge(ProbeRecorder.from_state(state))
         
-        if successful_tests:
-            stats.update({
-                'average_latency_ms': statistics.mean(latencies),
-                'min_latency_ms': min(latencies),
-                'max_latency_ms': max(latencies),
-                'median_latency_ms': statistics.median(latencies),
-                'std_dev_latency_ms': statistics.stdev(latencies) if len(latencies) > 1 else 0,
-            })
+        return {key: self.calculate_statistics([], recorder) for key, recorder in recorders.items()}
+
+    async def perform_dual_stack_tests_async(self, host, port, num_tests=10, timeout=5, probe='tcp',
+                                             max_in_flight=None):
+        """
+        Probe every IPv4 and IPv6 address of ``host`` side by side.
+        
+        ``host`` is resolved in all address families. Each round probes every
+        address at the same moment, Happy Eyeballs style, so all families see
+        the same network conditions. Rounds run concurrently up to
+        ``max_in_flight`` probes. Each address gets its own statistics (its
+        probes are logged as ``host:port@address``) and each family gets the
+        merged statistics of its addresses. The comparison section reports:
+        
+        * ``round_wins``: how often each family's fastest address answered first
+        * ``winner`` and ``median_difference_ms``: which family is faster and by how much
+        * ``happy_eyeballs_choice``: per round, the family an RFC 8305 client
+          would end up using, given IPv6 a 250 ms head start
+        
+        Args:
+            host (str): Target hostname or IP address
+            port (int): Target port number
+            num_tests (int): Probe rounds (each probes every address once)
+            timeout (int): Connection timeout in seconds
+            probe (str): 'tcp', 'tls', 'http' or 'https'
+            max_in_flight (int): Concurrent probe limit (defaults to self.max_in_flight)
             
-            # Calculate jitter (mean deviation of latency differences)
-            if len(latencies) > 1:
-                differences = [abs(latencies[i] - latencies[i-1]) for i in range(1, len(latencies))]
-                stats['jitter_ms'] = statistics.mean(differences)
-            else:
-                stats['jitter_ms'] = 0
-        else:
-            # Set default values when no successful tests
-            stats.update({
-                'average_latency_ms': float('inf'),
-                'min_latency_ms': float('inf'),
-                'max_latency_ms': float('inf'),
-                'median_latency_ms': float('inf'),
-                'std_dev_latency_ms': 0,
-                'jitter_ms': 0
-            })
-        
-        stats['individual_results'] = test_results
+        Returns:
+            dict: ``addresses`` ({address: statistics}), ``families``
+            ({'ipv4'/'ipv6': statistics}) and ``comparison``
+        """
+        self._check_probe_type(probe)
+        resolved = []
+        for family, sockaddr in await self.resolver.resolve_async(host, port, socket.AF_UNSPEC):
+            if family in FAMILY_NAMES and all(sockaddr[0] != other[1][0] for other in resolved):
+                resolved.append((family, sockaddr))
+        recorders = [ProbeRecorder(self.keep_individual_results, f"{host}:{port}@{sockaddr[0]}",
+                                   self.result_log, self.history_store, self.listeners)
+                     for _, sockaddr in resolved]
+        families = sorted({FAMILY_NAMES[family] for family, _ in resolved})
+        round_wins = dict.fromkeys(families, 0)
+        happy_eyeballs = dict.fromkeys(families, 0)
+        remaining = iter(range(num_tests))
+        
+        async def worker():
+            for _ in remaining:
+                outcomes = await asyncio.gather(*(
+                    self._probe_async(host, port, timeout, probe, address) for address in resolved))
+                fastest = {}  # family name -> fastest successful latency this round
+                for (family, _), recorder, outcome in zip(resolved, recorders, outcomes):
+                    recorder.record(*outcome)
+                    name = FAMILY_NAMES[family]
+                    if outcome[1] == ErrorKind.NONE and outcome[0] < fastest.get(name, float('inf')):
+                        fastest[name] = outcome[0]
+                if fastest:
+                    round_wins[min(fastest, key=fastest.get)] += 1
+                    # IPv6 is tried first; IPv4 only starts once the head start has run out
+                    ipv4_done = fastest.get('ipv4', float('inf')) + HAPPY_EYEBALLS_DELAY_MS
+                    happy_eyeballs['ipv6' if fastest.get('ipv6', float('inf')) < ipv4_done else 'ipv4'] += 1
+        
+        rounds_in_flight = max(1, (max_in_flight or self.max_in_flight) // max(1, len(resolved)))
+        with self._timed('perform_dual_stack_tests'):
+            await asyncio.gather(*(worker() for _ in range(min(rounds_in_flight, num_tests))))
+        
+        addresses = {}
+        merged = {name: ProbeRecorder(keep_samples=False) for name in families}
+        for (family, sockaddr), recorder in zip(resolved, recorders):
+            stats = self.calculate_statistics(recorder.samples, recorder)
+            stats['family'] = FAMILY_NAMES[family]
+            addresses[sockaddr[0]] = stats
+            merged[FAMILY_NAMES[family]].merge(recorder)
+        family_stats = {name: self.calculate_statistics([], recorder) for name, recorder in merged.items()}
+        
+        comparison = {'round_wins': round_wins, 'happy_eyeballs_choice': happy_eyeballs,
+                      'winner': None, 'median_difference_ms': None, 'median_difference_percent': None}
+        answering = {name: stats for name, stats in family_stats.items() if stats['successful_tests']}
+        if answering:
+            comparison['winner'] = max(
+                answering, key=lambda name: (round_wins[name], -answering[name]['median_latency_ms']))
+        if len(answering) == 2:
+            slower = max(answering.values(), key=lambda stats: stats['median_latency_ms'])
+            faster = min(answering.values(), key=lambda stats: stats['median_latency_ms'])
+            difference = slower['median_latency_ms'] - faster['median_latency_ms']
+            comparison['median_difference_ms'] = difference
+            comparison['median_difference_percent'] = (
+                difference / slower['median_latency_ms'] * 100 if slower['median_latency_ms'] else 0)
+        return {'addresses': addresses, 'families': family_stats, 'comparison': comparison}
+
+    def perform_dual_stack_tests(self, host, port, num_tests=10, timeout=5, probe='tcp', max_in_flight=None):
+        """
+        Run perform_dual_stack_tests_async to completion from synchronous code.
+        
+        Returns:
+            dict: Per-address and per-family statistics plus a ``comparison`` section
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.perform_dual_stack_tests_async(
+                host, port, num_tests, timeout, probe, max_in_flight))
+        raise RuntimeError("An event loop is already running; await perform_dual_stack_tests_async instead")
+
+    async def perform_sweep_async(self, targets, timeout=2, probe='tcp', probes_per_target=1,
+                                  max_in_flight=None, on_result=None):
+        """
+        Probe a (possibly huge) stream of host:port pairs once each.
+        
+        ``targets`` is consumed lazily by a fixed pool of worker coroutines, as
+        in perform_async_tests, so at most ``max_in_flight`` targets are held
+        at once and memory stays flat for any number of targets. Build it with
+        target_sweep.iter_targets. Every probe is passed to the result log,
+        history store and listeners under its "host:port" name, and each
+        target's SweepResult goes to ``on_result`` as soon as it is known.
+        
+        Args:
+            targets (iterable): (host, port) pairs
+            timeout (int): Connection timeout in seconds; unanswered ports are ``filtered``
+            probe (str): 'tcp', 'tls', 'http' or 'https'
+            probes_per_target (int): Probes per target; the most informative
+                outcome and the fastest latency are reported
+            max_in_flight (int): Concurrent probe limit (defaults to self.max_in_flight)
+            on_result (callable): Called with each SweepResult in completion order
+            
+        Returns:
+            dict: Target count per verdict plus ``targets``, ``duration_s`` and
+            ``targets_per_second``
+        """
+        self._check_probe_type(probe)
+        max_in_flight = max_in_flight or self.max_in_flight
+        remaining = iter(targets)
+        counts = dict.fromkeys(VERDICTS, 0)
+        rank = {verdict: index for index, verdict in enumerate(VERDICTS)}
+        
+        async def worker():
+            # All workers share one iterator, so every target is swept exactly once
+            for host, port in remaining:
+                target = f"{host}:{port}"
+                verdict, latency_ms, error = None, None, None
+                for _ in range(probes_per_target):
+                    outcome = await self._probe_async(host, port, timeout, probe)
+                    self._publish(target, outcome)
+                    outcome_verdict = verdict_for(outcome[1])
+                    if verdict is None or rank[outcome_verdict] < rank[verdict]:
+                        verdict, error = outcome_verdict, outcome[2]
+                    if outcome_verdict == 'reachable':
+                        latency_ms = outcome[0] if latency_ms is None else min(latency_ms, outcome[0])
+                counts[verdict] += 1
+                if on_result is not None:
+                    on_result(SweepResult(host, port, verdict, latency_ms, error, probes_per_target))
+        
+        start = time.perf_counter()
+        with self._timed('perform_sweep'):
+            await asyncio.gather(*(worker() for _ in range(max_in_flight)))
+        duration = time.perf_counter() - start
+        
+        summary = {'targets': sum(counts.values()), **counts, 'duration_s': duration}
+        summary['targets_per_second'] = summary['targets'] / duration if duration else 0
+        return summary
+
+    def perform_sweep(self, targets, timeout=2, probe='tcp', probes_per_target=1, max_in_flight=None,
+                      on_result=None):
+        """
+        Run perform_sweep_async to completion from synchronous code.
+        
+        Example: ``perform_sweep(iter_targets(iter_hosts(['10.0.0.0/24']), '22,80,443'), on_result=print)``
+        
+        Returns:
+            dict: Target count per verdict, ``targets``, ``duration_s`` and ``targets_per_second``
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.perform_sweep_async(
+                targets, timeout, probe, probes_per_target, max_in_flight, on_result))
+        raise RuntimeError("An event loop is already running; await perform_sweep_async instead")
+
+    def _publish(self, target, outcome):
+        """Pass one probe outcome to the result log, history store and listeners."""
+        latency_ms, error_kind, error, phases = outcome[:4]
+        if self.result_log is not None:
+            self.result_log.record_probe(target, latency_ms, error_kind, error, phases)
+        if self.history_store is not None:
+            self.history_store.record_probe(target, latency_ms, error_kind, error, phases)
+        for listener in self.listeners:
+            listener(target, latency_ms, error_kind, error, phases)
+
+    async def perform_open_loop_tests(self, host, port, rate, duration, timeout=5, probe='tcp',
+                                      max_in_flight=None, max_outstanding=None):
+        """
+        Fire probes at a fixed rate regardless of how fast the target answers.
+        
+        Probe ``i`` is scheduled for ``start + i / rate``. Its recorded latency
+        is measured from that intended start, not from when it actually began,
+        so time spent queued behind a slow target (or behind the in-flight
+        limit) is counted instead of silently omitted. The uncorrected probe
+        time is reported as the ``service`` phase and the delay between the
+        intended and actual start as ``schedule_lag``.
+        
+        Probes waiting for an in-flight slot are bounded by ``max_outstanding``.
+        A probe that falls due while that many are outstanding is not issued:
+        it is recorded at once as failed with ErrorKind.DROPPED, so a target
+        too slow for the schedule shows up as loss instead of unbounded
+        queueing or silently missing probes.
+        
+        Args:
+            host (str): Target hostname or IP address
+            port (int): Target port number
+            rate (float): Requested probes per second
+            duration (float): Seconds to keep issuing probes
+            timeout (int): Connection timeout in seconds
+            probe (str): 'tcp', 'tls', 'http' or 'https'
+            max_in_flight (int): Concurrent probe limit (defaults to self.max_in_flight)
+            max_outstanding (int): Limit of issued but unfinished probes; defaults
+                to the larger of the in-flight limit and ``rate * timeout``, beyond
+                which a queued probe could not start before its timeout
+            
+        Returns:
+            dict: Comprehensive test statistics plus a ``load`` section with
+            requested and achieved rates and the number of dropped probes
+        """
+        self._check_probe_type(probe)
+        if rate <= 0 or duration <= 0:
+            raise ValueError("rate and duration must be positive")
+        max_in_flight = max_in_flight or self.max_in_flight
+        slots = asyncio.Semaphore(max_in_flight)
+        max_outstanding = max_outstanding or max(max_in_flight, int(rate * timeout))
+        recorder = ProbeRecorder(self.keep_individual_results, f"{host}:{port}", self.result_log,
+                                 self.history_store, self.listeners)
+        interval_ns = 1e9 / rate
+        total = max(1, int(rate * duration))
+        tasks = set()
+        last_start_ns = 0
+        
+        async def fire(intended_ns):
+            nonlocal last_start_ns
+            async with slots:
+                started_ns = time.perf_counter_ns()
+                last_start_ns = max(last_start_ns, started_ns)
+                latency_ms, error_kind, error, phases, tls_resumed = \
+                    await self._probe_async(host, port, timeout, probe)
+            finished_ns = time.perf_counter_ns()
+            phases['schedule_lag'] = _elapsed_ms(intended_ns, started_ns)
+            if error_kind == ErrorKind.NONE:
+                phases['service'] = latency_ms
+                latency_ms = _elapsed_ms(intended_ns, finished_ns)
+            recorder.record(latency_ms, error_kind, error, phases, tls_resumed)
+        
+        start_ns = time.perf_counter_ns()
+        issued = 0
+        dropped = 0
+        while issued < total:
+            # Issue every probe that is due, then sleep until the next one
+            now_ns = time.perf_counter_ns()
+            while issued < total and start_ns + issued * interval_ns <= now_ns:
+                if len(tasks) >= max_outstanding:
+                    if self.metrics is not None:
+                        self.metrics.probes.inc(probe, 'dropped')
+                    recorder.record(None, ErrorKind.DROPPED, ERROR_MESSAGES[ErrorKind.DROPPED], {}, None)
+                    dropped += 1
+                else:
+                    task = asyncio.create_task(fire(start_ns + int(issued * interval_ns)))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                issued += 1
+            if issued < total:
+                next_ns = start_ns + issued * interval_ns
+                await asyncio.sleep(max(0, next_ns - time.perf_counter_ns()) / 1e9)
+        
+        await asyncio.gather(*list(tasks))
+        finished_ns = time.perf_counter_ns()
+        
+        stats = self.calculate_statistics(recorder.samples, recorder)
+        start_window_s = (last_start_ns - start_ns + interval_ns) / 1e9
+        stats['load'] = {
+            'requested_rate': rate,
+            'achieved_rate': (total - dropped) / start_window_s,
+            'completion_rate': total / ((finished_ns - start_ns) / 1e9),
+            'requested_duration_s': duration,
+            'actual_duration_s': (finished_ns - start_ns) / 1e9,
+            'probes_scheduled': total,
+            'probes_dropped': dropped,
+        }
         return stats
 
-    def record_comprehensive_result(self, test_id, statistics):
+    def perform_rate_controlled_tests(self, host, port, rate, duration, timeout=5, probe='tcp',
+                                      max_in_flight=None, max_outstanding=None):
+        """
+        Run perform_open_loop_tests to completion from synchronous code.
+        
+        Example: ``perform_rate_controlled_tests(host, 443, rate=2000, duration=60)``
+        probes at 2,000 connects/s for one minute.
+        
+        Returns:
+            dict: Comprehensive test statistics with a ``load`` section
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.perform_open_loop_tests(
+                host, port, rate, duration, timeout, probe, max_in_flight, max_outstanding))
+        raise RuntimeError("An event loop is already running; await perform_open_loop_tests instead")
+
+    def perform_udp_tests(self, host, port, rate=1000, duration=5, payload_size=64, drain_timeout=1.0):
+        """
+        Measure packet loss, reordering and jitter with a stream of UDP datagrams.
+        
+        Sequence-numbered packets are sent from one socket at ``rate`` per
+        second to a UDPEchoResponder (see udp_probe.py). Every echoed packet is
+        recorded with its round-trip time and every packet that never came
+        back as a timeout, so ``packet_loss_percentage`` is true packet loss.
+        
+        Args:
+            host (str): Responder hostname or IP address
+            port (int): Responder UDP port
+            rate (float): Packets per second
+            duration (float): Seconds to keep sending
+            payload_size (int): Datagram size in bytes
+            drain_timeout (float): Seconds to wait for late echoes
+            
+        Returns:
+            dict: Comprehensive test statistics plus a ``udp`` section with
+            duplicates, reordering and RFC 3550 jitter
+        """
+        family, address = self.resolver.resolve(host, port, self._family_for(host))[0]
+        recorder = ProbeRecorder(self.keep_individual_results, f"{host}:{port}", self.result_log,
+                                 self.history_store, self.listeners)
+        prober = UDPProber(address, family, payload_size, drain_timeout=drain_timeout)
+        
+        with self._timed('perform_udp_tests'):
+            echoed = prober.run(rate, duration,
+                                on_reply=lambda sequence, rtt_ms: recorder.record(rtt_ms, ErrorKind.NONE, None))
+            for _ in range(echoed.count(0)):
+                recorder.record(float('inf'), ErrorKind.TIMEOUT, None)
+            
+            stats = self.calculate_statistics(recorder.samples, recorder)
+        stats['udp'] = prober.summary(rate)
+        return stats
+
+    async def perform_echo_tests_async(self, host, port, num_tests=1000, timeout=5, connections=4):
+        """
+        Measure round-trip times with echo frames over persistent TCP connections.
+        
+        Instead of a handshake per sample, ``connections`` long-lived
+        connections to a TCPEchoResponder (see tcp_echo.py) each carry one
+        small timestamped frame at a time, so samples cost no new sockets and
+        no TIME_WAIT entries. The connections stay open for later runs
+        against the same target until close_echo_connections is called. A
+        connection whose echo times out or fails is closed and reopened.
+        
+        Args:
+            host (str): Responder hostname or IP address
+            port (int): Responder TCP port
+            num_tests (int): Number of echo samples
+            timeout (float): Seconds to wait for a connect or an echo
+            connections (int): Connections used concurrently
+            
+        Returns:
+            dict: Comprehensive test statistics plus an ``echo`` section with
+            connection reuse counts and the achieved sample rate
+        """
+        pool = self._echo_pools.get((host, port))
+        if pool is None:
+            family, address = (await self.resolver.resolve_async(host, port, self._family_for(host)))[0]
+            pool = self._echo_pools[(host, port)] = EchoConnectionPool(address, family)
+        recorder = ProbeRecorder(self.keep_individual_results, f"{host}:{port}", self.result_log,
+                                 self.history_store, self.listeners)
+        opened, replaced = pool.connects, pool.replaced
+        remaining = iter(range(num_tests))
+        
+        async def worker():
+            sock = None
+            for _ in remaining:
+                try:
+                    if sock is None:
+                        sock = await pool.acquire(timeout)
+                    recorder.record(await pool.echo(sock, timeout), ErrorKind.NONE, None)
+                    continue
+                except asyncio.CancelledError:
+                    if sock is not None:
+                        pool.discard(sock)
+                    raise
+                except asyncio.TimeoutError as e:
+                    e.__traceback__ = None
+                    recorder.record(float('inf'), ErrorKind.TIMEOUT, 'Echo timeout')
+                except Exception as e:
+                    e.__traceback__ = None
+                    error_kind = classify_error(e)
+                    if error_kind == ErrorKind.TIMEOUT:
+                        recorder.record(float('inf'), error_kind, 'Echo timeout')
+                    else:
+                        recorder.record(None, error_kind, str(e))
+                if sock is not None:
+                    # A failed echo may leave a late frame in the stream, so never reuse it
+                    pool.discard(sock)
+                    sock = None
+            if sock is not None:
+                pool.release(sock)
+        
+        with self._timed('perform_echo_tests'):
+            start_ns = time.perf_counter_ns()
+            await asyncio.gather(*(worker() for _ in range(max(1, min(connections, num_tests)))))
+            duration_s = (time.perf_counter_ns() - start_ns) / 1e9
+            stats = self.calculate_statistics(recorder.samples, recorder)
+        stats['echo'] = {
+            'connections': len(pool.idle),
+            'connections_opened': pool.connects - opened,
+            'connections_replaced': pool.replaced - replaced,
+            'mean_connect_ms': sum(pool.connect_ms) / len(pool.connect_ms) if pool.connect_ms else None,
+            'duration_s': duration_s,
+            'samples_per_second': num_tests / duration_s if duration_s else 0,
+        }
+        return stats
+
+    def perform_echo_tests(self, host, port, num_tests=1000, timeout=5, connections=4):
+        """
+        Run perform_echo_tests_async to completion from synchronous code.
+        
+        The pooled connections are plain sockets, so they survive the event
+        loop of each call and are reused by the next one.
+        
+        Returns:
+            dict: Comprehensive test statistics plus an ``echo`` section
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.perform_echo_tests_async(host, port, num_tests, timeout, connections))
+        raise RuntimeError("An event loop is already running; await perform_echo_tests_async instead")
+
+    def close_echo_connections(self):
+        """Close the persistent connections kept by perform_echo_tests."""
+        for pool in self._echo_pools.values():
+            pool.close()
+        self._echo_pools.clear()
+
+    def calculate_statistics(self, test_results, recorder=None):
+        """
+        Calculate comprehensive statistics from test results.
+        
+        Statistics come from constant-memory StreamingStatistics accumulators.
+        Engines pass the ProbeRecorder they fed while probing; otherwise one is
+        built from ``test_results``. Median and pNN percentiles are histogram
+        estimates within 1% of a true sample value. Phase timings (``dns``,
+        ``connect``, ``tls``, ``ttfb``) are summarised under ``phase_statistics``.
+        
+        Args:
+            test_results (list | SampleStore): Individual test results
+            recorder (ProbeRecorder): Already-fed recorder (optional)
+            
+        Returns:
+            dict: Comprehensive statistics including jitter, packet loss, percentiles, etc.
+        """
+        with self._timed('calculate_statistics'):
+            if recorder is None:
+                recorder = ProbeRecorder(keep_samples=False)
+                for result in test_results:
+                    recorder.record_result(result)
+            
+            stats = recorder.accumulator.to_statistics()
+            if recorder.phase_accumulators:
+                stats['phase_statistics'] = {
+                    name: accumulator.summary()
+                    for name, accumulator in recorder.phase_accumulators.items()
+                }
+            if recorder.tls_handshakes:
+                stats['tls_session_resumption'] = {
+                    'handshakes': recorder.tls_handshakes,
+                    'resumed': recorder.tls_resumed,
+                }
+            stats['individual_results'] = test_results
+            return stats
+
+    def record_comprehensive_result(self, test_id, statistics, target=None):
         """
         Record comprehensive test results with detailed statistics.
         
         Args:
             test_id (str): Identifier for the test result
             statistics (dict): Comprehensive test statistics
+            target (str): Tested ``host:port``, kept with the persisted history
         """
+        # Like test_history, only the most recent history_limit runs are kept
+        self.results.pop(test_id, None)
         self.results[test_id] = statistics
+        if self.test_history.maxlen is not None and len(self.results) > self.test_history.maxlen:
+            del self.results[next(iter(self.results))]
         self.test_history.append({
             'test_id': test_id,
             'timestamp': statistics['test_timestamp'],
             'statistics': statistics
         })
+        if self.history_store is not None:
+            self.history_store.record_run(test_id, statistics, target)
         
         print(f"Comprehensive test recorded - ID: {test_id}")
         print(f"  Successful tests: {statistics['successful_tests']}/{statistics['total_tests']}")
@@ -196,23 +1353,104 @@ class AdvancedLatencyTester:
                 print(f"Max Latency: {stats['max_latency_ms']:.2f} ms")
                 print(f"Jitter: {stats['jitter_ms']:.2f} ms")
                 print(f"Std Dev: {stats['std_dev_latency_ms']:.2f} ms")
+                if 'p99_latency_ms' in stats:
+                    print(f"P90/P99/P99.9: {stats['p90_latency_ms']:.2f} / "
+                          f"{stats['p99_latency_ms']:.2f} / {stats['p999_latency_ms']:.2f} ms")
+            if 'load' in stats:
+                print(f"Rate: {stats['load']['achieved_rate']:.1f}/s achieved "
+                      f"of {stats['load']['requested_rate']:.1f}/s requested")
+                if stats['load']['probes_dropped']:
+                    print(f"Dropped: {stats['load']['probes_dropped']} probes (too many outstanding)")
+            for phase, phase_stats in stats.get('phase_statistics', {}).items():
+                if phase_stats['count']:
+                    print(f"{phase.upper()} phase: avg {phase_stats['average_ms']:.3f} ms, "
+                          f"p99 {phase_stats['p99_ms']:.3f} ms ({phase_stats['count']} samples)")
             print("-" * 40)
 
-    def export_results_json(self, filename="network_test_results.json"):
+    def display_test_history(self, limit=10):
+        """
+        Display the most recent test runs, newest first.
+        
+        With a history store the runs survive restarts and each stored target
+        also gets a last-24-hours and last-30-days summary from the rollups.
+        
+        Args:
+            limit (int): Number of runs to show
+        """
+        if self.history_store is None:
+            if not self.test_history:
+                print("No test history available.")
+                return
+            print("\nTest History (most recent first):")
+            for history in islice(reversed(self.test_history), limit):
+                print(f"{history['timestamp']} - {history['test_id']}")
+            return
+        
+        runs = self.history_store.recent_runs(limit)
+        if not runs:
+            print("No test history available.")
+        else:
+            print("\nTest History (most recent first):")
+            for run in runs:
+                stats = run['statistics']
+                line = (f"{run['timestamp']} - {run['test_id']}"
+                        f"{' (' + run['target'] + ')' if run['target'] else ''}: "
+                        f"{stats['successful_tests']}/{stats['total_tests']} ok, "
+                        f"{stats['packet_loss_percentage']:.1f}% loss")
+                if stats['successful_tests'] and stats.get('p99_latency_ms') is not None:
+                    line += (f", avg {stats['average_latency_ms']:.2f} ms, "
+                             f"p99 {stats['p99_latency_ms']:.2f} ms")
+                print(line)
+        
+        now = time.time()
+        for target in self.history_store.targets():
+            for label, span in (('24h', 86400), ('30d', 30 * 86400)):
+                summary = self.history_store.query(target, now - span, now)
+                if not summary['count']:
+                    continue
+                latency = (f", p50 {summary['p50_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms"
+                           if summary['p50_ms'] is not None else "")
+                print(f"{target} [{label}]: {summary['count']} probes, "
+                      f"{summary['loss_percentage']:.1f}% loss{latency}")
+
+    def export_results_json(self, filename="network_test_results.json", include_individual_results=None):
         """
         Export all test results to a JSON file.
         
+        Per-probe results are only included when no result log is attached
+        (the log already holds them), unless requested explicitly. History
+        entries reference results by ID instead of repeating their statistics.
+        The file is written to a temporary name and renamed into place, so a
+        crash never leaves a half-written export.
+        
         Args:
             filename (str): Output filename
+            include_individual_results (bool): Include per-probe results
+                (defaults to True only when no result log is attached)
         """
+        if include_individual_results is None:
+            include_individual_results = self.result_log is None
+        
+        test_results = self.results
+        if not include_individual_results:
+            test_results = {
+                test_id: {key: value for key, value in stats.items() if key != 'individual_results'}
+                for test_id, stats in self.results.items()
+            }
+        
         export_data = {
             'export_timestamp': datetime.now().isoformat(),
-            'test_results': self.results,
-            'test_history': self.test_history
+            'test_results': test_results,
+            'test_history': [
+                {'test_id': history['test_id'], 'timestamp': history['timestamp']}
+                for history in self.test_history
+            ]
         }
         
-        with open(filename, 'w') as f:
-            json.dump(export_data, f, indent=2)
+        temporary_filename = f"{filename}.tmp"
+        with open(temporary_filename, 'w') as f:
+            json.dump(export_data, f, indent=2, default=_json_default)
+        os.replace(temporary_filename, filename)
         
         print(f"Results exported to {filename}")
 
@@ -293,7 +1531,7 @@ class AdvancedLatencyTester:
                     'jitter_ms': 0,
                     'test_timestamp': result['timestamp'],
                     'individual_results': [result]
-                })
+                }, f"{host}:{port}")
 
             elif choice == '2':
                 config = self.read_config_file() or {}
@@ -305,7 +1543,7 @@ class AdvancedLatencyTester:
                 print(f"\nPerforming {num_tests} parallel tests to {host}:{port}...")
                 stats = self.perform_parallel_tests(host, port, num_tests, timeout)
                 test_id = f"parallel_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                self.record_comprehensive_result(test_id, stats)
+                self.record_comprehensive_result(test_id, stats, f"{host}:{port}")
 
             elif choice == '3':
                 self.display_comprehensive_results()
@@ -331,12 +1569,7 @@ class AdvancedLatencyTester:
                     print("No configuration found.")
 
             elif choice == '7':
-                if not self.test_history:
-                    print("No test history available.")
-                else:
-                    print("\nTest History (most recent first):")
-                    for history in reversed(self.test_history[-10:]):  # Show last 10 tests
-                        print(f"{history['timestamp']} - {history['test_id']}")
+                self.display_test_history()  # Show last 10 tests
 
             elif choice == '0':
                 print("Exiting Advanced Network Latency Tester.")
@@ -345,7 +1578,138 @@ class AdvancedLatencyTester:
             else:
                 print("Invalid choice. Please try again.")
 
+def main(argv=None):
+    """
+    Command-line entry point: the interactive menu by default, the
+    non-interactive monitoring daemon with ``--daemon TARGETS_FILE``, or a
+    one-off sweep with ``--sweep HOST_SPEC ... --ports PORTS``.
+    """
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Advanced Network Latency Tester")
+    parser.add_argument('--daemon', metavar='TARGETS_FILE',
+                        help="Monitor the targets listed in a JSON file without the menu")
+    parser.add_argument('--duration', type=float, default=None,
+                        help="Seconds to run the daemon (default: until interrupted)")
+    parser.add_argument('--report-interval', type=float, default=60,
+                        help="Seconds between daemon summary reports")
+    parser.add_argument('--sweep', nargs='*', metavar='HOST_SPEC',
+                        help="Sweep hostnames, IP addresses and CIDR blocks instead of opening the menu")
+    parser.add_argument('--hosts-file', metavar='FILE',
+                        help="Also sweep the hosts listed in FILE, one spec per line")
+    parser.add_argument('--ports', default='80,443',
+                        help="Ports to sweep, e.g. 22,80,8000-8100")
+    parser.add_argument('--sweep-timeout', type=float, default=2,
+                        help="Seconds before an unanswered sweep probe counts as filtered")
+    parser.add_argument('--circuit-breaker', type=int, metavar='TIMEOUTS',
+                        help="Short-circuit a target after this many consecutive timeouts")
+    parser.add_argument('--adaptive-timeout', action='store_true',
+                        help="Shorten probe timeouts from each target's observed latency")
+    parser.add_argument('--max-in-flight', type=int, default=1000,
+                        help="Maximum concurrent probes")
+    parser.add_argument('--result-log', metavar='FILE',
+                        help="Stream every probe result to an append-only, size-rotated log")
+    parser.add_argument('--log-format', choices=('ndjson', 'binary'), default='ndjson',
+                        help="Result log format")
+    parser.add_argument('--history-db', metavar='FILE',
+                        help="Persist results and rollups in this SQLite file (pruned to its retention)")
+    parser.add_argument('--alerts', action='store_true',
+                        help="Run anomaly detectors per target and print alerts as JSON lines")
+    parser.add_argument('--shared-ring', metavar='NAME',
+                        help="Publish every probe to a shared-memory ring other processes can read")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="Serve Prometheus metrics and profiler controls on 127.0.0.1:PORT")
+    args = parser.parse_args(argv)
+    
+    result_log = None
+    if args.result_log:
+        from result_log import ResultLogWriter
+        result_log = ResultLogWriter(args.result_log, args.log_format)
+    
+    history_store = None
+    if args.history_db:
+        from history_store import HistoryStore
+        history_store = HistoryStore(args.history_db)
+        history_store.prune()
+    
+    metrics_server = None
+    metrics = None
+    if args.metrics_port is not None:
+        from instrumentation import LatencyTesterMetrics, MetricsServer
+        metrics = LatencyTesterMetrics()
+        metrics_server = MetricsServer(metrics, port=args.metrics_port).start()
+        print(f"Metrics at http://127.0.0.1:{metrics_server.port}/metrics")
+    
+    circuit_breaker = None
+    if args.circuit_breaker or args.adaptive_timeout:
+        from circuit_breaker import CircuitBreaker
+        circuit_breaker = CircuitBreaker(failure_threshold=args.circuit_breaker or 5,
+                                         adaptive_timeout=args.adaptive_timeout)
+    
+    tester = AdvancedLatencyTester(max_workers=15, max_in_flight=args.max_in_flight,  # Increased thread pool for better performance
+                                   result_log=result_log, metrics=metrics, history_store=history_store,
+                                   circuit_breaker=circuit_breaker)
+    shared_ring = None
+    if args.shared_ring:
+        from shared_ring import SharedRingWriter
+        shared_ring = SharedRingWriter(args.shared_ring)
+        tester.listeners.append(shared_ring.record_probe)
+    
+    anomaly_monitor = None
+    if args.alerts:
+        from anomaly_detection import AnomalyMonitor
+        anomaly_monitor = AnomalyMonitor()
+        anomaly_monitor.alert_listeners.append(lambda alert: print(f"ALERT {alert.to_json()}"))
+        tester.listeners.append(anomaly_monitor.record_probe)
+    
+    try:
+        if args.daemon:
+            from monitoring_daemon import MonitoringDaemon, load_targets
+            daemon = MonitoringDaemon(tester, load_targets(args.daemon), report_interval=args.report_interval)
+            if result_log is not None:
+                daemon.listeners.append(
+                    lambda target, *outcome: result_log.record_probe(target.name, *outcome))
+            if history_store is not None:
+                daemon.listeners.append(
+                    lambda target, *outcome: history_store.record_probe(target.name, *outcome))
+            if anomaly_monitor is not None:
+                daemon.listeners.append(
+                    lambda target, *outcome: anomaly_monitor.record_probe(target.name, *outcome))
+            if shared_ring is not None:
+                daemon.listeners.append(
+                    lambda target, *outcome: shared_ring.record_probe(target.name, *outcome))
+            daemon.run_forever(args.duration)
+        elif args.sweep is not None or args.hosts_file:
+            from itertools import chain
+            from target_sweep import iter_host_file, iter_hosts, iter_targets
+            
+            hosts = iter_hosts(args.sweep or ())
+            if args.hosts_file:
+                hosts = chain(hosts, iter_host_file(args.hosts_file))
+            
+            def show(result):
+                latency = f"{result.latency_ms:.2f} ms" if result.latency_ms is not None else ""
+                print(f"{result.target:<28} {result.verdict:<10} {latency}")
+            
+            summary = tester.perform_sweep(iter_targets(hosts, args.ports), timeout=args.sweep_timeout,
+                                           on_result=show)
+            print(f"\nSwept {summary['targets']} targets in {summary['duration_s']:.1f}s: "
+                  f"{summary['reachable']} reachable, {summary['refused']} refused, "
+                  f"{summary['filtered']} filtered, {summary['error']} errors")
+        else:
+            tester.menu()
+    finally:
+        tester.close_echo_connections()
+        if shared_ring is not None:
+            shared_ring.close()
+        if result_log is not None:
+            result_log.close()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if history_store is not None:
+            history_store.prune()
+            history_store.close()
+
 # Example usage:
 if __name__ == "__main__":
-    tester = AdvancedLatencyTester(max_workers=15)  # Increased thread pool for better performance
-    tester.menu()
+    main()
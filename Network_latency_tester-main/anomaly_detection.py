@@ -0,0 +1,260 @@
+"""
+Streaming anomaly and regression detection on probe results.
+
+Every detector updates in O(1) time and memory per sample, so detection keeps
+up with the probe rate and never rereads stored history:
+
+* EWMADetector - exponentially weighted mean/variance baseline; flags single
+  latency spikes far above the baseline.
+* CUSUMDetector - cumulative-sum change-point detection against a learned
+  baseline; flags sustained latency shifts up or down, then relearns.
+* LossDetector - flags bursts of consecutive failures and an exponentially
+  weighted loss rate crossing a threshold (and its recovery).
+
+AnomalyMonitor keeps one set of detectors per target and takes results with
+the same ``(target, latency_ms, error_kind, error, phases)`` arguments as
+tester and daemon listeners:
+
+    monitor = AnomalyMonitor()
+    monitor.alert_listeners.append(lambda alert: print(alert.to_json()))
+    tester.listeners.append(monitor.record_probe)
+
+At most ``max_targets`` detector sets are kept; the least recently probed
+target's set is dropped first, and relearns its baseline if it comes back.
+"""
+import json
+import math
+import time
+from collections import deque
+
+from sample_store import ErrorKind
+
+
+class Alert:
+    """One structured detector finding."""
+
+    __slots__ = ('target', 'detector', 'kind', 'severity', 'timestamp', 'value', 'baseline', 'message')
+
+    def __init__(self, target, detector, kind, severity, value, baseline, message, timestamp=None):
+        self.target = target
+        self.detector = detector
+        self.kind = kind
+        self.severity = severity
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.value = value
+        self.baseline = baseline
+        self.message = message
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    def __repr__(self):
+        return f"Alert({self.target!r}, {self.kind!r}, {self.message!r})"
+
+
+class EWMADetector:
+    """
+    Latency spike detection against an EWMA/EWMV baseline.
+
+    A successful latency more than ``threshold`` baseline standard deviations
+    (and at least ``min_delta_ms``) above the baseline mean raises a
+    ``latency_spike`` alert; further spikes are suppressed for ``cooldown``
+    samples.
+    """
+
+    name = 'ewma'
+
+    def __init__(self, alpha=0.05, threshold=4.0, min_delta_ms=1.0, warmup=30, cooldown=50):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_delta_ms = min_delta_ms
+        self.warmup = warmup
+        self.cooldown = cooldown
+        self.mean = None
+        self.variance = 0.0
+        self.samples = 0
+        self._quiet_until = 0
+
+    def update(self, latency_ms, success):
+        """Feed one probe; returns a (kind, severity, value, baseline, message) tuple or None."""
+        if not success:
+            return None
+        self.samples += 1
+        if self.mean is None:
+            self.mean = latency_ms
+            return None
+        deviation = latency_ms - self.mean
+        finding = None
+        if self.samples > self.warmup and self.samples >= self._quiet_until:
+            limit = max(self.threshold * math.sqrt(self.variance), self.min_delta_ms)
+            if deviation > limit:
+                self._quiet_until = self.samples + self.cooldown
+                finding = ('latency_spike', 'warning', latency_ms, self.mean,
+                           f"latency {latency_ms:.2f} ms is {deviation:.2f} ms above the "
+                           f"{self.mean:.2f} ms baseline")
+        self.mean += self.alpha * deviation
+        self.variance = (1 - self.alpha) * (self.variance + self.alpha * deviation * deviation)
+        return finding
+
+
+class CUSUMDetector:
+    """
+    Two-sided CUSUM change-point detection on successful latencies.
+
+    The first ``warmup`` samples set the baseline mean and standard deviation
+    (floored at ``min_sigma_ms``). Each later sample adds its standardised
+    deviation, clipped to ``clip`` so lone spikes are left to EWMADetector,
+    minus the slack ``drift`` to an upper and a lower sum. A sum above
+    ``threshold`` raises ``latency_shift_up``/``latency_shift_down`` and the
+    detector learns a new baseline. The defaults catch a one standard
+    deviation shift in about 20 samples and false-alarm roughly once per
+    10,000 in-control samples.
+    """
+
+    name = 'cusum'
+
+    def __init__(self, drift=0.5, threshold=10.0, warmup=100, min_sigma_ms=0.05, clip=3.0):
+        self.drift = drift
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_sigma_ms = min_sigma_ms
+        self.clip = clip
+        self._reset()
+
+    def _reset(self):
+        self.baseline_mean = None
+        self.baseline_sigma = None
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.upper = 0.0
+        self.lower = 0.0
+        self._recent = 0.0  # running mean of the samples since the last reset of the sums
+        self._recent_count = 0
+
+    def update(self, latency_ms, success):
+        """Feed one probe; returns a (kind, severity, value, baseline, message) tuple or None."""
+        if not success:
+            return None
+        if self.baseline_mean is None:
+            # Welford accumulation of the baseline
+            self._count += 1
+            delta = latency_ms - self._mean
+            self._mean += delta / self._count
+            self._m2 += delta * (latency_ms - self._mean)
+            if self._count >= self.warmup:
+                self.baseline_mean = self._mean
+                self.baseline_sigma = max(math.sqrt(self._m2 / (self._count - 1)), self.min_sigma_ms)
+            return None
+
+        z = (latency_ms - self.baseline_mean) / self.baseline_sigma
+        z = min(max(z, -self.clip), self.clip)
+        self.upper = max(0.0, self.upper + z - self.drift)
+        self.lower = max(0.0, self.lower - z - self.drift)
+        if self.upper == 0 and self.lower == 0:
+            self._recent, self._recent_count = 0.0, 0
+        else:
+            self._recent_count += 1
+            self._recent += (latency_ms - self._recent) / self._recent_count
+
+        if self.upper > self.threshold or self.lower > self.threshold:
+            kind = 'latency_shift_up' if self.upper > self.threshold else 'latency_shift_down'
+            baseline, level = self.baseline_mean, self._recent
+            self._reset()
+            return (kind, 'critical' if kind == 'latency_shift_up' else 'info', level, baseline,
+                    f"latency shifted from {baseline:.2f} ms to about {level:.2f} ms")
+        return None
+
+
+class LossDetector:
+    """
+    Packet loss bursts and loss-rate shifts.
+
+    ``burst_length`` consecutive failures raise one ``loss_burst`` alert per
+    burst. The loss rate is tracked as an EWMA; once past ``warmup`` probes,
+    crossing ``rate_threshold`` raises ``loss_rate_high`` and falling back
+    below half of it raises ``loss_recovered``.
+    """
+
+    name = 'loss'
+
+    def __init__(self, burst_length=3, alpha=0.05, rate_threshold=0.1, warmup=20):
+        self.burst_length = burst_length
+        self.alpha = alpha
+        self.rate_threshold = rate_threshold
+        self.warmup = warmup
+        self.loss_rate = 0.0
+        self.consecutive_failures = 0
+        self.samples = 0
+        self.high = False
+
+    def update(self, latency_ms, success):
+        """Feed one probe; returns a (kind, severity, value, baseline, message) tuple or None."""
+        self.samples += 1
+        self.loss_rate += self.alpha * ((0.0 if success else 1.0) - self.loss_rate)
+        if success:
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+            if self.consecutive_failures == self.burst_length:
+                return ('loss_burst', 'critical', self.consecutive_failures, 0,
+                        f"{self.consecutive_failures} consecutive probes failed")
+        if self.samples < self.warmup:
+            return None
+        if not self.high and self.loss_rate > self.rate_threshold:
+            self.high = True
+            return ('loss_rate_high', 'warning', self.loss_rate * 100, self.rate_threshold * 100,
+                    f"loss rate rose to {self.loss_rate * 100:.1f}%")
+        if self.high and self.loss_rate < self.rate_threshold / 2:
+            self.high = False
+            return ('loss_recovered', 'info', self.loss_rate * 100, self.rate_threshold * 100,
+                    f"loss rate recovered to {self.loss_rate * 100:.1f}%")
+        return None
+
+
+def default_detectors():
+    """Detector set used for each target unless AnomalyMonitor gets another factory."""
+    return [EWMADetector(), CUSUMDetector(), LossDetector()]
+
+
+class AnomalyMonitor:
+    def __init__(self, detector_factory=default_detectors, max_alerts=1000, max_targets=10000):
+        """
+        Args:
+            detector_factory (callable): Returns a fresh detector list for a new target
+            max_alerts (int): Recent alerts kept in ``alerts``
+            max_targets (int): Targets with detectors; the least recently probed is evicted first
+        """
+        self.detector_factory = detector_factory
+        self.max_targets = max_targets
+        self.detectors = {}  # target -> detector list, least recently probed first
+        self.alerts = deque(maxlen=max_alerts)
+        self.alert_listeners = []  # callables (Alert)
+
+    def record_probe(self, target, latency_ms, error_kind, error=None, phases=None, tls_resumed=None):
+        """
+        Feed one probe result to the target's detectors.
+
+        Returns:
+            list: Alerts raised by this result
+        """
+        detectors = self.detectors.pop(target, None)
+        if detectors is None:
+            detectors = self.detector_factory()
+            if len(self.detectors) >= self.max_targets:
+                del self.detectors[next(iter(self.detectors))]
+        self.detectors[target] = detectors
+        success = error_kind == ErrorKind.NONE
+        raised = []
+        for detector in detectors:
+            finding = detector.update(latency_ms, success)
+            if finding is not None:
+                alert = Alert(target, detector.name, *finding)
+                raised.append(alert)
+                self.alerts.append(alert)
+                for listener in self.alert_listeners:
+                    listener(alert)
+        return raised
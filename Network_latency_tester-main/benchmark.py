@@ -0,0 +1,231 @@
+"""
+Self-benchmark for the latency tester against local stand-in servers.
+
+Measures the tester itself rather than the network: probe throughput of the
+async and thread engines, CPU time per probe, memory per stored sample and
+how accurately injected delays and drops are reported. Results are compared
+with a stored baseline and the run fails when a metric regresses beyond its
+tolerance.
+
+    python benchmark.py                    # run and compare with benchmark_baseline.json
+    python benchmark.py --quick            # smaller runs, e.g. for CI smoke tests
+    python benchmark.py --update-baseline  # record this machine's results as the baseline
+
+Throughput and CPU figures depend on the machine, so the baseline is not part
+of the repository: the first run on a machine records it, and later runs
+compare against it.
+"""
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import Advanced_Network_Latency_Tester as ant
+from loopback_servers import HTTPStandInServer, TCPStandInServer, TLSStandInServer, loopback_client_context
+from sample_store import ErrorKind
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# metric -> (unit, higher is better, relative tolerance, absolute slack)
+METRICS = {
+    'async_probes_per_second': ('probes/s', True, 0.5, 0),
+    'thread_probes_per_second': ('probes/s', True, 0.5, 0),
+    'async_cpu_us_per_probe': ('us', False, 0.5, 0),
+    'bytes_per_sample': ('bytes', False, 0.25, 0),
+    'timing_error_ms': ('ms', False, 0, 2.0),
+    'loss_error_pct': ('%', False, 0, 1.0),
+    'saturation_timeout_pct': ('%', True, 0, 0),
+}
+
+
+def measure_throughput(engine, num_tests):
+    """
+    Probe a loopback listener as fast as the engine allows.
+
+    Returns:
+        tuple: (probes per second, CPU microseconds per probe on the calling thread)
+    """
+    tester = ant.AdvancedLatencyTester(max_workers=32, max_in_flight=256, keep_individual_results=False)
+    with TCPStandInServer() as server:
+        tester.perform_parallel_tests(*server.address, num_tests=min(num_tests, 200), engine=engine)  # warm up
+        cpu_start = time.thread_time()
+        start = time.perf_counter()
+        stats = tester.perform_parallel_tests(*server.address, num_tests=num_tests, engine=engine)
+        elapsed = time.perf_counter() - start
+        cpu = time.thread_time() - cpu_start
+    if stats['successful_tests'] != num_tests:
+        raise RuntimeError(f"{engine} engine: only {stats['successful_tests']}/{num_tests} loopback probes succeeded")
+    return num_tests / elapsed, cpu / num_tests * 1e6
+
+
+def measure_memory_per_sample(num_tests):
+    """Bytes allocated per probe when per-probe results are kept."""
+    tester = ant.AdvancedLatencyTester(max_in_flight=256)
+    with TCPStandInServer() as server:
+        tester.perform_parallel_tests(*server.address, num_tests=10)  # warm up caches and imports
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            stats = tester.perform_parallel_tests(*server.address, num_tests=num_tests)
+            after = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+    del stats
+    return (after - before) / num_tests
+
+
+def measure_timing_accuracy(delay, num_tests):
+    """Median error (ms) of the measured time to first byte against an injected response delay."""
+    tester = ant.AdvancedLatencyTester()
+    with HTTPStandInServer(response_delay=delay) as server:
+        ttfb = [tester.perform_single_test(*server.address, probe='http')['ttfb_ms'] for _ in range(num_tests)]
+    return abs(statistics.median(ttfb) - delay * 1000)
+
+
+def measure_loss_accuracy(drop_rate, num_tests):
+    """Difference (percentage points) between reported loss and the connections the server dropped."""
+    tester = ant.AdvancedLatencyTester(max_in_flight=32, ssl_context=loopback_client_context())
+    with TLSStandInServer(drop_rate=drop_rate, seed=1) as server:
+        stats = tester.perform_parallel_tests('localhost', server.port, num_tests=num_tests, timeout=5,
+                                              probe='tls')
+        dropped_pct = server.connections_dropped / num_tests * 100
+    return abs(stats['packet_loss_percentage'] - dropped_pct)
+
+
+def measure_saturation(num_tests):
+    """Percentage of failed probes against a saturated backlog that are reported as timeouts."""
+    tester = ant.AdvancedLatencyTester()
+    with TCPStandInServer(backlog=0, accept=False) as server:
+        stats = tester.perform_parallel_tests(*server.address, num_tests=num_tests, timeout=0.3)
+    failures = [sample for sample in stats['individual_results'] if not sample.success]
+    if not failures:
+        return 0.0
+    return sum(sample.error_kind == ErrorKind.TIMEOUT for sample in failures) / len(failures) * 100
+
+
+def run_benchmarks(quick=False):
+    """
+    Run every benchmark.
+
+    Args:
+        quick (bool): Use about a tenth of the probes
+
+    Returns:
+        dict: Metric name -> measured value (see METRICS)
+    """
+    scale = 0.1 if quick else 1
+    results = {}
+    results['async_probes_per_second'], results['async_cpu_us_per_probe'] = \
+        measure_throughput('async', int(20000 * scale))
+    results['thread_probes_per_second'], _ = measure_throughput('thread', int(5000 * scale))
+    results['bytes_per_sample'] = measure_memory_per_sample(int(20000 * scale))
+    results['timing_error_ms'] = measure_timing_accuracy(0.02, max(10, int(50 * scale)))
+    results['loss_error_pct'] = measure_loss_accuracy(0.2, max(100, int(500 * scale)))
+    results['saturation_timeout_pct'] = measure_saturation(20)
+    return results
+
+
+def compare(results, baseline):
+    """
+    Compare benchmark results with a baseline.
+
+    A metric regresses when it is worse than the baseline value by more than
+    its relative tolerance plus absolute slack (from METRICS, or from the
+    baseline's own ``tolerances`` section when present).
+
+    Args:
+        results (dict): Output of run_benchmarks
+        baseline (dict): Baseline file contents
+
+    Returns:
+        list: Human-readable regression messages (empty when none regressed)
+    """
+    regressions = []
+    for name, value in results.items():
+        if name not in baseline['metrics']:
+            continue
+        unit, higher_is_better, tolerance, slack = METRICS[name]
+        tolerance, slack = baseline.get('tolerances', {}).get(name, (tolerance, slack))
+        expected = baseline['metrics'][name]
+        if higher_is_better:
+            limit = expected * (1 - tolerance) - slack
+            regressed = value < limit
+        else:
+            limit = expected * (1 + tolerance) + slack
+            regressed = value > limit
+        if regressed:
+            regressions.append(f"{name}: {value:.3f} {unit} (baseline {expected:.3f}, limit {limit:.3f})")
+    return regressions
+
+
+def load_baseline(filename=DEFAULT_BASELINE):
+    try:
+        with open(filename, 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(results, filename=DEFAULT_BASELINE, quick=False):
+    baseline = {
+        'created': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'quick': quick,
+        'metrics': results,
+    }
+    with open(filename, 'w') as file:
+        json.dump(baseline, file, indent=2)
+
+
+def main(argv=None):
+    """
+    Command-line entry point.
+
+    Returns:
+        int: 0 when no metric regressed, 1 otherwise
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the latency tester against loopback servers")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument('--update-baseline', action='store_true', help="Store these results as the baseline")
+    parser.add_argument('--quick', action='store_true', help="Run about a tenth of the probes")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.quick)
+    print("\n=== Benchmark results ===")
+    for name, value in results.items():
+        print(f"{name}: {value:.3f} {METRICS[name][0]}")
+
+    if args.update_baseline:
+        save_baseline(results, args.baseline, args.quick)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        save_baseline(results, args.baseline, args.quick)
+        print(f"\nNo baseline yet; these results were written to {args.baseline}")
+        return 0
+    if baseline.get('quick', False) != args.quick:
+        # Fixed costs are spread over fewer probes in quick runs, so the sizes must match
+        print(f"\nThe baseline was recorded {'with' if baseline.get('quick') else 'without'} --quick; "
+              f"rerun the same way to compare.")
+        return 1
+    regressions = compare(results, baseline)
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\nNo regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
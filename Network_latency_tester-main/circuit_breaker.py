@@ -0,0 +1,224 @@
+"""
+Per-target circuit breaker and adaptive probe timeouts.
+
+A blackholed target makes every probe wait for the full timeout, holding a
+worker (or an in-flight slot) the whole time. CircuitBreaker tracks each
+target's health:
+
+* closed - probes run normally.
+* open - after ``failure_threshold`` consecutive timeouts, probes are
+  short-circuited and fail at once with ErrorKind.CIRCUIT_OPEN.
+* half-open - once the backoff has elapsed, a single recovery probe is let
+  through. Any answer (even a refusal) closes the circuit again; another
+  timeout reopens it with the backoff doubled, up to ``max_backoff``.
+
+allow() tags that recovery probe with TRIAL; pass its return value back to
+record() so that only the trial's result moves an open circuit. Probes that
+were started before the circuit opened and finish late are ignored.
+At most ``max_targets`` targets are tracked: when a new one arrives, the
+least recently used closed target is forgotten, or the least recently used
+open one when none is closed, so sweeping a large address range (even a
+blackholed one) does not grow the breaker without limit.
+
+With ``adaptive_timeout`` the breaker also keeps RFC 6298 style smoothed
+latency and variation per target and shortens the probe timeout to
+``srtt + 4 * rttvar`` (at least ``min_timeout``, at most the caller's
+timeout). The timeout doubles after each consecutive timeout, so a target
+that slowed down is not declared dead by a single slow probe.
+
+    breaker = CircuitBreaker(failure_threshold=3, adaptive_timeout=True)
+    tester = AdvancedLatencyTester(circuit_breaker=breaker)
+"""
+import threading
+import time
+
+from sample_store import ErrorKind
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+TRIAL = 'trial'  # allow() result for the half-open recovery probe
+
+
+class TargetHealth:
+    """Breaker state and latency estimate of one target."""
+
+    __slots__ = ('state', 'consecutive_timeouts', 'backoff', 'retry_at', 'probing', 'trips',
+                 'short_circuited', 'srtt', 'rttvar', 'samples')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.consecutive_timeouts = 0
+        self.backoff = 0.0  # seconds the circuit stays open before the next recovery probe
+        self.retry_at = 0.0
+        self.probing = False  # a half-open recovery probe is in flight
+        self.trips = 0
+        self.short_circuited = 0
+        self.srtt = None  # smoothed latency (ms)
+        self.rttvar = 0.0  # smoothed latency variation (ms)
+        self.samples = 0
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, base_backoff=1.0, max_backoff=300.0, adaptive_timeout=False,
+                 min_timeout=0.25, warmup=5, max_targets=10000, clock=time.monotonic):
+        """
+        Args:
+            failure_threshold (int): Consecutive timeouts that open a target's circuit
+            base_backoff (float): Seconds before the first recovery probe
+            max_backoff (float): Upper limit of the doubling backoff
+            adaptive_timeout (bool): Derive probe timeouts from observed latencies
+            min_timeout (float): Lower limit of adaptive timeouts in seconds
+            warmup (int): Successful probes needed before timeouts adapt
+            max_targets (int): Targets tracked at once; the least recently used
+                closed target is evicted first
+            clock (callable): Monotonic time source in seconds
+        """
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.adaptive_timeout = adaptive_timeout
+        self.min_timeout = min_timeout
+        self.warmup = warmup
+        self.max_targets = max_targets
+        self.clock = clock
+        self.targets = {}  # target -> TargetHealth, least recently used first
+        self._lock = threading.Lock()
+
+    def _health(self, target):
+        health = self.targets.pop(target, None)
+        if health is None:
+            health = TargetHealth()
+            if len(self.targets) >= self.max_targets:
+                self._evict()
+        self.targets[target] = health
+        return health
+
+    def _evict(self):
+        # Closed targets go first: forgetting an open one lets its probes through again
+        for target, health in self.targets.items():
+            if health.state == CLOSED:
+                del self.targets[target]
+                return
+        # Every target is open, e.g. a blackholed range: drop the least recently used
+        del self.targets[next(iter(self.targets))]
+
+    def allow(self, target):
+        """
+        Decide whether a probe of ``target`` may run now.
+
+        Returns:
+            False when the probe should be short-circuited, TRIAL for the
+            half-open recovery probe and True otherwise
+        """
+        with self._lock:
+            health = self._health(target)
+            if health.state == CLOSED:
+                return True
+            if health.state == OPEN and self.clock() >= health.retry_at:
+                health.state = HALF_OPEN
+            if health.state == HALF_OPEN and not health.probing:
+                health.probing = True
+                return TRIAL
+            health.short_circuited += 1
+            return False
+
+    def timeout_for(self, target, timeout):
+        """Probe timeout for ``target``: ``timeout``, or less once its latency is known."""
+        if not self.adaptive_timeout:
+            return timeout
+        health = self.targets.get(target)
+        if health is None or health.samples < self.warmup:
+            return timeout
+        adaptive = (health.srtt + 4 * health.rttvar) / 1000 * 2 ** health.consecutive_timeouts
+        return min(timeout, max(self.min_timeout, adaptive))
+
+    def record(self, target, latency_ms, error_kind, allowed=True):
+        """
+        Update ``target``'s health with the outcome of a probe that was allowed to run.
+
+        Args:
+            target (str): Target the probe ran against
+            latency_ms (float): Measured latency
+            error_kind (ErrorKind): Outcome of the probe
+            allowed: The value allow() returned for this probe
+        """
+        with self._lock:
+            health = self._health(target)
+            if allowed == TRIAL:
+                health.probing = False
+            elif health.state != CLOSED:
+                # Started before the circuit opened, so it says nothing about recovery
+                return
+            if error_kind == ErrorKind.TIMEOUT:
+                health.consecutive_timeouts += 1
+                if health.state == HALF_OPEN:
+                    self._open(health, min(self.max_backoff, health.backoff * 2))
+                elif health.state == CLOSED and health.consecutive_timeouts >= self.failure_threshold:
+                    self._open(health, self.base_backoff)
+                return
+            # Any answer, even a refusal, shows the target is not blackholed
+            health.state = CLOSED
+            health.consecutive_timeouts = 0
+            health.backoff = 0.0
+            if error_kind == ErrorKind.NONE:
+                self._update_latency(health, latency_ms)
+
+    def release(self, target, allowed):
+        """Give back the slot of a probe that was cancelled before it finished."""
+        if allowed != TRIAL:
+            return
+        with self._lock:
+            health = self.targets.get(target)
+            if health is not None:
+                health.probing = False
+
+    def _open(self, health, backoff):
+        health.state = OPEN
+        health.backoff = backoff
+        health.retry_at = self.clock() + backoff
+        health.trips += 1
+
+    @staticmethod
+    def _update_latency(health, latency_ms):
+        # RFC 6298: RTTVAR <- 3/4 RTTVAR + 1/4 |SRTT - R|, SRTT <- 7/8 SRTT + 1/8 R
+        if health.srtt is None:
+            health.srtt = latency_ms
+            health.rttvar = latency_ms / 2
+        else:
+            health.rttvar += (abs(health.srtt - latency_ms) - health.rttvar) / 4
+            health.srtt += (latency_ms - health.srtt) / 8
+        health.samples += 1
+
+    def health(self, target):
+        """
+        Snapshot of one target's breaker state. Unknown targets report a
+        closed circuit and are not added.
+
+        Returns:
+            dict: state, consecutive_timeouts, trips, short_circuited,
+            retry_in_s (0 unless open), srtt_ms and the current adaptive timeout
+        """
+        with self._lock:
+            health = self.targets.get(target)
+            if health is None:
+                health = TargetHealth()
+            retry_in = max(0.0, health.retry_at - self.clock()) if health.state == OPEN else 0.0
+            adaptive = self.timeout_for(target, float('inf'))
+            return {
+                'state': health.state,
+                'consecutive_timeouts': health.consecutive_timeouts,
+                'trips': health.trips,
+                'short_circuited': health.short_circuited,
+                'retry_in_s': retry_in,
+                'srtt_ms': health.srtt,
+                'timeout_s': adaptive if adaptive != float('inf') else None,
+            }
+
+    def open_targets(self):
+        """Targets whose circuit is currently open or half-open."""
+        with self._lock:
+            return [target for target, health in self.targets.items() if health.state != CLOSED]
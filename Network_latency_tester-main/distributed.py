@@ -0,0 +1,579 @@
+"""
+Distributed probing from many vantage points.
+
+A Coordinator hands out probe plans to ProbeAgent processes over TCP. Each
+agent dials out to the coordinator and keeps one long-lived connection that
+carries every plan it runs; the connection is reopened with backoff if it
+drops. An agent probes with its own AdvancedLatencyTester and streams the
+results back in one of two modes:
+
+* ``aggregate`` - once per target, the mergeable ProbeRecorder state
+  (streaming moments and histogram). The traffic does not depend on the
+  number of probes, so dozens of agents can run large plans without any
+  per-probe traffic reaching the coordinator.
+* ``samples`` - binary batches of per-probe records (latency, error kind,
+  phase timings and error message). The coordinator feeds them to its
+  tester's result log, history store and listeners as target
+  ``agent/host:port``.
+
+Backpressure is credit based. The coordinator grants each agent ``window``
+sample batches and returns a credit for every batch it has processed. An
+agent that runs out of credits stops probing until more arrive, so a slow
+coordinator slows the agents down instead of queueing their results.
+
+Every frame is a HEADER (magic, message type, payload length) followed by
+the payload. Sample batches are binary; all other messages are JSON.
+
+    coordinator = Coordinator(host='0.0.0.0', port=7100).start()
+    coordinator.wait_for_agents(3)
+    results = coordinator.run_plan([('example.com', 443)], num_tests=100)
+
+    # on each vantage point
+    python distributed.py agent --coordinator coordinator.example:7100 --name fra1
+"""
+import asyncio
+import itertools
+import json
+import math
+import socket
+import struct
+import threading
+import time
+
+from Advanced_Network_Latency_Tester import AdvancedLatencyTester, ProbeRecorder
+from result_log import BINARY_PHASES
+from sample_store import ErrorKind
+
+MAGIC = b'NLTD'
+PROTOCOL_VERSION = 1
+# magic, message type, payload length
+HEADER = struct.Struct('!4sBI')
+# plan id, target index; followed by SAMPLE records
+BATCH = struct.Struct('!IH')
+# latency (ms, NaN when not measured), error kind, error message length, then one
+# duration per BINARY_PHASES entry (NaN when not measured); followed by the message
+SAMPLE = struct.Struct('!dBH4d')
+MAX_ERROR_BYTES = 1024
+MAX_PAYLOAD = 16 * 1024 * 1024
+MODES = ('aggregate', 'samples')
+# A plan's default deadline is its worst case (every probe timing out one after another),
+# at most MAX_DEFAULT_DEADLINE_S, plus PLAN_GRACE_S
+MAX_DEFAULT_DEADLINE_S = 600
+PLAN_GRACE_S = 30
+
+HELLO = 1  # agent -> coordinator: {'name', 'version'}
+WELCOME = 2  # coordinator -> agent: {'name', 'window'}
+PLAN = 3  # coordinator -> agent: probe plan
+SAMPLES = 4  # agent -> coordinator: BATCH + SAMPLE records
+AGGREGATE = 5  # agent -> coordinator: {'plan_id', 'target', 'state'}
+DONE = 6  # agent -> coordinator: {'plan_id', 'error'}
+CREDIT = 7  # coordinator -> agent: {'batches'}
+
+
+async def read_frame(reader):
+    """
+    Read one frame.
+
+    Returns:
+        tuple: (message type, payload bytes)
+
+    Raises:
+        asyncio.IncompleteReadError: The peer closed the connection
+        ConnectionError: The peer sent a malformed frame
+    """
+    magic, kind, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if magic != MAGIC or length > MAX_PAYLOAD:
+        raise ConnectionError("Malformed frame")
+    return kind, await reader.readexactly(length)
+
+
+def encode_frame(kind, payload):
+    """Frame a payload; dicts are sent as JSON."""
+    if isinstance(payload, dict):
+        payload = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return HEADER.pack(MAGIC, kind, len(payload)) + payload
+
+
+class _AgentConnection:
+    """Coordinator-side view of one connected agent."""
+
+    def __init__(self, name, writer):
+        self.name = name
+        self.writer = writer
+        self.plans = {}  # plan id -> (recorders, future)
+        self.batches_received = 0
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, kind, payload):
+        """Write one frame and wait while the agent's socket buffer is full."""
+        async with self._send_lock:
+            self.writer.write(encode_frame(kind, payload))
+            await self.writer.drain()
+
+
+class Coordinator:
+    def __init__(self, host='127.0.0.1', port=7100, tester=None, window=8):
+        """
+        Args:
+            host (str): Address agents connect to
+            port (int): Port to bind (0 picks an ephemeral port)
+            tester (AdvancedLatencyTester): Supplies the result log, history
+                store and listeners that sample batches feed, and
+                calculate_statistics (a default tester when None)
+            window (int): Sample batches an agent may send ahead of the
+                coordinator processing them
+        """
+        self.host = host
+        self.port = port
+        self.tester = tester or AdvancedLatencyTester(keep_individual_results=False)
+        self.window = window
+        self.agents = {}  # name -> _AgentConnection
+        self._plan_ids = itertools.count(1)
+        self._agents_changed = threading.Condition()
+        self._loop = None
+        self._thread = None
+        self._server = None
+
+    @property
+    def address(self):
+        return self.host, self.port
+
+    def start(self):
+        """Accept agents on an event loop running in a daemon thread."""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._serve_agent, self.host, self.port), self._loop).result()
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    def stop(self):
+        """Disconnect every agent and stop the event loop."""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    async def _shutdown(self):
+        self._server.close()
+        for connection in list(self.agents.values()):
+            connection.writer.close()
+        await self._server.wait_closed()
+
+    def wait_for_agents(self, count, timeout=None):
+        """
+        Block until at least ``count`` agents are connected.
+
+        Returns:
+            list: Names of the connected agents
+
+        Raises:
+            TimeoutError: Fewer agents connected within ``timeout`` seconds
+        """
+        with self._agents_changed:
+            if not self._agents_changed.wait_for(lambda: len(self.agents) >= count, timeout):
+                raise TimeoutError(f"Only {len(self.agents)} of {count} agents connected")
+            return list(self.agents)
+
+    async def _serve_agent(self, reader, writer):
+        connection = None
+        try:
+            kind, payload = await read_frame(reader)
+            hello = json.loads(payload) if kind == HELLO else {}
+            if hello.get('version') != PROTOCOL_VERSION:
+                return
+            name = base = hello.get('name') or 'agent'
+            with self._agents_changed:
+                for suffix in itertools.count(2):
+                    if name not in self.agents:
+                        break
+                    name = f"{base}#{suffix}"
+                connection = self.agents[name] = _AgentConnection(name, writer)
+                self._agents_changed.notify_all()
+            await connection.send(WELCOME, {'name': name, 'window': self.window})
+            while True:
+                kind, payload = await read_frame(reader)
+                await self._handle(connection, kind, payload)
+        except (asyncio.IncompleteReadError, OSError, IndexError, KeyError, ValueError):
+            pass  # disconnected, or broke the protocol
+        finally:
+            if connection is not None:
+                with self._agents_changed:
+                    del self.agents[connection.name]
+                    self._agents_changed.notify_all()
+                for _, future in connection.plans.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("Agent disconnected"))
+            writer.close()
+
+    async def _handle(self, connection, kind, payload):
+        # Frames of plans that finished, timed out or were cancelled are dropped
+        if kind == SAMPLES:
+            plan_id, index = BATCH.unpack_from(payload)
+            plan = connection.plans.get(plan_id)
+            if plan is not None:
+                recorder = plan[0][index]
+                for latency_ms, error_kind, error, phases in _unpack_samples(payload, BATCH.size):
+                    recorder.record(latency_ms, error_kind, error, phases)
+            connection.batches_received += 1
+            await connection.send(CREDIT, {'batches': 1})
+        elif kind == AGGREGATE:
+            message = json.loads(payload)
+            plan = connection.plans.get(message['plan_id'])
+            if plan is not None:
+                plan[0][message['target']].merge(ProbeRecorder.from_state(message['state']))
+        elif kind == DONE:
+            message = json.loads(payload)
+            plan = connection.plans.get(message['plan_id'])
+            if plan is None or plan[1].done():
+                return
+            if message['error']:
+                plan[1].set_exception(RuntimeError(message['error']))
+            else:
+                plan[1].set_result(None)
+        else:
+            raise ConnectionError(f"Unexpected message type {kind}")
+
+    async def run_plan_async(self, targets, num_tests=10, timeout=5, probe='tcp', mode='aggregate',
+                             agents=None, batch_size=256, max_in_flight=None, deadline=None):
+        """
+        Have every selected agent probe every target; must run on the coordinator's loop.
+
+        Returns:
+            dict: See run_plan
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {MODES}")
+        targets = [(host, int(port)) for host, port in targets]
+        names = [name for name in (self.agents if agents is None else agents) if name in self.agents]
+        plan_id = next(self._plan_ids)
+        plan = {'plan_id': plan_id, 'targets': targets, 'num_tests': num_tests, 'timeout': timeout,
+                'probe': probe, 'mode': mode, 'batch_size': batch_size, 'max_in_flight': max_in_flight}
+        if deadline is None:
+            deadline = min(len(targets) * num_tests * timeout, MAX_DEFAULT_DEADLINE_S) + PLAN_GRACE_S
+        tester = self.tester
+        futures = {}
+        plan_recorders = {}
+        connections = {}
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        end = loop.time() + deadline
+        try:
+            for name in names:
+                plan_recorders[name] = [_recorder(tester, f"{name}/{host}:{port}") for host, port in targets]
+                futures[name] = loop.create_future()
+                connection = connections[name] = self.agents[name]
+                connection.plans[plan_id] = (plan_recorders[name], futures[name])
+                try:
+                    await asyncio.wait_for(connection.send(PLAN, plan), max(0, end - loop.time()))
+                except OSError:
+                    if not futures[name].done():
+                        futures[name].set_exception(ConnectionError("Agent disconnected"))
+                except asyncio.TimeoutError:
+                    pass  # not reading its connection: fails at the deadline below
+            if futures:
+                await asyncio.wait(futures.values(), timeout=max(0, end - loop.time()))
+        finally:
+            # Later frames for this plan, e.g. after a cancellation, are ignored from here on
+            for connection in connections.values():
+                connection.plans.pop(plan_id, None)
+
+        results = {'agents': {}, 'targets': {}, 'failed_agents': {},
+                   'duration_s': time.perf_counter() - start}
+        merged = [ProbeRecorder(keep_samples=False) for _ in targets]
+        for name, future in futures.items():
+            if not future.done():
+                results['failed_agents'][name] = f"No result within the {deadline:g} s deadline"
+                continue
+            if future.exception() is not None:
+                results['failed_agents'][name] = str(future.exception())
+                continue
+            results['agents'][name] = {}
+            for (host, port), recorder, total in zip(targets, plan_recorders[name], merged):
+                results['agents'][name][f"{host}:{port}"] = tester.calculate_statistics([], recorder)
+                total.merge(recorder)
+        for (host, port), recorder in zip(targets, merged):
+            results['targets'][f"{host}:{port}"] = tester.calculate_statistics([], recorder)
+        return results
+
+    def run_plan(self, targets, num_tests=10, timeout=5, probe='tcp', mode='aggregate', agents=None,
+                 batch_size=256, max_in_flight=None, deadline=None):
+        """
+        Have every connected agent (or the named ``agents``) probe every target.
+
+        Args:
+            targets (list): (host, port) pairs
+            num_tests (int): Probes per target and agent
+            timeout (float): Probe timeout in seconds
+            probe (str): 'tcp', 'tls', 'http' or 'https'
+            mode (str): 'aggregate' or 'samples'
+            agents (list): Agent names (defaults to all connected agents)
+            batch_size (int): Samples per batch in 'samples' mode
+            max_in_flight (int): Concurrent probes per agent (the agent's default when None)
+            deadline (float): Seconds to wait for the agents; those without a
+                result by then are reported as failed. Defaults to the time
+                every probe would take if each timed out one after another,
+                at most MAX_DEFAULT_DEADLINE_S, plus PLAN_GRACE_S. An agent
+                whose connection fails is reported at once
+
+        Returns:
+            dict: ``agents`` ({agent: {"host:port": statistics}}), ``targets``
+            ({"host:port": statistics merged over agents}), ``failed_agents``
+            ({agent: error}) and ``duration_s``
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self.run_plan_async(targets, num_tests, timeout, probe, mode, agents, batch_size, max_in_flight,
+                                deadline),
+            self._loop).result()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class ProbeAgent:
+    def __init__(self, coordinator_address, name=None, tester=None, reconnect_delay=1.0,
+                 max_reconnect_delay=30.0):
+        """
+        Args:
+            coordinator_address (tuple): Coordinator (host, port)
+            name (str): Agent name reported to the coordinator (defaults to the hostname)
+            tester (AdvancedLatencyTester): Runs the probes (a default tester when None)
+            reconnect_delay (float): Seconds before the first reconnect attempt
+            max_reconnect_delay (float): Upper limit of the doubling reconnect delay
+        """
+        self.coordinator_address = coordinator_address
+        self.name = name or socket.gethostname()
+        self.tester = tester or AdvancedLatencyTester(keep_individual_results=False)
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.assigned_name = None  # name the coordinator knows this agent by
+        self.plans_completed = 0
+        self.probes_sent = 0
+        self._loop = None
+        self._stop_event = None
+        self._thread = None
+
+    def start(self):
+        """Run the agent on a daemon thread."""
+        started = threading.Event()
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.run_async(started)), daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_forever(self):
+        """Run the agent on the calling thread until interrupted."""
+        try:
+            asyncio.run(self.run_async())
+        except KeyboardInterrupt:
+            pass
+
+    async def run_async(self, started=None):
+        """Stay connected to the coordinator, reconnecting with backoff, until stopped."""
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        if started is not None:
+            started.set()
+        delay = self.reconnect_delay
+        while not self._stop_event.is_set():
+            session = asyncio.ensure_future(self._session())
+            stopping = asyncio.ensure_future(self._stop_event.wait())
+            await asyncio.wait((session, stopping), return_when=asyncio.FIRST_COMPLETED)
+            stopping.cancel()
+            if not session.done():
+                session.cancel()
+            try:
+                if await session:
+                    delay = self.reconnect_delay  # the session got as far as WELCOME
+            except asyncio.CancelledError:
+                break
+            except (OSError, asyncio.IncompleteReadError, KeyError, ValueError):
+                pass  # coordinator unreachable, gone or speaking another protocol
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), delay)
+            except asyncio.TimeoutError:
+                delay = min(self.max_reconnect_delay, delay * 2)
+
+    async def _session(self):
+        """Serve plans over one connection; returns True once the coordinator accepted the agent."""
+        reader, writer = await asyncio.open_connection(*self.coordinator_address)
+        plans = set()
+        try:
+            writer.write(encode_frame(HELLO, {'name': self.name, 'version': PROTOCOL_VERSION}))
+            await writer.drain()
+            kind, payload = await read_frame(reader)
+            if kind != WELCOME:
+                raise ConnectionError("Coordinator did not accept the agent")
+            welcome = json.loads(payload)
+            self.assigned_name = welcome['name']
+            credits = asyncio.Semaphore(welcome['window'])
+            send_lock = asyncio.Lock()
+
+            async def send(kind, payload):
+                async with send_lock:
+                    writer.write(encode_frame(kind, payload))
+                    await writer.drain()
+
+            def finished(task):
+                plans.discard(task)
+                if not task.cancelled() and task.exception() is not None:
+                    # A plan could not report back: drop the connection so the
+                    # coordinator fails this agent's share now, not at its deadline
+                    writer.transport.abort()
+
+            while True:
+                try:
+                    kind, payload = await read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    return True
+                if kind == PLAN:
+                    task = asyncio.ensure_future(self._run_plan(json.loads(payload), send, credits))
+                    plans.add(task)
+                    task.add_done_callback(finished)
+                elif kind == CREDIT:
+                    for _ in range(json.loads(payload)['batches']):
+                        credits.release()
+        finally:
+            for task in list(plans):
+                task.cancel()
+            writer.close()
+
+    async def _run_plan(self, plan, send, credits):
+        tester = self.tester
+        targets = plan['targets']
+        sampling = plan['mode'] == 'samples'
+        batch_bytes = max(1, plan['batch_size']) * SAMPLE.size
+        recorders = [_recorder(tester, f"{host}:{port}") for host, port in targets]
+        batches = [bytearray() for _ in targets]
+        slots = ((index, host, port) for index, (host, port) in enumerate(targets)
+                 for _ in range(plan['num_tests']))
+
+        flushing = asyncio.Lock()
+
+        async def flush(index, final=False):
+            # Holding the lock while waiting for credit also holds back the other workers
+            async with flushing:
+                if not batches[index] or (len(batches[index]) < batch_bytes and not final):
+                    return  # another worker flushed this batch meanwhile
+                await credits.acquire()
+                batch = bytes(batches[index])
+                batches[index].clear()
+                await send(SAMPLES, BATCH.pack(plan['plan_id'], index) + batch)
+
+        async def worker():
+            # All workers share one iterator, so every slot is probed exactly once
+            for index, host, port in slots:
+                if flushing.locked():
+                    async with flushing:
+                        pass  # the coordinator is behind; wait before probing more
+                outcome = await tester._probe_async(host, port, plan['timeout'], plan['probe'])
+                recorders[index].record(*outcome)
+                self.probes_sent += 1
+                if sampling:
+                    batches[index] += _pack_sample(*outcome[:4])
+                    if len(batches[index]) >= batch_bytes:
+                        await flush(index)
+
+        error = None
+        try:
+            in_flight = plan['max_in_flight'] or tester.max_in_flight
+            probes = len(targets) * plan['num_tests']
+            await asyncio.gather(*(worker() for _ in range(max(1, min(in_flight, probes)))))
+            for index, recorder in enumerate(recorders):
+                if sampling:
+                    await flush(index, final=True)
+                else:
+                    await send(AGGREGATE, {'plan_id': plan['plan_id'], 'target': index,
+                                           'state': recorder.to_state()})
+        except OSError:
+            raise  # the connection is broken; _session drops it
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        await send(DONE, {'plan_id': plan['plan_id'], 'error': error})
+        self.plans_completed += 1
+
+
+def _pack_sample(latency_ms, error_kind, error, phases):
+    """Encode one probe outcome as a SAMPLE record and its error message."""
+    message = (error or '').encode('utf-8')[:MAX_ERROR_BYTES]
+    phases = phases or {}
+    durations = [math.nan if phases.get(name) is None else phases[name] for name in BINARY_PHASES]
+    return SAMPLE.pack(math.nan if latency_ms is None else latency_ms, error_kind, len(message),
+                       *durations) + message
+
+
+def _unpack_samples(payload, offset):
+    """Yield (latency_ms, error_kind, error, phases) for the records from ``offset`` on."""
+    while offset < len(payload):
+        latency_ms, error_kind, length, *durations = SAMPLE.unpack_from(payload, offset)
+        offset += SAMPLE.size
+        error = payload[offset:offset + length].decode('utf-8', 'replace') if length else None
+        offset += length
+        phases = {name: value for name, value in zip(BINARY_PHASES, durations) if not math.isnan(value)}
+        yield None if math.isnan(latency_ms) else latency_ms, ErrorKind(error_kind), error, phases or None
+
+
+def _recorder(tester, target):
+    """A sample-less ProbeRecorder feeding ``tester``'s result log, history store and listeners."""
+    return ProbeRecorder(keep_samples=False, target=target, result_log=tester.result_log,
+                         history_store=tester.history_store, listeners=tester.listeners)
+
+
+def _address(value):
+    host, _, port = value.rpartition(':')
+    return host.strip('[]') or '127.0.0.1', int(port)
+
+
+def main(argv=None):
+    """Run a probe agent, or a coordinator that runs one plan over its agents."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Distributed latency probing")
+    commands = parser.add_subparsers(dest='command', required=True)
+    agent = commands.add_parser('agent', help="Probe on behalf of a coordinator")
+    agent.add_argument('--coordinator', required=True, metavar='HOST:PORT', help="Coordinator address")
+    agent.add_argument('--name', help="Agent name (defaults to the hostname)")
+    coordinate = commands.add_parser('coordinate', help="Run one plan over connected agents")
+    coordinate.add_argument('targets', nargs='+', metavar='HOST:PORT', help="Targets to probe")
+    coordinate.add_argument('--host', default='0.0.0.0', help="Address to bind")
+    coordinate.add_argument('--port', type=int, default=7100, help="Port to bind")
+    coordinate.add_argument('--agents', type=int, default=1, help="Agents to wait for")
+    coordinate.add_argument('--num-tests', type=int, default=10, help="Probes per target and agent")
+    coordinate.add_argument('--timeout', type=float, default=5, help="Probe timeout in seconds")
+    coordinate.add_argument('--probe', default='tcp', help="tcp, tls, http or https")
+    coordinate.add_argument('--mode', choices=MODES, default='aggregate', help="What agents send back")
+    args = parser.parse_args(argv)
+
+    if args.command == 'agent':
+        print(f"Agent {args.name or socket.gethostname()} connecting to {args.coordinator} (Ctrl+C to stop)")
+        ProbeAgent(_address(args.coordinator), args.name).run_forever()
+        return
+
+    with Coordinator(args.host, args.port) as coordinator:
+        print(f"Coordinator on {args.host}:{coordinator.port}, waiting for {args.agents} agent(s)")
+        coordinator.wait_for_agents(args.agents)
+        results = coordinator.run_plan([_address(target) for target in args.targets], args.num_tests,
+                                       args.timeout, args.probe, args.mode)
+    for name, error in results['failed_agents'].items():
+        print(f"{name}: failed ({error})")
+    for name, per_target in results['agents'].items():
+        for target, stats in per_target.items():
+            print(f"{name:<16} {target:<28} {stats['successful_tests']}/{stats['total_tests']} ok, "
+                  f"median {stats['median_latency_ms']:.2f} ms, p99 {stats['p99_latency_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Persistent, indexed history of probe results in SQLite.
+
+HistoryStore keeps raw samples plus 1 minute, 1 hour and 1 day rollups per
+target. Each rollup row stores the bucket's count, failures, mean, p50 and
+p99 together with its mergeable StreamingStatistics state, so a query such
+as "p99 for target X over the last 30 days" merges about 30 daily rows
+(plus hourly and minute rows at the range edges) instead of scanning raw
+samples.
+
+Probe results are buffered and written in one transaction per batch. The
+store has the same ``record_probe`` signature as ResultLogWriter, so it can
+be attached to a tester directly:
+
+    store = HistoryStore('network_test_history.db')
+    tester = AdvancedLatencyTester(history_store=store)
+    ...
+    store.query('example.com:443', since=time.time() - 30 * 86400)['p99_ms']
+"""
+import json
+import math
+import sqlite3
+import threading
+import time
+
+from sample_store import ErrorKind
+from streaming_statistics import StreamingStatistics
+
+# Rollup resolutions in seconds, finest first
+ROLLUP_RESOLUTIONS = (60, 3600, 86400)
+
+# Seconds each level is kept by prune() (None keeps it forever)
+DEFAULT_RETENTION = {
+    'raw': 7 * 86400,
+    60: 30 * 86400,
+    3600: 400 * 86400,
+    86400: None,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS targets (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS samples (
+    target_id INTEGER NOT NULL,
+    timestamp_ns INTEGER NOT NULL,
+    latency_ms REAL,
+    error_kind INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS samples_target_time ON samples (target_id, timestamp_ns);
+CREATE INDEX IF NOT EXISTS samples_time ON samples (timestamp_ns);
+CREATE TABLE IF NOT EXISTS rollups (
+    resolution INTEGER NOT NULL,
+    target_id INTEGER NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    failures INTEGER NOT NULL,
+    mean_ms REAL,
+    p50_ms REAL,
+    p99_ms REAL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (resolution, target_id, bucket_start)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS runs (
+    test_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    target TEXT,
+    statistics TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp);
+"""
+
+
+def _summary(accumulator):
+    """count/failures/loss/mean/p50/p99 of an accumulator (latency values are None without successes)."""
+    total = accumulator.total_tests
+    return {
+        'count': total,
+        'failures': accumulator.failed_tests,
+        'loss_percentage': accumulator.failed_tests / total * 100 if total else 0,
+        'mean_ms': accumulator.mean if accumulator.count else None,
+        'p50_ms': accumulator.percentile(0.5) if accumulator.count else None,
+        'p99_ms': accumulator.percentile(0.99) if accumulator.count else None,
+    }
+
+
+def _cover(start, end, resolutions):
+    """
+    Split ``[start, end)`` (seconds) into (resolution, first bucket, end) ranges.
+
+    Whole buckets of the coarsest resolution cover the middle and finer ones
+    the edges. The finest resolution rounds the edges outwards.
+    """
+    width, finer = resolutions[-1], resolutions[:-1]
+    if not finer:
+        return [(width, start // width * width, math.ceil(end / width) * width)] if start < end else []
+    low = math.ceil(start / width) * width
+    high = end // width * width
+    if low >= high:
+        return _cover(start, end, finer)
+    return _cover(start, low, finer) + [(width, low, high)] + _cover(high, end, finer)
+
+
+class HistoryStore:
+    def __init__(self, filename='network_test_history.db', batch_size=1000, retention=None):
+        """
+        Args:
+            filename (str): SQLite database file (':memory:' for a throwaway store)
+            batch_size (int): Buffered probe results that trigger a write transaction
+            retention (dict): Seconds to keep 'raw' samples and each rollup
+                resolution (see DEFAULT_RETENTION)
+        """
+        self.filename = filename
+        self.batch_size = batch_size
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self._lock = threading.Lock()
+        self._pending = []  # (target, timestamp_ns, latency_ms, error_kind)
+        self._target_ids = {}
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(SCHEMA)
+        for target_id, name in self._connection.execute('SELECT id, name FROM targets'):
+            self._target_ids[name] = target_id
+
+    def record_probe(self, target, latency_ms, error_kind, error=None, phases=None, tls_resumed=None,
+                     timestamp_ns=None):
+        """
+        Buffer one probe result (same signature as ResultLogWriter.record_probe).
+
+        Args:
+            target (str): Target name, e.g. ``host:port``
+            latency_ms (float): Measured latency (None or ``inf`` on failure)
+            error_kind (ErrorKind): Error classification
+            timestamp_ns (int): Wall-clock time in ns (defaults to now)
+        """
+        timestamp_ns = time.time_ns() if timestamp_ns is None else timestamp_ns
+        with self._lock:
+            self._pending.append((target, timestamp_ns, latency_ms, int(error_kind)))
+            if len(self._pending) >= self.batch_size:
+                self._write_pending()
+
+    def flush(self):
+        """Write every buffered probe result."""
+        with self._lock:
+            self._write_pending()
+
+    def _target_id(self, name):
+        target_id = self._target_ids.get(name)
+        if target_id is None:
+            self._connection.execute('INSERT OR IGNORE INTO targets (name) VALUES (?)', (name,))
+            target_id = self._connection.execute('SELECT id FROM targets WHERE name = ?', (name,)).fetchone()[0]
+            self._target_ids[name] = target_id
+        return target_id
+
+    def _write_pending(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        with self._connection:
+            rows = []
+            buckets = {}  # (resolution, target id, bucket start) -> StreamingStatistics
+            for target, timestamp_ns, latency_ms, error_kind in pending:
+                target_id = self._target_id(target)
+                success = error_kind == ErrorKind.NONE
+                rows.append((target_id, timestamp_ns,
+                             None if latency_ms is None or math.isinf(latency_ms) else latency_ms, error_kind))
+                seconds = timestamp_ns // 1_000_000_000
+                for resolution in ROLLUP_RESOLUTIONS:
+                    key = (resolution, target_id, seconds // resolution * resolution)
+                    accumulator = buckets.get(key)
+                    if accumulator is None:
+                        accumulator = buckets[key] = StreamingStatistics()
+                    if success:
+                        accumulator.add(latency_ms)
+                    else:
+                        accumulator.add_failure()
+            self._connection.executemany(
+                'INSERT INTO samples (target_id, timestamp_ns, latency_ms, error_kind) VALUES (?, ?, ?, ?)', rows)
+            for key, accumulator in buckets.items():
+                existing = self._connection.execute(
+                    'SELECT state FROM rollups WHERE resolution = ? AND target_id = ? AND bucket_start = ?',
+                    key).fetchone()
+                if existing is not None:
+                    accumulator = StreamingStatistics.from_state(json.loads(existing[0])).merge(accumulator)
+                summary = _summary(accumulator)
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (*key, summary['count'], summary['failures'], summary['mean_ms'], summary['p50_ms'],
+                     summary['p99_ms'], json.dumps(accumulator.to_state())))
+
+    def record_run(self, test_id, statistics, target=None):
+        """Persist the summary of a comprehensive test run (per-probe results are left out)."""
+        summary = {key: value for key, value in statistics.items() if key != 'individual_results'}
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT INTO runs (test_id, timestamp, target, statistics) VALUES (?, ?, ?, ?)',
+                (test_id, statistics.get('test_timestamp', ''), target, json.dumps(summary)))
+
+    def recent_runs(self, limit=10):
+        """
+        Return the most recent recorded runs, newest first.
+
+        Returns:
+            list: {'test_id', 'timestamp', 'target', 'statistics'} dicts
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT test_id, timestamp, target, statistics FROM runs ORDER BY timestamp DESC LIMIT ?',
+                (limit,)).fetchall()
+        return [{'test_id': test_id, 'timestamp': timestamp, 'target': target, 'statistics': json.loads(stats)}
+                for test_id, timestamp, target, stats in rows]
+
+    def targets(self):
+        """Names of every target with stored samples."""
+        with self._lock:
+            return [name for (name,) in self._connection.execute('SELECT name FROM targets ORDER BY name')]
+
+    def query(self, target, since, until=None):
+        """
+        Summarise a target over a time range from the rollups.
+
+        The range is covered by whole daily buckets in the middle and hourly
+        and minute buckets at the edges, so the answer is exact to the minute
+        and percentiles are within 1% of a true sample value.
+
+        Args:
+            target (str): Target name
+            since (float): Range start, Unix seconds
+            until (float): Range end, Unix seconds (defaults to now)
+
+        Returns:
+            dict: count, failures, loss_percentage, mean_ms, p50_ms, p99_ms
+        """
+        self.flush()
+        until = time.time() if until is None else until
+        merged = StreamingStatistics()
+        with self._lock:
+            target_id = self._target_ids.get(target)
+            if target_id is not None:
+                for resolution, start, end in _cover(int(since), math.ceil(until), ROLLUP_RESOLUTIONS):
+                    for (state,) in self._connection.execute(
+                            'SELECT state FROM rollups WHERE resolution = ? AND target_id = ? '
+                            'AND bucket_start >= ? AND bucket_start < ?',
+                            (resolution, target_id, start, end)):
+                        merged.merge(StreamingStatistics.from_state(json.loads(state)))
+        return _summary(merged)
+
+    def series(self, target, since, until=None, resolution=60):
+        """
+        Per-bucket rollups of one resolution over a time range.
+
+        Returns:
+            list: {'bucket_start', 'count', 'failures', 'loss_percentage',
+            'mean_ms', 'p50_ms', 'p99_ms'} dicts in time order
+        """
+        if resolution not in ROLLUP_RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {resolution}, expected one of {ROLLUP_RESOLUTIONS}")
+        self.flush()
+        until = time.time() if until is None else until
+        with self._lock:
+            target_id = self._target_ids.get(target)
+            rows = self._connection.execute(
+                'SELECT bucket_start, count, failures, mean_ms, p50_ms, p99_ms FROM rollups '
+                'WHERE resolution = ? AND target_id = ? AND bucket_start >= ? AND bucket_start < ? '
+                'ORDER BY bucket_start',
+                (resolution, target_id, int(since) // resolution * resolution, until)).fetchall()
+        return [{'bucket_start': start, 'count': count, 'failures': failures,
+                 'loss_percentage': failures / count * 100 if count else 0,
+                 'mean_ms': mean, 'p50_ms': p50, 'p99_ms': p99}
+                for start, count, failures, mean, p50, p99 in rows]
+
+    def samples(self, target, since, until=None):
+        """Yield raw (timestamp_ns, latency_ms, ErrorKind) rows of one target in time order."""
+        self.flush()
+        until = time.time() if until is None else until
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT timestamp_ns, latency_ms, error_kind FROM samples '
+                'WHERE target_id = ? AND timestamp_ns >= ? AND timestamp_ns < ? ORDER BY timestamp_ns',
+                (self._target_ids.get(target), int(since * 1e9), int(until * 1e9))).fetchall()
+        for timestamp_ns, latency_ms, error_kind in rows:
+            yield timestamp_ns, latency_ms, ErrorKind(error_kind)
+
+    def prune(self, now=None):
+        """Delete raw samples and rollups older than their retention."""
+        self.flush()
+        now = time.time() if now is None else now
+        with self._lock, self._connection:
+            if self.retention.get('raw') is not None:
+                self._connection.execute('DELETE FROM samples WHERE timestamp_ns < ?',
+                                         (int((now - self.retention['raw']) * 1e9),))
+            for resolution in ROLLUP_RESOLUTIONS:
+                if self.retention.get(resolution) is not None:
+                    self._connection.execute('DELETE FROM rollups WHERE resolution = ? AND bucket_start < ?',
+                                             (resolution, now - self.retention[resolution]))
+
+    def close(self):
+        with self._lock:
+            self._write_pending()
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,432 @@
+"""
+Instrumentation for the tester itself.
+
+LatencyTesterMetrics holds counters, gauges and histograms that the tester
+updates around its hot paths (probes, perform_single_test,
+perform_parallel_tests, calculate_statistics). MetricsServer serves them in the Prometheus text
+format and lets profilers be switched on and off while the tester runs:
+
+    metrics = LatencyTesterMetrics()
+    tester = AdvancedLatencyTester(metrics=metrics)
+    MetricsServer(metrics, port=9464).start()
+
+    curl http://127.0.0.1:9464/metrics
+    curl -X POST http://127.0.0.1:9464/profile/sampling/start
+    curl -X POST http://127.0.0.1:9464/profile/sampling/stop    # folded stacks
+    curl -X POST http://127.0.0.1:9464/profile/cprofile/start
+    curl -X POST http://127.0.0.1:9464/profile/cprofile/stop    # pstats report
+
+The sampling profiler sees every thread at once. cProfile only traces the
+thread that enables it, so it is attached to each instrumented tester call
+that starts while it is switched on.
+"""
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _StackCounter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from sample_store import ErrorKind
+
+# Histogram bucket upper bounds in seconds, from 100 us to 10 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Probe outcome label for each ErrorKind
+OUTCOME_LABELS = {kind: 'success' if kind == ErrorKind.NONE else kind.name.lower() for kind in ErrorKind}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values tuple -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(label) for label in labels)
+
+    def value(self, *labels):
+        """Current value for the given label values (0 when never set)."""
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values (Prometheus semantics)."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def value(self, *labels):
+        """Sum of the observed values."""
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((labels, ([*counts], total, count))
+                           for labels, (counts, total, count) in self._values.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = (('le', _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class CProfileHook:
+    """
+    cProfile that can be switched on at runtime.
+
+    While enabled, every instrumented call that is the outermost one on its
+    thread runs under its own cProfile.Profile; the results are pooled until
+    the hook is stopped.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._stats = None
+        self._lock = threading.Lock()
+        self._active = threading.local()
+
+    def start(self):
+        with self._lock:
+            self._stats = None
+            self.enabled = True
+
+    def stop(self, sort='cumulative', limit=40):
+        """
+        Switch profiling off.
+
+        Returns:
+            str: pstats report of the calls profiled since start()
+        """
+        with self._lock:
+            self.enabled = False
+            stats, self._stats = self._stats, None
+        if stats is None:
+            return "No instrumented calls ran while cProfile was enabled.\n"
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    @contextmanager
+    def profile(self):
+        """Profile the enclosed block when enabled and not already profiling this thread."""
+        if not self.enabled or getattr(self._active, 'profiling', False):
+            yield
+            return
+        profiler = cProfile.Profile()
+        self._active.profiling = True
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._active.profiling = False
+            with self._lock:
+                if self.enabled:
+                    if self._stats is None:
+                        self._stats = pstats.Stats(profiler)
+                    else:
+                        self._stats.add(profiler)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling every thread's stack from a background thread.
+
+    Samples are counted as folded stacks (``outer;inner;leaf count``), the
+    input format of flame graph tools.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = 0
+        self._stacks = _StackCounter()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        if self.running:
+            return
+        self.interval = interval or self.interval
+        self.samples = 0
+        self._stacks = _StackCounter()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self, limit=200):
+        """
+        Stop sampling.
+
+        Returns:
+            str: The ``limit`` most frequent folded stacks with their sample counts
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return ''.join(f"{stack} {count}\n" for stack, count in self._stacks.most_common(limit))
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self._stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+
+class LatencyTesterMetrics:
+    """The metrics an AdvancedLatencyTester updates, plus its profiler hooks."""
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        self.probes = self.registry.counter(
+            'latency_tester_probes_total', 'Probes completed by probe type and outcome', ('probe', 'outcome'))
+        self.probes_in_flight = self.registry.gauge(
+            'latency_tester_probes_in_flight', 'Probes currently running')
+        self.probe_seconds = self.registry.histogram(
+            'latency_tester_probe_duration_seconds', 'Wall time of one probe including name resolution',
+            ('probe',))
+        self.executor_queue_depth = self.registry.gauge(
+            'latency_tester_executor_queue_depth', 'Probes submitted to the thread pool and waiting for a worker')
+        self.call_seconds = self.registry.histogram(
+            'latency_tester_call_duration_seconds', 'Time spent in instrumented tester calls', ('call',))
+        self.cprofile = CProfileHook()
+        self.sampler = SamplingProfiler()
+
+    def probe_started(self):
+        """Mark a probe as in flight; returns the start time for probe_finished."""
+        self.probes_in_flight.inc()
+        return time.perf_counter()
+
+    def probe_finished(self, probe, outcome, started):
+        self.probes_in_flight.dec()
+        self.probes.inc(probe, OUTCOME_LABELS[outcome[1]])
+        self.probe_seconds.observe(time.perf_counter() - started, probe)
+
+    @contextmanager
+    def timed(self, call):
+        """Observe the duration of the enclosed block, under cProfile when it is switched on."""
+        with self.cprofile.profile():
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.call_seconds.observe(time.perf_counter() - started, call)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    metrics = None  # set on the per-server subclass
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/metrics':
+            self._reply(200, self.metrics.registry.render(), 'text/plain; version=0.0.4; charset=utf-8')
+        else:
+            self._reply(404, "Not found\n")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/profile/cprofile/start':
+            self.metrics.cprofile.start()
+            self._reply(200, "cProfile enabled\n")
+        elif url.path == '/profile/cprofile/stop':
+            self._reply(200, self.metrics.cprofile.stop())
+        elif url.path == '/profile/sampling/start':
+            interval = float(query['interval'][0]) if 'interval' in query else None
+            self.metrics.sampler.start(interval)
+            self._reply(200, f"Sampling every {self.metrics.sampler.interval * 1000:g} ms\n")
+        elif url.path == '/profile/sampling/stop':
+            self._reply(200, self.metrics.sampler.stop())
+        else:
+            self._reply(404, "Not found\n")
+
+    def _reply(self, status, body, content_type='text/plain; charset=utf-8'):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # keep scrapes out of the tester's console output
+
+
+class MetricsServer:
+    def __init__(self, metrics, host='127.0.0.1', port=9464):
+        """
+        Args:
+            metrics (LatencyTesterMetrics): Metrics to serve and profilers to control
+            host (str): Address to bind (loopback by default)
+            port (int): Port to bind (0 picks an ephemeral port)
+        """
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.host, self.port
+
+    def start(self):
+        """Serve on a daemon thread."""
+        handler = type('MetricsHandler', (_MetricsHandler,), {'metrics': self.metrics})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
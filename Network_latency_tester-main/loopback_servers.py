@@ -0,0 +1,200 @@
+"""
+Local stand-in servers for exercising the latency tester without network access.
+
+Each server binds to a loopback address on an ephemeral port, runs its accept
+loop on a daemon thread and can be used as a context manager:
+
+    with TCPStandInServer() as server:
+        tester.perform_parallel_tests(*server.address, num_tests=100)
+
+TLS servers use the bundled self-signed certificate in ``testdata/``, which is
+valid for ``localhost``, ``127.0.0.1`` and ``::1``; pass
+``loopback_client_context()`` to the tester to trust it.
+
+Faults can be injected to exercise the tester's timing and error handling:
+``accept_delay``/``accept_jitter`` slow down the single-threaded accept loop
+(which also backs up the listen queue like an overloaded server),
+``drop_rate`` resets a fraction of accepted connections, and a small
+``backlog`` with ``accept=False`` saturates the listen queue so connects
+time out.
+"""
+import os
+import random
+import socket
+import ssl
+import struct
+import threading
+import time
+
+TESTDATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata')
+LOOPBACK_CERT = os.path.join(TESTDATA_DIR, 'loopback_cert.pem')
+LOOPBACK_KEY = os.path.join(TESTDATA_DIR, 'loopback_key.pem')
+
+
+def loopback_client_context():
+    """Client SSLContext that trusts the bundled loopback certificate."""
+    return ssl.create_default_context(cafile=LOOPBACK_CERT)
+
+
+class TCPStandInServer:
+    def __init__(self, host='127.0.0.1', port=0, backlog=1024, accept=True, accept_delay=0,
+                 accept_jitter=0, drop_rate=0, seed=None):
+        """
+        Args:
+            host (str): Loopback address to bind
+            port (int): Port to bind (0 picks an ephemeral port)
+            backlog (int): Listen backlog passed to listen()
+            accept (bool): When False the listener never accepts, so once the
+                backlog is full further connects time out (a local blackhole)
+            accept_delay (float): Seconds to hold each accepted connection
+                before serving it
+            accept_jitter (float): Extra uniformly random delay of up to this many seconds
+            drop_rate (float): Fraction of accepted connections reset instead of served
+            seed (int): Seed for the jitter and drop decisions
+        """
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.accept = accept
+        self.accept_delay = accept_delay
+        self.accept_jitter = accept_jitter
+        self.drop_rate = drop_rate
+        self.connections_accepted = 0
+        self.connections_dropped = 0
+        self._random = random.Random(seed)
+        self._listener = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def address(self):
+        """Return the bound (host, port) pair."""
+        return self.host, self.port
+
+    def start(self):
+        """Bind the listener and start the accept loop."""
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((self.host, self.port))
+        self._listener.listen(self.backlog)
+        self.port = self._listener.getsockname()[1]
+        self._listener.settimeout(0.1)
+        if self.accept:
+            self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the accept loop and close the listener."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._listener is not None:
+            self._listener.close()
+
+    def handle_connection(self, conn):
+        """Handle an accepted connection. The TCP server just closes it."""
+        conn.close()
+
+    def _accept_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                conn, _ = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.connections_accepted += 1
+            delay = self.accept_delay + self.accept_jitter * self._random.random()
+            if delay:
+                time.sleep(delay)
+            if self.drop_rate and self._random.random() < self.drop_rate:
+                self.connections_dropped += 1
+                self._reset(conn)
+                continue
+            self.handle_connection(conn)
+
+    @staticmethod
+    def _reset(conn):
+        # A zero linger timeout makes close() send RST instead of FIN
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+        conn.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class TLSStandInServer(TCPStandInServer):
+    """Completes a TLS handshake on every connection, then closes it."""
+
+    def __init__(self, host='127.0.0.1', port=0, backlog=1024, certfile=LOOPBACK_CERT,
+                 keyfile=LOOPBACK_KEY, **kwargs):
+        super().__init__(host, port, backlog, **kwargs)
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(certfile, keyfile)
+        self.handshakes = 0
+
+    def handle_connection(self, conn):
+        # Handshakes block, so each connection gets its own thread
+        threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            conn.settimeout(5)
+            with self.context.wrap_socket(conn, server_side=True) as tls_conn:
+                self.handshakes += 1
+                self.handle_stream(tls_conn)
+        except (OSError, ssl.SSLError):
+            conn.close()
+
+    def handle_stream(self, stream):
+        """Serve an established stream. The TLS server just waits for the peer to close."""
+        stream.recv(1)
+
+
+class HTTPStandInServer(TLSStandInServer):
+    """Answers every request with a fixed HTTP response, over TLS when ``tls`` is set."""
+
+    RESPONSE = (b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n"
+                b"Content-Length: 2\r\nConnection: close\r\n\r\nOK")
+
+    def __init__(self, host='127.0.0.1', port=0, backlog=1024, tls=False, response_delay=0, **kwargs):
+        """
+        Args:
+            tls (bool): Serve HTTPS instead of plain HTTP
+            response_delay (float): Seconds to wait before answering each request
+        """
+        super().__init__(host, port, backlog, **kwargs)
+        self.tls = tls
+        self.response_delay = response_delay
+        self.requests_served = 0
+
+    def handle_connection(self, conn):
+        if self.tls:
+            super().handle_connection(conn)
+        else:
+            threading.Thread(target=self._serve_plain, args=(conn,), daemon=True).start()
+
+    def _serve_plain(self, conn):
+        with conn:
+            try:
+                conn.settimeout(5)
+                self.handle_stream(conn)
+            except OSError:
+                pass
+
+    def handle_stream(self, stream):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = stream.recv(4096)
+            if not chunk:
+                return
+            request += chunk
+        if self.response_delay:
+            time.sleep(self.response_delay)
+        stream.sendall(self.RESPONSE)
+        self.requests_served += 1
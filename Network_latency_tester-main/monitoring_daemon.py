@@ -0,0 +1,266 @@
+"""
+Non-interactive, long-running monitoring of many targets.
+
+Each target has its own probe interval, timeout and probe type. Targets are
+kept on a heap ordered by their next due time and their first probes are
+staggered across the interval, so hundreds of targets do not fire together.
+Results go into per-target RollingWindow statistics (last 1 min, 5 min and
+1 h by default) whose memory is bounded by the number of buckets, not by how
+long the daemon has been running.
+
+Targets file format:
+
+    {
+      "defaults": {"interval": 10, "timeout": 3, "probe": "tcp"},
+      "targets": [
+        {"name": "web", "host": "example.com", "port": 443, "probe": "https"},
+        {"host": "10.0.0.5", "port": 22, "interval": 30}
+      ]
+    }
+"""
+import asyncio
+import heapq
+import json
+import time
+import zlib
+from datetime import datetime
+
+from sample_store import ErrorKind
+from streaming_statistics import StreamingStatistics
+
+# (label, span in seconds, bucket width in seconds)
+DEFAULT_WINDOWS = (
+    ('1m', 60, 5),
+    ('5m', 300, 15),
+    ('1h', 3600, 60),
+)
+
+
+class MonitorTarget:
+    """One monitored endpoint and its probe schedule."""
+
+    __slots__ = ('name', 'host', 'port', 'interval', 'timeout', 'probe')
+
+    def __init__(self, host, port, interval=10, timeout=3, probe='tcp', name=None):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.host = host
+        self.port = int(port)
+        self.interval = interval
+        self.timeout = timeout
+        self.probe = probe
+        self.name = name or f"{host}:{port}"
+
+    def __repr__(self):
+        return f"MonitorTarget({self.name!r}, every {self.interval}s)"
+
+
+def load_targets(filename):
+    """
+    Read monitored targets from a JSON targets file.
+
+    Args:
+        filename (str): Path to the targets file (see module docstring)
+
+    Returns:
+        list: MonitorTarget objects
+    """
+    with open(filename, 'r') as file:
+        config = json.load(file)
+    defaults = config.get('defaults', {})
+    return [MonitorTarget(**{**defaults, **entry}) for entry in config['targets']]
+
+
+class RollingWindow:
+    """
+    Statistics over the last ``span`` seconds in fixed-width time buckets.
+
+    Each bucket is a StreamingStatistics; reading the window merges the
+    buckets that are still inside the span. Buckets that fall out of the span
+    are reused, so memory stays at ``span / bucket_width`` accumulators.
+    """
+
+    def __init__(self, span, bucket_width):
+        self.span = span
+        self.bucket_width = bucket_width
+        self.bucket_count = max(1, int(span // bucket_width))
+        self._buckets = [None] * self.bucket_count
+        self._bucket_ids = [None] * self.bucket_count
+
+    def _bucket(self, now):
+        bucket_id = int(now // self.bucket_width)
+        slot = bucket_id % self.bucket_count
+        if self._bucket_ids[slot] != bucket_id:
+            self._buckets[slot] = StreamingStatistics()
+            self._bucket_ids[slot] = bucket_id
+        return self._buckets[slot]
+
+    def add(self, latency_ms, success, now=None):
+        """Record one probe completed at monotonic time ``now``."""
+        bucket = self._bucket(time.monotonic() if now is None else now)
+        if success:
+            bucket.add(latency_ms)
+        else:
+            bucket.add_failure()
+
+    def merged(self, now=None):
+        """Return one StreamingStatistics covering the live buckets."""
+        current = int((time.monotonic() if now is None else now) // self.bucket_width)
+        merged = StreamingStatistics()
+        for bucket_id, bucket in zip(self._bucket_ids, self._buckets):
+            if bucket_id is not None and current - bucket_id < self.bucket_count:
+                merged.merge(bucket)
+        return merged
+
+
+class TargetMonitor:
+    """Rolling-window statistics for one target."""
+
+    def __init__(self, target, windows=DEFAULT_WINDOWS):
+        self.target = target
+        self.windows = {label: RollingWindow(span, width) for label, span, width in windows}
+        self.last_result = None  # (timestamp, latency_ms, error) of the latest probe
+        self.total_probes = 0
+
+    def record(self, latency_ms, error_kind, error, now=None):
+        success = error_kind == ErrorKind.NONE
+        for window in self.windows.values():
+            window.add(latency_ms, success, now)
+        self.last_result = (datetime.now().isoformat(), latency_ms, error)
+        self.total_probes += 1
+
+    def statistics(self, now=None):
+        """Return {window label: statistics dict} for this target."""
+        return {label: window.merged(now).to_statistics() for label, window in self.windows.items()}
+
+
+class MonitoringDaemon:
+    def __init__(self, tester, targets, windows=DEFAULT_WINDOWS, max_in_flight=None,
+                 report_interval=60):
+        """
+        Args:
+            tester (AdvancedLatencyTester): Supplies the probe implementation and resolver
+            targets (list): MonitorTarget objects
+            windows (tuple): (label, span seconds, bucket seconds) rolling windows
+            max_in_flight (int): Concurrent probe limit (defaults to tester.max_in_flight)
+            report_interval (float): Seconds between summary reports (None disables them)
+        """
+        self.tester = tester
+        self.monitors = {}
+        for target in targets:
+            if target.name in self.monitors:
+                raise ValueError(f"Duplicate target name '{target.name}'")
+            tester._check_probe_type(target.probe)
+            self.monitors[target.name] = TargetMonitor(target, windows)
+        self.max_in_flight = max_in_flight or tester.max_in_flight
+        self.report_interval = report_interval
+        self.listeners = []  # callables (target, latency_ms, error_kind, error, phases)
+        self._stop_event = None
+
+    def _initial_schedule(self, start):
+        """Heap of (due time, sequence, target) with first probes spread over each interval."""
+        schedule = []
+        for sequence, monitor in enumerate(self.monitors.values()):
+            target = monitor.target
+            # Stable per-target offset so restarts keep the same spread
+            offset = (zlib.crc32(target.name.encode()) % 10000) / 10000 * target.interval
+            schedule.append((start + offset, sequence, target))
+        heapq.heapify(schedule)
+        return schedule
+
+    async def run(self, duration=None):
+        """
+        Probe every target on its schedule until stop() is called or ``duration`` elapses.
+
+        Args:
+            duration (float): Seconds to run (None runs until stop())
+        """
+        loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        start = loop.time()
+        deadline = None if duration is None else start + duration
+        next_report = None if self.report_interval is None else start + self.report_interval
+        schedule = self._initial_schedule(start)
+
+        async def probe(target):
+            async with slots:
+                outcome = await self.tester._probe_async(target.host, target.port, target.timeout, target.probe)
+            self._record(target, *outcome)
+
+        while not self._stop_event.is_set():
+            now = loop.time()
+            if deadline is not None and now >= deadline:
+                break
+            if next_report is not None and now >= next_report:
+                self.report()
+                next_report += self.report_interval
+
+            while schedule and schedule[0][0] <= now:
+                due, sequence, target = heapq.heappop(schedule)
+                task = asyncio.create_task(probe(target))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                # Stay on the original grid; skip missed slots instead of bursting
+                due += target.interval
+                if due <= now:
+                    due += ((now - due) // target.interval + 1) * target.interval
+                heapq.heappush(schedule, (due, sequence, target))
+
+            wake_times = [t for t in (schedule[0][0] if schedule else None, deadline, next_report)
+                          if t is not None]
+            wake_at = min(wake_times) if wake_times else now + 1
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), max(0, wake_at - loop.time()))
+            except asyncio.TimeoutError:
+                pass
+
+        await asyncio.gather(*list(tasks))
+
+    def run_forever(self, duration=None):
+        """Blocking entry point for the daemon (Ctrl+C to stop)."""
+        try:
+            asyncio.run(self.run(duration))
+        except KeyboardInterrupt:
+            print("Monitoring daemon stopped.")
+        self.report()
+
+    def stop(self):
+        """
+        Ask a running daemon to finish its in-flight probes and return.
+
+        Call from the daemon's event loop; from other threads use
+        ``loop.call_soon_threadsafe(daemon.stop)``.
+        """
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    def _record(self, target, latency_ms, error_kind, error, phases=None, tls_resumed=None):
+        self.monitors[target.name].record(latency_ms, error_kind, error)
+        for listener in self.listeners:
+            listener(target, latency_ms, error_kind, error, phases)
+
+    def snapshot(self):
+        """Return {target name: {window label: statistics dict}}."""
+        now = time.monotonic()
+        return {name: monitor.statistics(now) for name, monitor in self.monitors.items()}
+
+    def report(self):
+        """Print one summary line per target for the shortest window."""
+        print(f"\n=== Monitoring report {datetime.now().isoformat()} ===")
+        breaker = self.tester.circuit_breaker
+        for name, windows in self.snapshot().items():
+            label, stats = next(iter(windows.items()))
+            if stats['successful_tests']:
+                line = (f"{name} [{label}]: {stats['successful_tests']}/{stats['total_tests']} ok, "
+                        f"{stats['packet_loss_percentage']:.1f}% loss, "
+                        f"avg {stats['average_latency_ms']:.2f} ms, p99 {stats['p99_latency_ms']:.2f} ms")
+            else:
+                line = f"{name} [{label}]: {stats['failed_tests']}/{stats['total_tests']} failed"
+            if breaker is not None:
+                target = self.monitors[name].target
+                health = breaker.health(f"{target.host}:{target.port}")
+                if health['state'] != 'closed':
+                    line += f" (circuit {health['state']}, next check in {health['retry_in_s']:.0f}s)"
+            print(line)
@@ -0,0 +1,370 @@
+"""
+Vectorized analysis of large result sets with NumPy.
+
+NumPy is an optional dependency: only this module needs it, and nothing else
+imports it. SampleColumns holds one row per probe in flat arrays (group,
+timestamp, latency, success), loaded from an ``export_results_json`` file,
+from binary result logs or from a SampleStore. grouped_statistics and
+time_buckets then work with sorts and segment reductions, not a Python loop
+per sample, so multi-million-sample histories take seconds:
+
+    columns = SampleColumns.from_result_log('probes.bin')
+    per_target = grouped_statistics(columns)
+    per_minute = time_buckets(columns, width_s=60)
+
+Results use the calculate_statistics keys. Percentiles are exact, interpolated
+between the samples either side of rank ``q * (n - 1)`` as LogHistogram and
+``statistics.median`` do, so they agree with calculate_statistics within its
+1% accuracy; every other value agrees up to rounding. Jitter is the mean absolute
+difference between consecutive successful latencies in timestamp order.
+calculate_statistics uses recording order, which is the same for a
+sequential run, but concurrent and merged runs complete out of order.
+"""
+import json
+import os
+from operator import itemgetter
+
+import numpy as np
+
+from result_log import (BINARY_MAGIC, RECORD, SAMPLE_RECORD, TARGET_DEFINITION, decode_target_name,
+                        log_files, target_name_records)
+from sample_store import ErrorKind
+from streaming_statistics import REPORTED_PERCENTILES
+
+# numpy views of result_log.RECORD and result_log.TARGET_RECORD
+_SAMPLE_DTYPE = np.dtype([('timestamp_ns', '<i8'), ('target_id', '<u4'), ('kind', 'u1'),
+                          ('error_kind', 'u1'), ('padding', 'V2'), ('latency_ms', '<f8'),
+                          ('phases', '<f8', 4)])
+_TARGET_DTYPE = np.dtype([('timestamp_ns', '<i8'), ('target_id', '<u4'), ('kind', 'u1'),
+                          ('error_kind', 'u1'), ('name_length', '<u2'), ('name', 'V40')])
+assert _SAMPLE_DTYPE.itemsize == _TARGET_DTYPE.itemsize == RECORD.size
+
+
+class SampleColumns:
+    """Per-probe columns of one or more groups (tests or targets)."""
+
+    def __init__(self, groups, group_codes, timestamps_ns, latencies_ms, success):
+        """
+        Args:
+            groups (list): Group name of each group code
+            group_codes (array): Group code of every sample
+            timestamps_ns (array): Sample times in ns
+            latencies_ms (array): Latencies (ignored for failed samples)
+            success (array): True for successful samples
+        """
+        self.groups = list(groups)
+        self.group_codes = np.asarray(group_codes, dtype=np.int64)
+        self.timestamps_ns = np.asarray(timestamps_ns, dtype=np.int64)
+        self.latencies_ms = np.asarray(latencies_ms, dtype=np.float64)
+        self.success = np.asarray(success, dtype=bool)
+
+    def __len__(self):
+        return len(self.group_codes)
+
+    @classmethod
+    def from_export(cls, source):
+        """
+        Load the per-probe results of an export_results_json file.
+
+        Every test ID becomes a group. Export timestamps are local wall-clock
+        times without a zone and are read as such. Each column is pulled out
+        with one C-level pass over the parsed results; the time to load a file
+        is dominated by ``json.load`` itself, so repeated analyses should load
+        the export once and pass the dict, or use binary result logs.
+
+        Args:
+            source: Export filename, or the already loaded export dict
+        """
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'r') as file:
+                source = json.load(file)
+        groups, parts = [], []
+        for test_id, stats in source['test_results'].items():
+            results = stats.get('individual_results') or []
+            count = len(results)
+            code = len(groups)
+            groups.append(test_id)
+            parts.append((
+                np.full(count, code, dtype=np.int64),
+                np.array(list(map(itemgetter('timestamp'), results)), dtype='datetime64[ns]').view(np.int64),
+                # None latencies of failed probes become NaN
+                np.array(list(map(itemgetter('latency_ms'), results)), dtype=np.float64),
+                np.fromiter(map(itemgetter('success'), results), dtype=bool, count=count),
+            ))
+        return cls._concatenate(groups, parts)
+
+    @classmethod
+    def from_result_log(cls, filename):
+        """
+        Load a binary result log, including its rotated files, through memory maps.
+
+        Every target becomes a group. Samples logged before their target was
+        defined (e.g. in a torn file) are skipped.
+        """
+        codes, parts = {}, []  # codes: target name -> group code
+        for path in log_files(filename) or [filename]:
+            count = (os.path.getsize(path) - len(BINARY_MAGIC)) // RECORD.size
+            if count <= 0:
+                continue
+            with open(path, 'rb') as file:
+                if file.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+                    raise ValueError(f"{path} is not a binary result log")
+            records = np.memmap(path, dtype=_SAMPLE_DTYPE, mode='r', offset=len(BINARY_MAGIC),
+                                shape=(count,))
+            definitions = np.flatnonzero(records['kind'] == TARGET_DEFINITION)
+            target_records = records.view(_TARGET_DTYPE)
+            definition_codes = np.array(
+                [codes.setdefault(_target_name(target_records, position), len(codes))
+                 for position in definitions.tolist()], dtype=np.int64)
+            samples = np.flatnonzero(records['kind'] == SAMPLE_RECORD)
+            target_ids = records['target_id'][samples]
+            sample_codes = np.full(len(samples), -1, dtype=np.int64)
+            # A writer reopening the file may reuse ids, so each sample takes the
+            # latest definition of its id that precedes it
+            definition_ids = records['target_id'][definitions]
+            for target_id in np.unique(target_ids).tolist():
+                defined = definition_ids == target_id
+                if not defined.any():
+                    continue
+                selected = target_ids == target_id
+                latest = np.searchsorted(definitions[defined], samples[selected], side='right') - 1
+                sample_codes[selected] = np.where(latest >= 0, definition_codes[defined][latest], -1)
+            known = sample_codes >= 0
+            samples = samples[known]
+            parts.append((
+                sample_codes[known],
+                np.array(records['timestamp_ns'][samples]),
+                np.array(records['latency_ms'][samples]),
+                records['error_kind'][samples] == ErrorKind.NONE,
+            ))
+            del records
+        groups = sorted(codes, key=codes.get)
+        return cls._concatenate(groups, parts)
+
+    @classmethod
+    def from_sample_store(cls, store, group='samples'):
+        """
+        Load a SampleStore as one group, with its timestamps converted to wall-clock ns.
+
+        The latency column is shared with the store rather than copied.
+        """
+        offset = store._anchor_wall_ns - store._anchor_monotonic_ns
+        return cls(
+            [group],
+            np.zeros(len(store), dtype=np.int64),
+            np.frombuffer(store.timestamps_ns, dtype=np.int64) + offset,
+            np.frombuffer(store.latencies, dtype=np.float64),
+            np.frombuffer(store.error_codes, dtype=np.uint8) == ErrorKind.NONE,
+        )
+
+    @classmethod
+    def _concatenate(cls, groups, parts):
+        if not parts:
+            return cls(groups, [], [], [], [])
+        return cls(groups, *(np.concatenate(column) for column in zip(*parts)))
+
+
+def _target_name(target_records, position):
+    """Name of the target defined at ``position``, including its continuation records."""
+    length = int(target_records['name_length'][position])
+    last = min(len(target_records), position + target_name_records(length))
+    return decode_target_name(length, [bytes(chunk) for chunk in target_records['name'][position:last]])
+
+
+def _aggregate(keys, key_count, timestamps_ns, latencies_ms, success, quantiles):
+    """
+    Statistics per key in 0..key_count-1 as arrays indexed by key.
+
+    Returns:
+        dict: total, count, mean, std_dev, min, max, jitter and one array per quantile
+    """
+    # Successful samples ordered by key, then time, for the jitter differences.
+    # Exports and logs are usually in that order already, which saves the sort.
+    ok = np.flatnonzero(success)
+    ok_keys = keys[ok]
+    ok_times = timestamps_ns[ok]
+    later_key = ok_keys[1:] > ok_keys[:-1]
+    if not np.all(later_key | ((ok_keys[1:] == ok_keys[:-1]) & (ok_times[1:] >= ok_times[:-1]))):
+        order = np.lexsort((ok_times, ok_keys))
+        ok, ok_keys = ok[order], ok_keys[order]
+    ok_latencies = latencies_ms[ok]
+    # Each key's successes are now one contiguous segment
+    bounds = np.searchsorted(ok_keys, np.arange(key_count + 1))
+    starts = bounds[:-1]
+    count = np.diff(bounds)
+    # Failures are the rarer samples, so only they are counted separately
+    total = count + np.bincount(keys[~success], minlength=key_count)
+    has_samples = count > 0
+    segments = starts[has_samples]
+    mean = np.zeros(key_count)
+    m2 = np.zeros(key_count)
+    jitter_sum = np.zeros(key_count)
+    # Keys without successes report inf, as StreamingStatistics.to_statistics does
+    minimum = np.full(key_count, np.inf)
+    maximum = np.full(key_count, np.inf)
+    if len(ok_latencies):
+        minimum[has_samples] = np.minimum.reduceat(ok_latencies, segments)
+        maximum[has_samples] = np.maximum.reduceat(ok_latencies, segments)
+        mean[has_samples] = np.add.reduceat(ok_latencies, segments) / count[has_samples]
+        deviation = ok_latencies - np.repeat(mean, count)
+        deviation *= deviation
+        m2[has_samples] = np.add.reduceat(deviation, segments)
+        steps = np.empty_like(ok_latencies)
+        steps[0] = 0.0
+        np.subtract(ok_latencies[1:], ok_latencies[:-1], out=steps[1:])
+        np.abs(steps, out=steps)
+        steps[segments] = 0.0  # no difference across a segment boundary
+        jitter_sum[has_samples] = np.add.reduceat(steps, segments)
+    std_dev = np.sqrt(np.where(count > 1, m2 / np.maximum(count - 1, 1), 0.0))
+    jitter = jitter_sum / np.maximum(count - 1, 1)
+
+    last = np.maximum(count - 1, 0)
+    # Each quantile is interpolated between the samples at its floor and ceiling rank
+    positions = [q * last for q in quantiles]
+    lower = [np.floor(position).astype(np.int64) for position in positions]
+    upper = [np.ceil(position).astype(np.int64) for position in positions]
+    if len(ok_latencies) > 64 * key_count:
+        # Few large segments: move just the needed ranks of each into place, in linear time
+        ranked = ok_latencies.copy()
+        floors = np.stack(lower, axis=1).tolist()
+        ceilings = np.stack(upper, axis=1).tolist()
+        for key in np.flatnonzero(has_samples).tolist():
+            segment = ranked[starts[key]:starts[key] + count[key]]
+            kth = sorted(set(floors[key]))
+            # One rank at a time, each in the part above the last: numpy's
+            # multi-rank partition is several times slower
+            low = 0
+            for point in kth:
+                segment[low:].partition(point - low)
+                low = point + 1
+            # A ceiling rank is the smallest value between its floor and the next partition point
+            for rank in sorted(set(ceilings[key]) - set(kth)):
+                stop = next((point for point in kth if point > rank), len(segment) - 1) + 1
+                smallest = rank + int(segment[rank:stop].argmin())
+                segment[[rank, smallest]] = segment[[smallest, rank]]
+    else:
+        ranked = ok_latencies[np.lexsort((ok_latencies, ok_keys))]
+
+    def order_statistic(rank):
+        values = np.full(key_count, np.inf)
+        values[has_samples] = ranked[(starts + rank)[has_samples]]
+        return values
+
+    result = {
+        'total': total,
+        'count': count,
+        'mean': np.where(has_samples, mean, np.inf),
+        'std_dev': std_dev,
+        'min': minimum,
+        'max': maximum,
+        'jitter': jitter,
+    }
+    for q, position, low, high in zip(quantiles, positions, lower, upper):
+        below = order_statistic(low)
+        step = np.subtract(order_statistic(high), below, out=np.zeros(key_count), where=has_samples)
+        result[q] = below + (position - low) * step
+    return result
+
+
+def grouped_statistics(columns, percentiles=REPORTED_PERCENTILES):
+    """
+    calculate_statistics for every group at once.
+
+    Args:
+        columns (SampleColumns): Samples to analyse
+        percentiles (tuple): (name, quantile) pairs reported as ``<name>_latency_ms``
+
+    Returns:
+        dict: group name -> statistics dict with the calculate_statistics keys
+        (except ``test_timestamp`` and ``individual_results``)
+    """
+    quantiles = [q for _, q in percentiles]
+    arrays = _aggregate(columns.group_codes, len(columns.groups), columns.timestamps_ns,
+                        columns.latencies_ms, columns.success, [0.5] + quantiles)
+    arrays = {key: values.tolist() for key, values in arrays.items()}
+    statistics = {}
+    for code, group in enumerate(columns.groups):
+        total, count = arrays['total'][code], arrays['count'][code]
+        stats = {
+            'total_tests': total,
+            'successful_tests': count,
+            'failed_tests': total - count,
+            'packet_loss_percentage': (total - count) / total * 100 if total else 0,
+            'average_latency_ms': arrays['mean'][code],
+            'min_latency_ms': arrays['min'][code],
+            'max_latency_ms': arrays['max'][code],
+            'median_latency_ms': arrays[0.5][code],
+            'std_dev_latency_ms': arrays['std_dev'][code],
+            'jitter_ms': arrays['jitter'][code],
+        }
+        for name, q in percentiles:
+            stats[f'{name}_latency_ms'] = arrays[q][code]
+        statistics[group] = stats
+    return statistics
+
+
+def time_buckets(columns, width_s=60):
+    """
+    Per-group aggregates over fixed time buckets.
+
+    Args:
+        columns (SampleColumns): Samples to analyse
+        width_s (int): Bucket width in seconds; buckets start at multiples of it
+
+    Returns:
+        dict: group name -> list of {'bucket_start' (s), 'count', 'failures',
+        'loss_percentage', 'mean_ms', 'p50_ms', 'p99_ms', 'jitter_ms'} dicts in
+        time order, like HistoryStore.series (empty buckets are left out)
+    """
+    if width_s <= 0:
+        raise ValueError("width_s must be positive")
+    series = {group: [] for group in columns.groups}
+    if not len(columns):
+        return series
+    width_ns = int(width_s * 1e9)
+    buckets = columns.timestamps_ns // width_ns
+    first = int(buckets.min())
+    span = int(buckets.max()) - first + 1
+    keys, inverse = np.unique(columns.group_codes * span + (buckets - first), return_inverse=True)
+    arrays = _aggregate(inverse.reshape(-1), len(keys), columns.timestamps_ns, columns.latencies_ms,
+                        columns.success, [0.5, 0.99])
+    rows = zip((keys // span).tolist(), ((keys % span + first) * width_ns // 10**9).tolist(),
+               arrays['total'].tolist(), arrays['count'].tolist(), arrays['mean'].tolist(),
+               arrays[0.5].tolist(), arrays[0.99].tolist(), arrays['jitter'].tolist())
+    for code, start, total, count, mean, p50, p99, jitter in rows:
+        failures = total - count
+        series[columns.groups[code]].append({
+            'bucket_start': start,
+            'count': total,
+            'failures': failures,
+            'loss_percentage': failures / total * 100,
+            'mean_ms': mean if count else None,
+            'p50_ms': p50 if count else None,
+            'p99_ms': p99 if count else None,
+            'jitter_ms': jitter,
+        })
+    return series
+
+
+def main(argv=None):
+    """Print grouped statistics of an export or binary result log as JSON."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Vectorized analysis of exported or logged results")
+    parser.add_argument('source', help="export_results_json file (.json) or binary result log")
+    parser.add_argument('--bucket', type=int, metavar='SECONDS',
+                        help="Also aggregate into time buckets of this width")
+    args = parser.parse_args(argv)
+
+    if args.source.endswith('.json'):
+        columns = SampleColumns.from_export(args.source)
+    else:
+        columns = SampleColumns.from_result_log(args.source)
+    report = {'groups': grouped_statistics(columns)}
+    if args.bucket:
+        report['buckets'] = time_buckets(columns, args.bucket)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
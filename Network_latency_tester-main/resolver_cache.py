@@ -0,0 +1,175 @@
+"""
+Shared name-resolution cache for probes.
+
+Resolving once and connecting to the cached address keeps resolver time out
+of the measured connect time and stops a batch of probes from issuing
+hundreds of identical getaddrinfo calls. Concurrent lookups for the same key
+are coalesced, from threads and from coroutines alike. IP address literals
+are converted directly and never cached, so sweeping millions of addresses
+does not fill the cache.
+"""
+import asyncio
+import ipaddress
+import socket
+import threading
+import time
+from concurrent.futures import Future
+
+
+class ResolverCache:
+    def __init__(self, ttl=60.0, negative_ttl=5.0, max_entries=10000, prefetch=False,
+                 prefetch_threshold=0.2):
+        """
+        Args:
+            ttl (float): Seconds a successful lookup stays cached
+            negative_ttl (float): Seconds a failed lookup stays cached
+            max_entries (int): Cache size limit; the oldest entry is evicted first
+            prefetch (bool): Refresh entries in the background when a hit finds
+                less than ``prefetch_threshold`` of their TTL remaining
+            prefetch_threshold (float): Remaining-TTL fraction that triggers a refresh
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.prefetch_enabled = prefetch
+        self.prefetch_threshold = prefetch_threshold
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # key -> (expires_at, addresses or exception, ttl)
+        self._in_flight = {}  # key -> Future for a lookup in progress
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port, family=socket.AF_UNSPEC):
+        """
+        Resolve ``host``/``port`` to connectable addresses, using the cache.
+
+        Args:
+            host (str): Hostname or IP address
+            port (int): Port number
+            family (int): Address family filter (AF_UNSPEC for all)
+
+        Returns:
+            list: (family, sockaddr) tuples in resolver order
+
+        Raises:
+            OSError: When resolution fails (failures are cached too)
+        """
+        key = (host, port, family)
+        cached = self._cached(key)
+        if cached is None:
+            cached = self._literal(host, port, family)
+        if cached is not None:
+            return self._unwrap(cached)
+
+        future, owner = self._claim(key)
+        if owner:
+            self._complete(key, future, self._getaddrinfo(host, port, family))
+        return self._unwrap(future.result())
+
+    async def resolve_async(self, host, port, family=socket.AF_UNSPEC):
+        """Coroutine version of resolve using the event loop's getaddrinfo."""
+        key = (host, port, family)
+        cached = self._cached(key)
+        if cached is None:
+            cached = self._literal(host, port, family)
+        if cached is not None:
+            return self._unwrap(cached)
+
+        future, owner = self._claim(key)
+        if owner:
+            loop = asyncio.get_running_loop()
+            try:
+                infos = await loop.getaddrinfo(host, port, family=family, type=socket.SOCK_STREAM)
+                outcome = [(info[0], info[4]) for info in infos]
+            except (OSError, UnicodeError) as e:
+                outcome = e
+            except BaseException as e:
+                # Cancelled mid-lookup: release waiters without caching anything
+                with self._lock:
+                    del self._in_flight[key]
+                future.set_exception(e)
+                raise
+            self._complete(key, future, outcome)
+        return self._unwrap(await asyncio.wrap_future(future))
+
+    def prefetch(self, host, port, family=socket.AF_UNSPEC):
+        """Resolve in a background thread so later probes hit a warm cache."""
+        key = (host, port, family)
+        future, owner = self._claim(key)
+        if owner:
+            threading.Thread(
+                target=lambda: self._complete(key, future, self._getaddrinfo(host, port, family)),
+                daemon=True
+            ).start()
+        return future
+
+    def invalidate(self, host=None):
+        """Drop cached entries for ``host`` (or every entry)."""
+        with self._lock:
+            for key in [k for k in self._entries if host is None or k[0] == host]:
+                del self._entries[key]
+
+    def _cached(self, key):
+        """Return a live cached outcome, or None on a miss."""
+        refresh = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            expires_at, outcome, ttl = entry
+            if (self.prefetch_enabled and not isinstance(outcome, Exception)
+                    and expires_at - time.monotonic() < ttl * self.prefetch_threshold
+                    and key not in self._in_flight):
+                refresh = True
+        if refresh:
+            self.prefetch(*key)
+        return outcome
+
+    def _claim(self, key):
+        """Join an in-flight lookup or register a new one; returns (future, owner)."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._in_flight[key] = future
+            return future, True
+
+    def _complete(self, key, future, outcome):
+        ttl = self.negative_ttl if isinstance(outcome, Exception) else self.ttl
+        with self._lock:
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (time.monotonic() + ttl, outcome, ttl)
+            del self._in_flight[key]
+        future.set_result(outcome)
+
+    @staticmethod
+    def _literal(host, port, family):
+        """Addresses for an IP address literal (no lookup needed), or None for names."""
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            return None
+        try:
+            infos = socket.getaddrinfo(host, port, family, socket.SOCK_STREAM, 0, socket.AI_NUMERICHOST)
+        except (OSError, UnicodeError) as e:
+            return e
+        return [(info[0], info[4]) for info in infos]
+
+    @staticmethod
+    def _getaddrinfo(host, port, family):
+        try:
+            infos = socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)
+        except (OSError, UnicodeError) as e:
+            return e
+        return [(info[0], info[4]) for info in infos]
+
+    @staticmethod
+    def _unwrap(outcome):
+        if isinstance(outcome, Exception):
+            # Cached failures are re-raised many times; don't let tracebacks pile up
+            raise outcome.with_traceback(None)
+        return outcome
@@ -0,0 +1,338 @@
+"""
+Append-only, size-rotated logs of probe results.
+
+Results are written as they are produced, so a crash loses at most the
+records still in the write buffer. Two formats are supported:
+
+* ``ndjson`` - one JSON object per line, easy to grep and load elsewhere.
+* ``binary`` - fixed-width 56-byte records read back through ``mmap`` by
+  BinaryLogReader, which can scan or filter millions of records without
+  loading the file into memory.
+
+Binary layout: an 8-byte magic header followed by RECORD structs. Target names
+are not repeated in every sample; the first time a target appears in a file a
+TARGET_DEFINITION record maps its numeric id to its UTF-8 name. It holds the
+name's length and first 40 bytes; longer names continue in the
+TARGET_CONTINUATION records that follow it, 40 bytes each.
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+from sample_store import ERROR_MESSAGES, ErrorKind
+
+FORMATS = ('ndjson', 'binary')
+
+BINARY_MAGIC = b'NLTLOG1\0'
+
+# timestamp_ns, target_id, record kind, error kind, latency, dns, connect, tls, ttfb
+RECORD = struct.Struct('<qIBB2xddddd')
+# Same size: timestamp_ns, target_id, record kind, unused, name length in bytes, name bytes
+TARGET_RECORD = struct.Struct('<qIBBH40s')
+TARGET_NAME_BYTES = 40  # name bytes per definition or continuation record
+MAX_TARGET_NAME_BYTES = 0xFFFF
+SAMPLE_RECORD = 0
+TARGET_DEFINITION = 1
+TARGET_CONTINUATION = 2
+BINARY_PHASES = ('dns', 'connect', 'tls', 'ttfb')
+
+
+class ResultLogWriter:
+    def __init__(self, filename, log_format='ndjson', max_bytes=64 * 1024 * 1024, backup_count=5,
+                 flush_every=64):
+        """
+        Args:
+            filename (str): Active log file; rotated files get ``.1``, ``.2``... suffixes
+            log_format (str): 'ndjson' or 'binary'
+            max_bytes (int): Rotate once the active file reaches this size (0 disables)
+            backup_count (int): Rotated files to keep
+            flush_every (int): Flush the OS buffer every N records
+        """
+        if log_format not in FORMATS:
+            raise ValueError(f"Unknown log format '{log_format}', expected one of {FORMATS}")
+        self.filename = filename
+        self.log_format = log_format
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_every = flush_every
+        self.records_written = 0
+        self._lock = threading.Lock()
+        self._target_ids = {}  # name -> id, shared by every file of this log
+        self._declared = set()  # target ids defined in the current file
+        self._pending = 0
+        self._file = None
+        self._open()
+
+    def _open(self):
+        self._file = open(self.filename, 'ab')
+        self._declared = set()
+        size = self._file.tell()
+        if self.log_format == 'binary':
+            if size == 0:
+                self._file.write(BINARY_MAGIC)
+            elif (size - len(BINARY_MAGIC)) % RECORD.size:
+                # Drop a record torn by a crash so new records stay aligned
+                self._file.truncate(size - (size - len(BINARY_MAGIC)) % RECORD.size)
+                self._file.seek(0, os.SEEK_END)
+        elif size:
+            with open(self.filename, 'rb') as existing:
+                existing.seek(-1, os.SEEK_END)
+                if existing.read(1) != b'\n':
+                    # Terminate a line torn by a crash; readers skip it as invalid JSON
+                    self._file.write(b'\n')
+
+    def record_probe(self, target, latency_ms, error_kind, error=None, phases=None, tls_resumed=None,
+                     timestamp_ns=None):
+        """
+        Append one probe result.
+
+        Args:
+            target (str): Target name, e.g. ``host:port``
+            latency_ms (float): Measured latency (None or ``inf`` on failure)
+            error_kind (ErrorKind): Error classification
+            error (str): Error text (NDJSON only)
+            phases (dict): Phase name -> duration in milliseconds
+            tls_resumed (bool): Unused; accepted so probe outcomes can be splatted in
+            timestamp_ns (int): Wall-clock time in ns (defaults to now)
+        """
+        timestamp_ns = time.time_ns() if timestamp_ns is None else timestamp_ns
+        with self._lock:
+            if self.log_format == 'ndjson':
+                self._write_ndjson(timestamp_ns, target, latency_ms, error_kind, error, phases)
+            else:
+                self._write_binary(timestamp_ns, target, latency_ms, error_kind, phases)
+            self.records_written += 1
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._file.flush()
+                self._pending = 0
+            if self.max_bytes and self._file.tell() >= self.max_bytes:
+                self._rotate()
+
+    def _write_ndjson(self, timestamp_ns, target, latency_ms, error_kind, error, phases):
+        record = {
+            'timestamp': datetime.fromtimestamp(timestamp_ns / 1e9).isoformat(),
+            'target': target,
+            'success': error_kind == ErrorKind.NONE,
+            'latency_ms': None if latency_ms is None or math.isinf(latency_ms) else latency_ms,
+            'error': None if error_kind == ErrorKind.NONE else (error or ERROR_MESSAGES[error_kind]),
+        }
+        for name, duration_ms in (phases or {}).items():
+            record[f'{name}_ms'] = duration_ms
+        self._file.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+
+    def _write_binary(self, timestamp_ns, target, latency_ms, error_kind, phases):
+        target_id = self._target_ids.get(target)
+        if target_id is None:
+            encoded = target.encode('utf-8')
+            if len(encoded) > MAX_TARGET_NAME_BYTES:
+                raise ValueError(f"Target name is longer than {MAX_TARGET_NAME_BYTES} bytes")
+            target_id = self._target_ids[target] = len(self._target_ids)
+        if target_id not in self._declared:
+            encoded = target.encode('utf-8')
+            self._file.write(TARGET_RECORD.pack(timestamp_ns, target_id, TARGET_DEFINITION, 0, len(encoded),
+                                                encoded[:TARGET_NAME_BYTES]))
+            for start in range(TARGET_NAME_BYTES, len(encoded), TARGET_NAME_BYTES):
+                self._file.write(TARGET_RECORD.pack(timestamp_ns, target_id, TARGET_CONTINUATION, 0, 0,
+                                                    encoded[start:start + TARGET_NAME_BYTES]))
+            self._declared.add(target_id)
+        phases = phases or {}
+        values = [math.nan if phases.get(name) is None else phases[name] for name in BINARY_PHASES]
+        self._file.write(RECORD.pack(timestamp_ns, target_id, SAMPLE_RECORD, error_kind,
+                                     math.nan if latency_ms is None else latency_ms, *values))
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.filename}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.filename}.{index + 1}")
+        if self.backup_count:
+            os.replace(self.filename, f"{self.filename}.1")
+        else:
+            os.remove(self.filename)
+        self._open()
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+            self._pending = 0
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def log_files(filename):
+    """Return the rotated files of a log from oldest to newest, then the active file."""
+    backups = []
+    index = 1
+    while os.path.exists(f"{filename}.{index}"):
+        backups.append(f"{filename}.{index}")
+        index += 1
+    files = list(reversed(backups))
+    if os.path.exists(filename):
+        files.append(filename)
+    return files
+
+
+def target_name_records(length):
+    """Number of records (definition plus continuations) holding a name of ``length`` bytes."""
+    return max(1, -(-length // TARGET_NAME_BYTES))
+
+
+def decode_target_name(length, chunks):
+    """
+    Rebuild a target name from the name bytes of its definition and continuations.
+
+    Args:
+        length (int): Name length in bytes from the definition
+        chunks (list): Name fields of the definition and its continuation records
+    """
+    return b''.join(chunks)[:length].decode('utf-8', 'replace')
+
+
+def iter_ndjson(filename):
+    """Yield result dicts from an NDJSON log file one line at a time."""
+    with open(filename, 'rb') as file:
+        for line in file:
+            if not line.endswith(b'\n'):
+                continue  # a torn final line from a crash
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a torn line that a later writer terminated
+
+
+class BinaryRecord:
+    """One decoded sample record from a binary log."""
+
+    __slots__ = ('timestamp_ns', 'target', 'error_kind', 'latency_ms', 'phases')
+
+    def __init__(self, timestamp_ns, target, error_kind, latency_ms, phases):
+        self.timestamp_ns = timestamp_ns
+        self.target = target
+        self.error_kind = ErrorKind(error_kind)
+        self.latency_ms = None if math.isnan(latency_ms) else latency_ms
+        self.phases = phases
+
+    @property
+    def success(self):
+        return self.error_kind == ErrorKind.NONE
+
+    def to_dict(self):
+        """Return the record in the NDJSON / perform_single_test result shape."""
+        result = {
+            'timestamp': datetime.fromtimestamp(self.timestamp_ns / 1e9).isoformat(),
+            'target': self.target,
+            'success': self.success,
+            'latency_ms': self.latency_ms,
+            'error': ERROR_MESSAGES[self.error_kind],
+        }
+        for name, value in zip(BINARY_PHASES, self.phases):
+            if not math.isnan(value):
+                result[f'{name}_ms'] = value
+        return result
+
+
+class BinaryLogReader:
+    """
+    Memory-mapped reader for binary result logs.
+
+    Records are decoded lazily with struct.iter_unpack straight from the
+    mapping, so scanning a file touches each page once and never holds more
+    than one record in Python objects. A torn trailing record is ignored.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        if self._map is not None and self._map[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+            self.close()
+            raise ValueError(f"{filename} is not a binary result log")
+        body = max(0, size - len(BINARY_MAGIC))
+        self._end = len(BINARY_MAGIC) + body - body % RECORD.size
+
+    def __len__(self):
+        """Number of raw records (samples and target definitions)."""
+        return max(0, self._end - len(BINARY_MAGIC)) // RECORD.size
+
+    def iter_raw(self):
+        """
+        Yield raw RECORD tuples; target definitions carry the full name in place
+        of the values, and their continuation records are skipped.
+        """
+        if self._map is None:
+            return
+        view = memoryview(self._map)[len(BINARY_MAGIC):self._end]
+        count = len(view) // RECORD.size
+        try:
+            for index, record in enumerate(RECORD.iter_unpack(view)):
+                if record[2] == TARGET_CONTINUATION:
+                    continue
+                if record[2] == TARGET_DEFINITION:
+                    length = TARGET_RECORD.unpack_from(view, index * RECORD.size)[4]
+                    last = min(count, index + target_name_records(length))
+                    chunks = [TARGET_RECORD.unpack_from(view, position * RECORD.size)[5]
+                              for position in range(index, last)]
+                    record = record[:4] + (decode_target_name(length, chunks),)
+                yield record
+        finally:
+            view.release()
+
+    def scan(self, target=None, since_ns=None, until_ns=None, failures_only=False):
+        """
+        Yield BinaryRecord objects matching every given filter.
+
+        Args:
+            target (str): Only this target
+            since_ns (int): Only records at or after this wall-clock time (ns)
+            until_ns (int): Only records before this wall-clock time (ns)
+            failures_only (bool): Only failed probes
+        """
+        names = {}
+        target_id = None
+        for timestamp_ns, record_target, kind, error_kind, *values in self.iter_raw():
+            if kind == TARGET_DEFINITION:
+                name = values[0]
+                names[record_target] = name
+                if name == target:
+                    target_id = record_target
+                elif target_id == record_target:
+                    target_id = None  # id reused for another target by a later writer
+                continue
+            if target is not None and record_target != target_id:
+                continue
+            if since_ns is not None and timestamp_ns < since_ns:
+                continue
+            if until_ns is not None and timestamp_ns >= until_ns:
+                continue
+            if failures_only and error_kind == ErrorKind.NONE:
+                continue
+            yield BinaryRecord(timestamp_ns, names.get(record_target), error_kind, values[0], values[1:])
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,306 @@
+"""
+Columnar storage for per-probe samples.
+
+A SampleStore keeps one probe as four fixed-width column entries (float64
+latency, int64 monotonic-ns timestamp, uint8 error code, uint16 message id),
+about 19 bytes per sample instead of a result dict with its own timestamp and
+error strings. Per-phase timings (e.g. ``dns``) add one float64 column each.
+A failure keeps its original error text when that differs from the canonical
+message of its kind: the text is stored once in a message table and the row
+holds its id. At most MAX_ERROR_MESSAGES distinct texts are kept per store,
+after which new texts fall back to the canonical one.
+Indexing or iterating the store yields Sample views that read like the result
+dicts returned by perform_single_test, so existing callers can keep using
+``sample['latency_ms']`` and friends.
+"""
+import asyncio
+import errno
+import math
+import socket
+import ssl
+import time
+from array import array
+from datetime import datetime
+from enum import IntEnum
+
+
+class ErrorKind(IntEnum):
+    NONE = 0
+    TIMEOUT = 1
+    REFUSED = 2
+    RESOLUTION = 3
+    UNREACHABLE = 4
+    RESET = 5
+    OTHER = 6
+    TLS = 7
+    CIRCUIT_OPEN = 8
+    DROPPED = 9
+
+
+# Canonical error text reported for each kind when no original message was kept
+ERROR_MESSAGES = {
+    ErrorKind.NONE: None,
+    ErrorKind.TIMEOUT: 'Connection timeout',
+    ErrorKind.REFUSED: 'Connection refused',
+    ErrorKind.RESOLUTION: 'Name resolution failed',
+    ErrorKind.UNREACHABLE: 'Network unreachable',
+    ErrorKind.RESET: 'Connection reset',
+    ErrorKind.OTHER: 'Connection failed',
+    ErrorKind.TLS: 'TLS handshake failed',
+    ErrorKind.CIRCUIT_OPEN: 'Circuit open: target not responding',
+    ErrorKind.DROPPED: 'Dropped: too many probes outstanding',
+}
+
+# Distinct original error texts one SampleStore keeps (messages naming addresses can vary per probe)
+MAX_ERROR_MESSAGES = 1024
+
+_UNREACHABLE_ERRNOS = {errno.ENETUNREACH, errno.EHOSTUNREACH, errno.EADDRNOTAVAIL}
+
+
+def classify_error(exc):
+    """
+    Map a probe exception to its ErrorKind.
+
+    Args:
+        exc (BaseException): Exception raised by a probe
+
+    Returns:
+        ErrorKind: Error classification
+    """
+    # asyncio.TimeoutError only became an alias of TimeoutError in Python 3.11
+    if isinstance(exc, (socket.timeout, TimeoutError, asyncio.TimeoutError)):
+        return ErrorKind.TIMEOUT
+    if isinstance(exc, ssl.SSLError):
+        return ErrorKind.TLS
+    if isinstance(exc, ConnectionRefusedError):
+        return ErrorKind.REFUSED
+    if isinstance(exc, socket.gaierror):
+        return ErrorKind.RESOLUTION
+    if isinstance(exc, (ConnectionResetError, ConnectionAbortedError)):
+        return ErrorKind.RESET
+    if isinstance(exc, OSError) and exc.errno in _UNREACHABLE_ERRNOS:
+        return ErrorKind.UNREACHABLE
+    return ErrorKind.OTHER
+
+
+def classify_message(message):
+    """Best-effort ErrorKind for an error string from a result dict."""
+    if message is None:
+        return ErrorKind.NONE
+    lowered = message.lower()
+    if 'timeout' in lowered or 'timed out' in lowered:
+        return ErrorKind.TIMEOUT
+    if 'refused' in lowered:
+        return ErrorKind.REFUSED
+    if 'name or service' in lowered or 'nodename' in lowered or 'resolution' in lowered:
+        return ErrorKind.RESOLUTION
+    if 'unreachable' in lowered:
+        return ErrorKind.UNREACHABLE
+    if 'reset' in lowered:
+        return ErrorKind.RESET
+    if 'ssl' in lowered or 'certificate' in lowered:
+        return ErrorKind.TLS
+    return ErrorKind.OTHER
+
+
+class Sample:
+    """Read-only, dict-like view of one row of a SampleStore."""
+
+    __slots__ = ('_store', '_index')
+
+    FIELDS = ('success', 'latency_ms', 'rtt_ms', 'timestamp', 'error')
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    @property
+    def error_kind(self):
+        return ErrorKind(self._store.error_codes[self._index])
+
+    @property
+    def success(self):
+        return self._store.error_codes[self._index] == ErrorKind.NONE
+
+    @property
+    def latency_ms(self):
+        latency = self._store.latencies[self._index]
+        return None if math.isnan(latency) else latency
+
+    # RTT is same as latency for TCP connections
+    rtt_ms = latency_ms
+
+    @property
+    def monotonic_ns(self):
+        return self._store.timestamps_ns[self._index]
+
+    @property
+    def timestamp(self):
+        return self._store.wall_time(self.monotonic_ns).isoformat()
+
+    @property
+    def error(self):
+        return self._store.error_message(self._index)
+
+    def phase_ms(self, name):
+        """Duration of phase ``name`` in milliseconds, or None if not measured."""
+        column = self._store.phases.get(name)
+        if column is None or math.isnan(column[self._index]):
+            return None
+        return column[self._index]
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        if key.endswith('_ms') and key[:-3] in self._store.phases:
+            return self.phase_ms(key[:-3])
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self.FIELDS + tuple(f'{name}_ms' for name in self._store.phases)
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        """Materialise the sample as a perform_single_test style dict."""
+        return {key: self[key] for key in self.keys()}
+
+    def __repr__(self):
+        return f"Sample({self.to_dict()})"
+
+
+class SampleStore:
+    """
+    Append-only columnar sample storage.
+
+    Latencies are stored as float64 (``inf`` for timeouts, NaN when no latency
+    was measured), timestamps as int64 ``time.monotonic_ns()`` values, errors
+    as ErrorKind codes and original error texts as uint16 ids into a message
+    table (0 for the canonical text). Timestamps are converted to wall-clock time on read
+    using an anchor taken when the store was created.
+    """
+
+    def __init__(self):
+        self.latencies = array('d')
+        self.timestamps_ns = array('q')
+        self.error_codes = array('B')
+        self.phases = {}  # phase name -> float64 column aligned with the others
+        self.message_ids = array('H')  # index into _message_list, 0 for the canonical text
+        self._message_list = [None]  # distinct original messages by id
+        self._message_ids = {}  # message -> id in _message_list
+        self._anchor_wall_ns = time.time_ns()
+        self._anchor_monotonic_ns = time.monotonic_ns()
+
+    def append(self, latency_ms, error_kind=ErrorKind.NONE, error=None, timestamp_ns=None,
+               phases=None):
+        """
+        Append one probe.
+
+        Args:
+            latency_ms (float): Measured latency, ``inf`` for timeouts or None
+            error_kind (ErrorKind): Error classification (NONE for success)
+            error (str): Original error text of a failure
+            timestamp_ns (int): time.monotonic_ns() of the probe (defaults to now)
+            phases (dict): Optional phase name -> duration in milliseconds
+        """
+        message_id = 0
+        if error and error_kind != ErrorKind.NONE and error != ERROR_MESSAGES[error_kind]:
+            message_id = self._intern(error)
+        if phases:
+            for name in phases:
+                if name not in self.phases:
+                    self.phases[name] = array('d', [math.nan]) * len(self.error_codes)
+        for name, column in self.phases.items():
+            value = phases.get(name) if phases else None
+            column.append(math.nan if value is None else value)
+        self.latencies.append(math.nan if latency_ms is None else latency_ms)
+        self.timestamps_ns.append(time.monotonic_ns() if timestamp_ns is None else timestamp_ns)
+        self.error_codes.append(error_kind)
+        self.message_ids.append(message_id)
+
+    def append_result(self, result):
+        """Append a perform_single_test style result dict."""
+        if result['success']:
+            error_kind = ErrorKind.NONE
+        else:
+            error_kind = classify_message(result['error'])
+        timestamp_ns = None
+        if result.get('timestamp'):
+            wall_ns = int(datetime.fromisoformat(result['timestamp']).timestamp() * 1e9)
+            timestamp_ns = wall_ns - self._anchor_wall_ns + self._anchor_monotonic_ns
+        phases = {key[:-3]: value for key, value in result.items()
+                  if key.endswith('_ms') and key not in ('latency_ms', 'rtt_ms')}
+        self.append(result['latency_ms'], error_kind, result['error'], timestamp_ns, phases)
+
+    def extend(self, other):
+        """Append every sample of another store, keeping their wall-clock times."""
+        offset = len(self.error_codes)
+        for name in set(self.phases) | set(other.phases):
+            if name not in self.phases:
+                self.phases[name] = array('d', [math.nan]) * offset
+            if name in other.phases:
+                self.phases[name].extend(other.phases[name])
+            else:
+                self.phases[name].extend(array('d', [math.nan]) * len(other))
+        shift = (other._anchor_wall_ns - other._anchor_monotonic_ns) - \
+                (self._anchor_wall_ns - self._anchor_monotonic_ns)
+        self.latencies.extend(other.latencies)
+        self.timestamps_ns.extend(t + shift for t in other.timestamps_ns)
+        self.error_codes.extend(other.error_codes)
+        mapping = [0] + [self._intern(message) for message in other._message_list[1:]]
+        self.message_ids.extend(mapping[message_id] for message_id in other.message_ids)
+
+    def _intern(self, message):
+        """Id of ``message`` in the message table, or 0 once MAX_ERROR_MESSAGES distinct texts are kept."""
+        message_id = self._message_ids.get(message)
+        if message_id is None:
+            if len(self._message_list) > MAX_ERROR_MESSAGES:
+                return 0
+            message_id = self._message_ids[message] = len(self._message_list)
+            self._message_list.append(message)
+        return message_id
+
+    def wall_time(self, monotonic_ns):
+        """Convert a stored monotonic timestamp to a local datetime."""
+        wall_ns = self._anchor_wall_ns + (monotonic_ns - self._anchor_monotonic_ns)
+        return datetime.fromtimestamp(wall_ns / 1e9)
+
+    def error_message(self, index):
+        message_id = self.message_ids[index]
+        if message_id:
+            return self._message_list[message_id]
+        return ERROR_MESSAGES[ErrorKind(self.error_codes[index])]
+
+    @property
+    def nbytes(self):
+        """Bytes used by the column buffers."""
+        columns = (self.latencies, self.timestamps_ns, self.error_codes, self.message_ids,
+                   *self.phases.values())
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def to_list(self):
+        """Materialise every sample as a result dict (e.g. for JSON export)."""
+        return [sample.to_dict() for sample in self]
+
+    def __len__(self):
+        return len(self.error_codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Sample(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("sample index out of range")
+        return Sample(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield Sample(self, index)
@@ -0,0 +1,256 @@
+"""
+Live probe results in a shared-memory ring buffer.
+
+SharedRingWriter publishes every probe as a fixed-size 64-byte record into a
+``multiprocessing.shared_memory`` block. Dashboards, detectors and exporters
+in other processes attach a SharedRingReader by name and read the latest
+records straight from the shared block. They take no locks and send nothing
+back, so however many readers there are, they cannot slow the prober down.
+When a reader falls more than ``capacity`` records behind, the oldest
+records are overwritten and reported to it as missed.
+
+One process writes (its threads share a lock), using a sequence-counter
+protocol per slot. Before filling the slot for record ``n`` the writer sets
+the slot's counter to ``2n + 1`` (odd: being written). It sets ``2n + 2``
+once the record is complete, then advances the header's published count to
+``n + 1``. A reader copies a slot and accepts it only if the counter was
+``2n + 2`` both before and after the copy; otherwise the slot was being
+rewritten and the record is counted as missed.
+
+This ordering argument assumes the CPU makes the writer's stores visible in
+program order, as x86 and x86-64 do. CPython issues no memory fences, so on
+weakly ordered CPUs such as ARM a reader may, rarely, accept a record that
+mixes fields of two writes; there the ring is best-effort.
+
+Target names are published once each in a table after the header, and
+records refer to them by index.
+
+    writer = SharedRingWriter('latency-live')
+    tester.listeners.append(writer.record_probe)
+
+    # in another process
+    reader = SharedRingReader('latency-live')
+    records, cursor, missed = reader.read(reader.sequence - 100)
+"""
+import math
+import os
+import struct
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from result_log import BINARY_PHASES, BinaryRecord
+
+MAGIC = b'NLTRING1'
+# magic, capacity, max targets, published target count, unused, published record count
+HEADER = struct.Struct('<8sIIIIQ')
+HEADER_SIZE = 64
+PUBLISHED_OFFSET = 24
+TARGETS_OFFSET = 16
+# Counters use native layout: struct copies a native aligned field in one load or
+# store, where the little-endian codec goes byte by byte and readers could see
+# half of an update. Each slot starts with its counter, which is only ever
+# written and read through SEQUENCE.
+SEQUENCE = struct.Struct('Q')
+COUNT = struct.Struct('I')
+# timestamp_ns, latency, dns, connect, tls, ttfb, target index, error kind (after the slot counter)
+SLOT = struct.Struct('<qddddd IB3x')
+SLOT_SIZE = SEQUENCE.size + SLOT.size
+TARGET_NAME_SIZE = 64
+NO_TARGET = 0xFFFFFFFF  # the target table was full
+
+_created_here = set()  # blocks created by writers in this process
+
+
+class SharedRingWriter:
+    def __init__(self, name=None, capacity=65536, max_targets=1024):
+        """
+        Args:
+            name (str): Shared memory block name (a random one when None)
+            capacity (int): Records kept before the oldest is overwritten
+            max_targets (int): Distinct target names that can be published
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.max_targets = max_targets
+        self.records_written = 0
+        self._targets = {}  # name -> index in the target table
+        self._lock = threading.Lock()
+        self._slots_offset = HEADER_SIZE + max_targets * TARGET_NAME_SIZE
+        self._memory = shared_memory.SharedMemory(name, create=True,
+                                                  size=self._slots_offset + capacity * SLOT_SIZE)
+        self._buffer = self._memory.buf
+        HEADER.pack_into(self._buffer, 0, MAGIC, capacity, max_targets, 0, 0, 0)
+        _created_here.add(self._memory.name)
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def record_probe(self, target, latency_ms, error_kind, error=None, phases=None, tls_resumed=None,
+                     timestamp_ns=None):
+        """
+        Publish one probe result (the listener signature used across the tester).
+
+        Args:
+            target (str): Target name, e.g. ``host:port``
+            latency_ms (float): Measured latency (None or ``inf`` on failure)
+            error_kind (ErrorKind): Error classification
+            error (str): Unused; readers see the canonical message of ``error_kind``
+            phases (dict): Phase name -> duration in milliseconds
+            tls_resumed (bool): Unused; accepted so probe outcomes can be splatted in
+            timestamp_ns (int): Wall-clock time in ns (defaults to now)
+        """
+        timestamp_ns = time.time_ns() if timestamp_ns is None else timestamp_ns
+        phases = phases or {}
+        values = [math.nan if phases.get(name) is None else phases[name] for name in BINARY_PHASES]
+        latency_ms = math.nan if latency_ms is None else latency_ms
+        with self._lock:
+            target_index = self._targets.get(target)
+            if target_index is None:
+                target_index = self._publish_target(target)
+            sequence = self.records_written
+            offset = self._slots_offset + sequence % self.capacity * SLOT_SIZE
+            buffer = self._buffer
+            SEQUENCE.pack_into(buffer, offset, 2 * sequence + 1)
+            SLOT.pack_into(buffer, offset + SEQUENCE.size, timestamp_ns, latency_ms, *values, target_index,
+                           error_kind)
+            SEQUENCE.pack_into(buffer, offset, 2 * sequence + 2)
+            self.records_written = sequence + 1
+            SEQUENCE.pack_into(buffer, PUBLISHED_OFFSET, sequence + 1)
+
+    def _publish_target(self, target):
+        index = len(self._targets)
+        if index >= self.max_targets:
+            return NO_TARGET
+        encoded = target.encode('utf-8')[:TARGET_NAME_SIZE]
+        start = HEADER_SIZE + index * TARGET_NAME_SIZE
+        self._buffer[start:start + len(encoded)] = encoded
+        self._targets[target] = index
+        # The name is in place before readers can see it counted
+        COUNT.pack_into(self._buffer, TARGETS_OFFSET, index + 1)
+        return index
+
+    def close(self, unlink=True):
+        """Detach from the block; with ``unlink`` the block is also removed once readers detach."""
+        with self._lock:
+            if self._buffer is None:
+                return
+            self._buffer = None
+            self._memory.close()
+            _created_here.discard(self._memory.name)
+            if unlink:
+                self._memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _attach(name):
+    """Attach to an existing block without letting this process's exit unlink it."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    memory = shared_memory.SharedMemory(name)
+    if os.name == 'posix' and memory.name not in _created_here:
+        # Attaching registered the block with the resource tracker, which would
+        # unlink it when the reader exits; the writer owns it. The tracker
+        # knows POSIX blocks by their name with its leading slash.
+        resource_tracker.unregister('/' + memory.name, 'shared_memory')
+    return memory
+
+
+class SharedRingReader:
+    """Lock-free reader of a ring published by SharedRingWriter in any process."""
+
+    def __init__(self, name):
+        self._memory = _attach(name)
+        self._buffer = self._memory.buf
+        magic, self.capacity, self.max_targets, _, _, _ = HEADER.unpack_from(self._buffer)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{name} is not a shared result ring")
+        self._slots_offset = HEADER_SIZE + self.max_targets * TARGET_NAME_SIZE
+        self._names = []  # target index -> name, filled as targets are published
+
+    @property
+    def sequence(self):
+        """Number of records published so far (the sequence of the next record)."""
+        return SEQUENCE.unpack_from(self._buffer, PUBLISHED_OFFSET)[0]
+
+    def _target(self, index):
+        if index >= len(self._names):
+            published = COUNT.unpack_from(self._buffer, TARGETS_OFFSET)[0]
+            for known in range(len(self._names), published):
+                start = HEADER_SIZE + known * TARGET_NAME_SIZE
+                name = bytes(self._buffer[start:start + TARGET_NAME_SIZE]).rstrip(b'\0')
+                self._names.append(name.decode('utf-8', 'replace'))
+        return self._names[index] if index < len(self._names) else None
+
+    def read(self, since=0, limit=None):
+        """
+        Read the records published from sequence ``since`` on.
+
+        Args:
+            since (int): Sequence of the first record wanted (e.g. the cursor
+                returned by the previous call)
+            limit (int): Return at most this many records (the oldest first)
+
+        Returns:
+            tuple: (list of BinaryRecord, cursor for the next call, number of
+            records since ``since`` that were overwritten before they were read)
+        """
+        # A cursor never moves backwards, even if the count briefly reads stale
+        end = max(self.sequence, since)
+        start = max(since, end - self.capacity, 0)
+        if limit is not None:
+            end = min(end, start + limit)
+        missed = start - since if since < start else 0
+        buffer = self._buffer
+        records = []
+        for sequence in range(start, end):
+            offset = self._slots_offset + sequence % self.capacity * SLOT_SIZE
+            expected = 2 * sequence + 2
+            if SEQUENCE.unpack_from(buffer, offset)[0] != expected:
+                missed += 1
+                continue
+            timestamp_ns, latency_ms, *values, target, error_kind = SLOT.unpack_from(buffer, offset + SEQUENCE.size)
+            if SEQUENCE.unpack_from(buffer, offset)[0] != expected:
+                missed += 1  # overwritten while it was being copied
+                continue
+            records.append(BinaryRecord(timestamp_ns, self._target(target), error_kind, latency_ms, values))
+        return records, end, missed
+
+    def latest(self, count):
+        """The newest ``count`` records still in the ring, oldest first."""
+        return self.read(max(0, self.sequence - count))[0]
+
+    def follow(self, since=None, poll_interval=0.05):
+        """
+        Yield records as they are published, forever.
+
+        Args:
+            since (int): First sequence to yield (defaults to records published from now on)
+            poll_interval (float): Seconds to sleep when no new record is available
+        """
+        cursor = self.sequence if since is None else since
+        while True:
+            records, cursor, _ = self.read(cursor)
+            if not records:
+                time.sleep(poll_interval)
+            yield from records
+
+    def close(self):
+        if self._buffer is not None:
+            self._buffer = None
+            self._memory.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
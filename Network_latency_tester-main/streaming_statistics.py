@@ -0,0 +1,368 @@
+"""
+Constant-memory latency statistics that can be fed one probe at a time.
+
+StreamingStatistics keeps Welford running moments, min/max, consecutive-sample
+jitter and a LogHistogram for percentiles. Its memory does not depend on the
+number of probes, and partial accumulators built by different workers can be
+merged into one.
+"""
+import math
+from datetime import datetime
+from statistics import NormalDist
+
+# Percentiles reported by StreamingStatistics.to_statistics (key suffix -> quantile)
+REPORTED_PERCENTILES = (
+    ('p50', 0.50),
+    ('p90', 0.90),
+    ('p99', 0.99),
+    ('p999', 0.999),
+)
+# Successful samples kept verbatim so small runs report exact percentiles
+EXACT_SAMPLES = 64
+
+
+def z_score(confidence):
+    """Two-sided standard normal critical value, e.g. 1.96 for 0.95."""
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+class LogHistogram:
+    """
+    Sparse histogram with logarithmically sized buckets.
+
+    Bucket ``i`` covers ``(gamma**(i-1), gamma**i]`` where
+    ``gamma = (1 + a) / (1 - a)``, so every quantile estimate is within a
+    relative error ``a`` of a true sample value. Values below ``min_value`` share
+    one bucket. With the defaults, latencies from 1 microsecond to 1000 seconds
+    fit in roughly 1000 buckets no matter how many samples are added.
+    """
+
+    def __init__(self, relative_accuracy=0.01, min_value=1e-3):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets = {}  # bucket index -> count
+        self.zero_count = 0  # values below min_value
+        self.count = 0
+
+    def add(self, value, count=1):
+        """Add ``count`` occurrences of ``value``."""
+        if value < self.min_value:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+
+    def merge(self, other):
+        """Add every sample of another histogram with the same accuracy."""
+        if (other.relative_accuracy, other.min_value) != (self.relative_accuracy, self.min_value):
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+    def quantile(self, q):
+        """
+        Estimate the ``q`` quantile (0 <= q <= 1).
+
+        Like ``statistics.median`` for even counts, a rank that falls between
+        two samples is interpolated linearly between their estimates.
+
+        Returns:
+            float: Estimated value, or None when the histogram is empty
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        lower = math.floor(rank)
+        value = self._value_at(lower)
+        if rank > lower:
+            value += (rank - lower) * (self._value_at(lower + 1) - value)
+        return value
+
+    def _value_at(self, rank):
+        """Estimate of the sample at 0-based ``rank`` in sorted order."""
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # Midpoint of the bucket in relative terms
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self):
+        """Return a compact, JSON/pickle friendly representation."""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'min_value': self.min_value,
+            'zero_count': self.zero_count,
+            'buckets': sorted(self.buckets.items()),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a histogram from to_dict output."""
+        histogram = cls(data['relative_accuracy'], data['min_value'])
+        for index, count in data['buckets']:
+            histogram.buckets[int(index)] = count
+            histogram.count += count
+        histogram.zero_count = data['zero_count']
+        histogram.count += histogram.zero_count
+        return histogram
+
+
+class StreamingStatistics:
+    """
+    Online accumulator producing the calculate_statistics result shape.
+
+    Successful probes update Welford's mean and variance, min/max, jitter and
+    the percentile histogram; failed probes only update the counters. Jitter is
+    the mean absolute difference between consecutive successful latencies in
+    the order they were added. Until more than EXACT_SAMPLES successes have
+    been added the samples are also kept verbatim, so percentiles and the
+    median of small runs are exact (interpolated as ``statistics.median``
+    does) rather than histogram estimates.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.total_tests = 0
+        self.failed_tests = 0
+        self.count = 0  # successful samples
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self._jitter_sum = 0.0
+        self._jitter_count = 0
+        self._last_latency = None
+        self.histogram = LogHistogram(relative_accuracy)
+        self._exact = []  # successful latencies while count <= EXACT_SAMPLES, then None
+
+    def add(self, latency_ms):
+        """Record a successful probe latency."""
+        self.total_tests += 1
+        self.count += 1
+        delta = latency_ms - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (latency_ms - self.mean)
+        if latency_ms < self.min:
+            self.min = latency_ms
+        if latency_ms > self.max:
+            self.max = latency_ms
+        if self._last_latency is not None:
+            self._jitter_sum += abs(latency_ms - self._last_latency)
+            self._jitter_count += 1
+        self._last_latency = latency_ms
+        self.histogram.add(latency_ms)
+        if self._exact is not None:
+            self._exact.append(latency_ms)
+            if len(self._exact) > EXACT_SAMPLES:
+                self._exact = None
+
+    def add_failure(self):
+        """Record a failed probe."""
+        self.total_tests += 1
+        self.failed_tests += 1
+
+    def add_result(self, result):
+        """Record a probe result dict as returned by perform_single_test."""
+        if result['success']:
+            self.add(result['latency_ms'])
+        else:
+            self.add_failure()
+
+    def merge(self, other):
+        """
+        Combine another accumulator into this one.
+
+        Moments are merged with Chan's parallel update. The jitter of the two
+        partitions is pooled; the difference across the partition boundary is
+        not counted because the two streams have no common order.
+        """
+        if other.count:
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / total
+            self._m2 += other._m2 + delta * delta * self.count * other.count / total
+            self.count = total
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            if self._last_latency is None:
+                self._last_latency = other._last_latency
+        self.total_tests += other.total_tests
+        self.failed_tests += other.failed_tests
+        self._jitter_sum += other._jitter_sum
+        self._jitter_count += other._jitter_count
+        self.histogram.merge(other.histogram)
+        if self._exact is None or other._exact is None or len(self._exact) + len(other._exact) > EXACT_SAMPLES:
+            self._exact = None
+        else:
+            self._exact = self._exact + other._exact
+        return self
+
+    @property
+    def successful_tests(self):
+        return self.count
+
+    @property
+    def variance(self):
+        """Sample variance (n - 1 denominator), matching statistics.variance."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0
+
+    @property
+    def std_dev(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def jitter(self):
+        return self._jitter_sum / self._jitter_count if self._jitter_count else 0
+
+    def percentile(self, q):
+        """Estimate the ``q`` quantile, clamped to the observed min/max."""
+        if self._exact:
+            ordered = sorted(self._exact)
+            rank = q * (len(ordered) - 1)
+            lower = math.floor(rank)
+            if rank == lower:
+                return ordered[lower]
+            return ordered[lower] + (rank - lower) * (ordered[lower + 1] - ordered[lower])
+        estimate = self.histogram.quantile(q)
+        if estimate is None:
+            return float('inf')
+        return min(max(estimate, self.min), self.max)
+
+    def mean_interval(self, confidence=0.95):
+        """
+        Normal-approximation confidence interval for the mean latency.
+
+        Returns:
+            tuple: (low, high) in ms, or None with fewer than two successful samples
+        """
+        if self.count < 2:
+            return None
+        half_width = z_score(confidence) * self.std_dev / math.sqrt(self.count)
+        return self.mean - half_width, self.mean + half_width
+
+    def percentile_interval(self, q, confidence=0.95):
+        """
+        Distribution-free confidence interval for the ``q`` quantile.
+
+        The bounds are the quantiles at ``q -/+ z * sqrt(q * (1 - q) / n)``,
+        the normal approximation to the binomial order-statistic interval.
+        They are read from the histogram, so they are never narrower than its
+        relative accuracy. Until there are enough samples for both bounds to
+        fall inside the sample (about ``z**2 * q / (1 - q)``, 73 for p95 at
+        95% confidence) no valid interval exists and None is returned; the
+        sample minimum or maximum would not be a confidence bound.
+
+        Returns:
+            tuple: (low, high) in ms, or None when the interval is undefined
+        """
+        if self.count < 2:
+            return None
+        spread = z_score(confidence) * math.sqrt(q * (1 - q) / self.count)
+        if q - spread < 0 or q + spread > 1:
+            return None
+        return self.percentile(q - spread), self.percentile(q + spread)
+
+    def to_statistics(self):
+        """
+        Build the comprehensive statistics dict used across the tester.
+
+        Returns:
+            dict: Same keys as calculate_statistics plus pNN_latency_ms percentiles
+        """
+        stats = {
+            'total_tests': self.total_tests,
+            'successful_tests': self.count,
+            'failed_tests': self.failed_tests,
+            'packet_loss_percentage': (self.failed_tests / self.total_tests) * 100 if self.total_tests else 0,
+            'test_timestamp': datetime.now().isoformat()
+        }
+
+        if self.count:
+            stats.update({
+                'average_latency_ms': self.mean,
+                'min_latency_ms': self.min,
+                'max_latency_ms': self.max,
+                'median_latency_ms': self.percentile(0.5),
+                'std_dev_latency_ms': self.std_dev,
+                'jitter_ms': self.jitter,
+            })
+        else:
+            stats.update({
+                'average_latency_ms': float('inf'),
+                'min_latency_ms': float('inf'),
+                'max_latency_ms': float('inf'),
+                'median_latency_ms': float('inf'),
+                'std_dev_latency_ms': 0,
+                'jitter_ms': 0
+            })
+
+        for name, q in REPORTED_PERCENTILES:
+            stats[f'{name}_latency_ms'] = self.percentile(q)
+        return stats
+
+    def summary(self):
+        """
+        Compact latency summary used for per-phase statistics.
+
+        Returns:
+            dict: count, average/min/max/std-dev and pNN values in milliseconds
+        """
+        summary = {'count': self.count}
+        if self.count:
+            summary.update({
+                'average_ms': self.mean,
+                'min_ms': self.min,
+                'max_ms': self.max,
+                'std_dev_ms': self.std_dev,
+            })
+            for name, q in REPORTED_PERCENTILES:
+                summary[f'{name}_ms'] = self.percentile(q)
+        return summary
+
+    def to_state(self):
+        """Return a compact picklable snapshot for shipping between workers."""
+        return {
+            'total_tests': self.total_tests,
+            'failed_tests': self.failed_tests,
+            'count': self.count,
+            'mean': self.mean,
+            'm2': self._m2,
+            'min': self.min,
+            'max': self.max,
+            'jitter_sum': self._jitter_sum,
+            'jitter_count': self._jitter_count,
+            'last_latency': self._last_latency,
+            'histogram': self.histogram.to_dict(),
+            'exact': self._exact,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild an accumulator from to_state output."""
+        accumulator = cls(state['histogram']['relative_accuracy'])
+        accumulator.total_tests = state['total_tests']
+        accumulator.failed_tests = state['failed_tests']
+        accumulator.count = state['count']
+        accumulator.mean = state['mean']
+        accumulator._m2 = state['m2']
+        accumulator.min = state['min']
+        accumulator.max = state['max']
+        accumulator._jitter_sum = state['jitter_sum']
+        accumulator._jitter_count = state['jitter_count']
+        accumulator._last_latency = state['last_latency']
+        accumulator.histogram = LogHistogram.from_dict(state['histogram'])
+        accumulator._exact = None if state['exact'] is None else list(state['exact'])
+        return accumulator
@@ -0,0 +1,146 @@
+"""
+Lazy target expansion for large host:port sweeps.
+
+Host specs may be hostnames, IP addresses or CIDR blocks (``10.0.0.0/16``),
+and host files list one spec per line (``#`` starts a comment). Port specs
+are lists and ranges such as ``"22,80,8000-8100"``. Everything is expanded
+by generators, so a sweep holds only the targets currently being probed no
+matter how many host:port pairs the specs describe:
+
+    targets = iter_targets(iter_hosts(['10.0.0.0/16', 'example.com']), '22,80,443')
+    tester.perform_sweep(targets, on_result=print)
+
+Each swept target gets one SweepResult whose verdict is ``reachable`` (the
+connect succeeded), ``refused`` (the host answered with a reset),
+``filtered`` (no answer before the timeout, or the host was unreachable) or
+``error`` (e.g. the name did not resolve).
+"""
+import ipaddress
+
+from sample_store import ErrorKind
+
+VERDICTS = ('reachable', 'refused', 'filtered', 'error')
+
+_VERDICT_BY_KIND = {
+    ErrorKind.NONE: 'reachable',
+    ErrorKind.REFUSED: 'refused',
+    ErrorKind.RESET: 'refused',
+    ErrorKind.TIMEOUT: 'filtered',
+    ErrorKind.UNREACHABLE: 'filtered',
+    ErrorKind.CIRCUIT_OPEN: 'filtered',
+}
+
+
+def verdict_for(error_kind):
+    """Map a probe's ErrorKind to its sweep verdict."""
+    return _VERDICT_BY_KIND.get(error_kind, 'error')
+
+
+def parse_ports(spec):
+    """
+    Parse a port spec into ranges.
+
+    Args:
+        spec: An int, a string such as ``"22,80,8000-8100"``, or an iterable
+            of ints and such strings
+
+    Returns:
+        list: range objects covering the requested ports, in the given order
+
+    Raises:
+        ValueError: For malformed specs or ports outside 1-65535
+    """
+    if isinstance(spec, int):
+        parts = [spec]
+    elif isinstance(spec, str):
+        parts = spec.split(',')
+    else:
+        parts = list(spec)
+    ranges = []
+    for part in parts:
+        if isinstance(part, str):
+            part = part.strip()
+            if not part:
+                continue
+            first, _, last = part.partition('-')
+            first, last = int(first), int(last or first)
+        else:
+            first = last = int(part)
+        if not 1 <= first <= last <= 65535:
+            raise ValueError(f"Invalid port range {first}-{last}")
+        ranges.append(range(first, last + 1))
+    if not ranges:
+        raise ValueError("No ports given")
+    return ranges
+
+
+def iter_hosts(specs):
+    """
+    Expand host specs one address at a time.
+
+    Args:
+        specs (iterable): Hostnames, IP addresses or CIDR blocks; blank
+            entries and ``#`` comments are skipped
+
+    Yields:
+        str: Hostname or IP address
+    """
+    for spec in specs:
+        spec = spec.split('#', 1)[0].strip()
+        if not spec:
+            continue
+        if '/' in spec:
+            for address in ipaddress.ip_network(spec, strict=False).hosts():
+                yield str(address)
+        else:
+            yield spec
+
+
+def iter_host_file(filename):
+    """Yield the hosts listed in a host file, reading it line by line."""
+    with open(filename, 'r') as file:
+        yield from iter_hosts(file)
+
+
+def iter_targets(hosts, ports):
+    """
+    Pair every host with every port, lazily.
+
+    Args:
+        hosts (iterable): Hosts, e.g. from iter_hosts or iter_host_file
+        ports: Port spec accepted by parse_ports
+
+    Yields:
+        tuple: (host, port)
+    """
+    ranges = parse_ports(ports)
+    for host in hosts:
+        for port_range in ranges:
+            for port in port_range:
+                yield host, port
+
+
+class SweepResult:
+    """Summary of one swept target."""
+
+    __slots__ = ('host', 'port', 'verdict', 'latency_ms', 'error', 'probes')
+
+    def __init__(self, host, port, verdict, latency_ms, error, probes):
+        self.host = host
+        self.port = port
+        self.verdict = verdict
+        self.latency_ms = latency_ms  # fastest successful probe, None unless reachable
+        self.error = error
+        self.probes = probes
+
+    @property
+    def target(self):
+        return f"{self.host}:{self.port}"
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        if self.verdict == 'reachable':
+            return f"SweepResult({self.target!r}, reachable, {self.latency_ms:.2f} ms)"
+        return f"SweepResult({self.target!r}, {self.verdict})"
@@ -0,0 +1,224 @@
+"""
+Round-trip times over persistent TCP connections.
+
+Connect probes pay for a handshake and leave a TIME_WAIT socket behind on
+every sample, which caps the sample rate and exhausts ephemeral ports.
+EchoConnectionPool instead keeps a few long-lived connections per target.
+Each sample sends a small timestamped frame and waits for the
+TCPEchoResponder to send it back, so a sample costs one round trip and no
+new socket.
+
+Frames are a magic tag, a sequence number and the sender's send time (ns).
+The RTT is computed from the echoed timestamp, and the sequence number
+detects a stream that is out of step. A connection whose echo times out or
+fails is closed and replaced, never reused.
+
+Run a responder on the far end with:
+
+    python tcp_echo.py --serve --host 0.0.0.0 --port 7007
+"""
+import asyncio
+import socket
+import struct
+import threading
+import time
+
+MAGIC = b'NLTE'
+# magic, sequence number, sender send time (ns)
+FRAME = struct.Struct('!4sQq')
+
+
+class TCPEchoResponder:
+    def __init__(self, host='127.0.0.1', port=0, backlog=128, delay=0):
+        """
+        Args:
+            host (str): Address to bind
+            port (int): Port to bind (0 picks an ephemeral port)
+            backlog (int): Listen backlog
+            delay (float): Seconds to wait before echoing each read (for tests)
+        """
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.delay = delay
+        self.connections_accepted = 0
+        self.bytes_echoed = 0
+        self._listener = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def address(self):
+        return self.host, self.port
+
+    def start(self):
+        """Bind the listener and accept on a daemon thread; each connection gets its own thread."""
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((self.host, self.port))
+        self.port = self._listener.getsockname()[1]
+        self._listener.listen(self.backlog)
+        self._listener.settimeout(0.1)
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._listener is not None:
+            self._listener.close()
+
+    def serve_forever(self):
+        """Echo on the calling thread until interrupted."""
+        self.start()
+        try:
+            while self._thread.is_alive():
+                self._thread.join(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _accept_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                conn, _ = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.connections_accepted += 1
+            threading.Thread(target=self._echo, args=(conn,), daemon=True).start()
+
+    def _echo(self, conn):
+        with conn:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.settimeout(0.5)
+            while not self._stop_event.is_set():
+                try:
+                    data = conn.recv(65536)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    return
+                if not data:
+                    return
+                if self.delay:
+                    time.sleep(self.delay)
+                try:
+                    conn.sendall(data)
+                except OSError:
+                    return
+                self.bytes_echoed += len(data)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class EchoConnectionPool:
+    """Long-lived, non-blocking connections to one echo responder."""
+
+    def __init__(self, address, family=socket.AF_INET):
+        """
+        Args:
+            address (tuple): Responder socket address
+            family (int): Address family of ``address``
+        """
+        self.address = address
+        self.family = family
+        self.idle = []  # connected sockets not in use
+        self.connects = 0  # connections opened over the pool's lifetime
+        self.replaced = 0  # connections closed after a failed echo
+        self.connect_ms = []  # handshake time of recent connections
+        self._sequence = 0
+
+    async def acquire(self, timeout):
+        """Return an idle connection, or open a new one (raises on failure)."""
+        if self.idle:
+            return self.idle.pop()
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        try:
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            start = time.perf_counter_ns()
+            await asyncio.wait_for(loop.sock_connect(sock, self.address), timeout)
+        except BaseException:
+            sock.close()
+            raise
+        self.connects += 1
+        self.connect_ms = self.connect_ms[-99:] + [(time.perf_counter_ns() - start) / 1e6]
+        return sock
+
+    def release(self, sock):
+        """Return a healthy connection to the pool."""
+        self.idle.append(sock)
+
+    def discard(self, sock):
+        """Close a connection whose stream can no longer be trusted."""
+        self.replaced += 1
+        sock.close()
+
+    async def echo(self, sock, timeout):
+        """
+        Send one frame over ``sock`` and wait for its echo.
+
+        Returns:
+            float: Round-trip time in milliseconds
+
+        Raises:
+            asyncio.TimeoutError, OSError: The connection must then be discarded
+        """
+        loop = asyncio.get_running_loop()
+        self._sequence += 1
+        sequence = self._sequence
+        frame = bytearray(FRAME.size)
+        FRAME.pack_into(frame, 0, MAGIC, sequence, time.perf_counter_ns())
+        await asyncio.wait_for(self._exchange(loop, sock, frame), timeout)
+        received_ns = time.perf_counter_ns()
+        magic, echoed_sequence, sent_ns = FRAME.unpack(frame)
+        if magic != MAGIC or echoed_sequence != sequence:
+            raise ConnectionError("Echo frame out of sequence")
+        return (received_ns - sent_ns) / 1e6
+
+    @staticmethod
+    async def _exchange(loop, sock, frame):
+        await loop.sock_sendall(sock, frame)
+        view = memoryview(frame)
+        received = 0
+        while received < len(frame):
+            count = await loop.sock_recv_into(sock, view[received:])
+            if not count:
+                raise ConnectionResetError("Echo responder closed the connection")
+            received += count
+
+    def close(self):
+        """Close every idle connection."""
+        for sock in self.idle:
+            sock.close()
+        self.idle.clear()
+
+
+def main(argv=None):
+    """Run a TCP echo responder for persistent-connection RTT probes."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="TCP echo responder for latency probes")
+    parser.add_argument('--serve', action='store_true', required=True, help="Run the echo responder")
+    parser.add_argument('--host', default='0.0.0.0', help="Address to bind")
+    parser.add_argument('--port', type=int, default=7007, help="Port to bind")
+    args = parser.parse_args(argv)
+
+    responder = TCPEchoResponder(args.host, args.port)
+    print(f"TCP echo responder on {args.host}:{args.port} (Ctrl+C to stop)")
+    responder.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
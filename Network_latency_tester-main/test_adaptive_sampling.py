@@ -0,0 +1,135 @@
+import asyncio
+import random
+
+import Advanced_Network_Latency_Tester as ant
+from loopback_servers import TCPStandInServer
+from streaming_statistics import StreamingStatistics
+
+
+class SyntheticTester(ant.AdvancedLatencyTester):
+    """Tester whose probes return latencies drawn from a known distribution"""
+
+    def __init__(self, mean_ms, std_ms, fail=False, delay=0, seed=1, **kwargs):
+        super().__init__(keep_individual_results=False, **kwargs)
+        self.rng = random.Random(seed)
+        self.mean_ms, self.std_ms, self.fail, self.delay = mean_ms, std_ms, fail, delay
+
+    async def _probe_async(self, host, port, timeout, probe='tcp'):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            return float('inf'), ant.ErrorKind.TIMEOUT, 'Connection timeout', {}, None
+        return max(0.01, self.rng.gauss(self.mean_ms, self.std_ms)), ant.ErrorKind.NONE, None, {}, None
+
+
+def test_confidence_intervals_cover_true_values():
+    """95% intervals for the mean and p95 contain the true values in about 95% of trials"""
+    rng = random.Random(3)
+    true_mean = 10.0
+    true_p95 = 10.0 + 1.6449 * 2.0
+    mean_hits = p95_hits = 0
+    trials = 200
+    for _ in range(trials):
+        accumulator = StreamingStatistics()
+        for _ in range(400):
+            accumulator.add(rng.gauss(10.0, 2.0))
+        low, high = accumulator.mean_interval(0.95)
+        mean_hits += low <= true_mean <= high
+        low, high = accumulator.percentile_interval(0.95, 0.95)
+        p95_hits += low <= true_p95 <= high
+    assert mean_hits / trials > 0.88, mean_hits
+    assert p95_hits / trials > 0.85, p95_hits
+
+    assert StreamingStatistics().mean_interval() is None
+    wide = StreamingStatistics()
+    for latency in (1.0, 2.0, 3.0):
+        wide.add(latency)
+    assert wide.percentile_interval(0.5, 0.95) is None
+    narrow_low, narrow_high = wide.mean_interval(0.5)
+    wide_low, wide_high = wide.mean_interval(0.99)
+    assert wide_low < narrow_low < 2.0 < narrow_high < wide_high
+
+
+def test_percentile_interval_needs_enough_samples():
+    """No p95 interval exists until both order statistics fall inside the sample"""
+    rng = random.Random(9)
+    accumulator = StreamingStatistics()
+    for _ in range(20):
+        accumulator.add(rng.gauss(10.0, 2.0))
+    assert accumulator.percentile_interval(0.95, 0.95) is None
+    assert accumulator.percentile_interval(0.5, 0.95) is not None
+    for _ in range(53):
+        accumulator.add(rng.gauss(10.0, 2.0))
+    low, high = accumulator.percentile_interval(0.95, 0.95)
+    assert low < high <= accumulator.max
+
+    # Twenty identical samples no longer count as a converged p95
+    early = SyntheticTester(20.0, 0.0).perform_adaptive_tests('target', 80, relative_error=0.05, max_probes=20)
+    assert early['adaptive']['stop_reason'] == 'budget'
+    assert early['adaptive']['percentile_interval_ms'] is None
+
+
+def test_stable_targets_stop_early_and_noisy_ones_probe_more():
+    """Probes are spent where latency is noisy, and stop once the intervals are tight"""
+    stable = SyntheticTester(20.0, 0.2).perform_adaptive_tests('target', 80, relative_error=0.05)
+    noisy = SyntheticTester(20.0, 8.0).perform_adaptive_tests('target', 80, relative_error=0.05,
+                                                              max_probes=20000)
+
+    assert stable['adaptive']['stop_reason'] == 'converged'
+    # p95 bounds at 95% confidence need at least 73 samples
+    assert 73 <= stable['adaptive']['probes_used'] == stable['total_tests'] <= 160
+    assert noisy['adaptive']['stop_reason'] == 'converged'
+    assert 200 < noisy['adaptive']['probes_used'] < 20000
+    for stats in (stable, noisy):
+        adaptive = stats['adaptive']
+        assert adaptive['mean_relative_error'] <= 0.05 and adaptive['percentile_relative_error'] <= 0.05
+        low, high = adaptive['mean_interval_ms']
+        assert low <= stats['average_latency_ms'] <= high
+        assert abs(stats['average_latency_ms'] - 20.0) < 2
+
+
+def test_budget_deadline_and_dead_targets_stop_probing():
+    """The probe budget, the deadline and an unreachable target all end the run"""
+    budget = SyntheticTester(20.0, 8.0).perform_adaptive_tests('target', 80, relative_error=0.01, max_probes=50)
+    assert budget['adaptive']['stop_reason'] == 'budget' and budget['adaptive']['probes_used'] == 50
+
+    deadline = SyntheticTester(20.0, 8.0, delay=0.005).perform_adaptive_tests(
+        'target', 80, relative_error=0.01, max_probes=100000, deadline=0.1)
+    assert deadline['adaptive']['stop_reason'] == 'deadline'
+    assert 20 <= deadline['adaptive']['probes_used'] < 1000
+    assert deadline['adaptive']['duration_s'] < 1
+
+    dead = SyntheticTester(0, 0, fail=True).perform_adaptive_tests('target', 80, min_probes=30)
+    assert dead['adaptive']['stop_reason'] == 'no_successes' and dead['adaptive']['probes_used'] == 30
+    assert dead['adaptive']['mean_interval_ms'] is None and dead['packet_loss_percentage'] == 100
+
+
+def test_parallel_tests_adaptive_mode():
+    """perform_parallel_tests treats num_tests as the budget when relative_error is given"""
+    tester = ant.AdvancedLatencyTester()
+    with TCPStandInServer() as server:
+        stats = tester.perform_parallel_tests(*server.address, num_tests=300, relative_error=0.2)
+    adaptive = stats['adaptive']
+    assert adaptive['stop_reason'] in ('converged', 'budget')
+    assert adaptive['probes_used'] == stats['total_tests'] == len(stats['individual_results']) <= 300
+    assert stats['successful_tests'] == stats['total_tests']
+
+    try:
+        tester.perform_parallel_tests('127.0.0.1', 1, num_tests=10, engine='thread', relative_error=0.2)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("adaptive sampling accepted the thread engine")
+
+    async def from_running_loop():
+        with TCPStandInServer() as server:
+            return tester.perform_parallel_tests(*server.address, num_tests=100, relative_error=0.2)
+    assert asyncio.run(from_running_loop())['adaptive']['probes_used'] <= 100
+
+
+if __name__ == "__main__":
+    test_confidence_intervals_cover_true_values()
+    test_percentile_interval_needs_enough_samples()
+    test_stable_targets_stop_early_and_noisy_ones_probe_more()
+    test_budget_deadline_and_dead_targets_stop_probing()
+    test_parallel_tests_adaptive_mode()
+    print("\nAll adaptive sampling tests passed!")
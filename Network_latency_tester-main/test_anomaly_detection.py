@@ -0,0 +1,104 @@
+import random
+import time
+
+import Advanced_Network_Latency_Tester as ant
+from anomaly_detection import AnomalyMonitor, CUSUMDetector, EWMADetector, LossDetector
+from loopback_servers import TCPStandInServer
+from sample_store import ErrorKind
+
+
+def feed(detector, values):
+    """Return the alert kinds raised while feeding (latency, success) pairs"""
+    findings = [detector.update(latency, success) for latency, success in values]
+    return [finding[0] for finding in findings if finding is not None]
+
+
+def test_ewma_flags_spikes_but_not_noise():
+    """Single large spikes alert; ordinary jitter does not"""
+    rng = random.Random(1)
+    detector = EWMADetector()
+    noise = [(rng.gauss(20, 1), True) for _ in range(500)]
+    assert feed(detector, noise) == []
+    assert feed(detector, [(60.0, True)]) == ['latency_spike']
+    # Cooldown suppresses an immediate second alert
+    assert feed(detector, [(60.0, True)]) == []
+
+
+def test_cusum_detects_sustained_shift():
+    """A small sustained shift is caught quickly, then a new baseline is learned"""
+    rng = random.Random(2)
+    detector = CUSUMDetector()
+    assert feed(detector, [(rng.gauss(10, 1), True) for _ in range(300)]) == []
+
+    findings = [detector.update(rng.gauss(12, 1), True) for _ in range(50)]
+    raised = [(index, finding) for index, finding in enumerate(findings) if finding is not None]
+    assert len(raised) == 1
+    index, (kind, _, level, baseline, _) = raised[0]
+    assert kind == 'latency_shift_up' and index < 15
+    assert abs(baseline - 10) < 0.5 and abs(level - 12) < 1.5
+
+    # The shifted level becomes the new normal
+    assert feed(detector, [(rng.gauss(12, 1), True) for _ in range(300)]) == []
+    assert 'latency_shift_down' in feed(detector, [(rng.gauss(9, 1), True) for _ in range(50)])
+
+
+def test_loss_bursts_and_rate():
+    """Consecutive failures and sustained loss alert once each, then recover"""
+    detector = LossDetector()
+    kinds = feed(detector, [(1.0, True)] * 50 + [(None, False)] * 5 + [(1.0, True)] * 100)
+    assert kinds == ['loss_burst', 'loss_rate_high', 'loss_recovered']
+
+
+def test_monitor_runs_per_target_in_probe_pipeline():
+    """An attached monitor sees every probe and keeps detectors per target"""
+    monitor = AnomalyMonitor()
+    seen = []
+    monitor.alert_listeners.append(seen.append)
+    tester = ant.AdvancedLatencyTester()
+    tester.listeners.append(monitor.record_probe)
+
+    with TCPStandInServer() as server:
+        tester.perform_parallel_tests(*server.address, num_tests=40)
+        closed_port = server.port
+    tester.perform_parallel_tests('127.0.0.1', closed_port, num_tests=5, engine='thread')
+
+    assert len(monitor.detectors) == 1  # the port was reused, so it is the same target
+    # Loopback latency under load can legitimately shift, so only loss alerts are checked
+    loss_alerts = [alert for alert in seen if alert.detector == 'loss']
+    assert [alert.kind for alert in loss_alerts] == ['loss_burst', 'loss_rate_high']
+    assert loss_alerts[0].to_dict()['target'] == f"127.0.0.1:{closed_port}"
+
+
+def test_monitor_evicts_least_recently_probed_targets():
+    """Sweeping many targets keeps the detector sets bounded"""
+    monitor = AnomalyMonitor(max_targets=50)
+    for host in range(500):
+        monitor.record_probe(f"10.0.{host // 256}.{host % 256}:80", 1.0, ErrorKind.NONE)
+        monitor.record_probe('busy:80', 1.0, ErrorKind.NONE)
+    assert len(monitor.detectors) == 50
+    assert 'busy:80' in monitor.detectors and '10.0.0.0:80' not in monitor.detectors
+    assert list(monitor.detectors)[-1] == 'busy:80'
+
+
+def test_detectors_keep_up_with_high_probe_rates():
+    """Per-sample cost stays far below the time between probes at thousands per second"""
+    monitor = AnomalyMonitor()
+    rng = random.Random(3)
+    samples = [(rng.gauss(5, 0.5), ErrorKind.NONE if rng.random() > 0.01 else ErrorKind.TIMEOUT)
+               for _ in range(50000)]
+    started = time.perf_counter()
+    for latency, kind in samples:
+        monitor.record_probe('a:80', latency, kind)
+    per_sample_us = (time.perf_counter() - started) / len(samples) * 1e6
+    assert per_sample_us < 100
+    print(f"Anomaly detection: {per_sample_us:.2f} us per sample")
+
+
+if __name__ == "__main__":
+    test_ewma_flags_spikes_but_not_noise()
+    test_cusum_detects_sustained_shift()
+    test_loss_bursts_and_rate()
+    test_monitor_runs_per_target_in_probe_pipeline()
+    test_monitor_evicts_least_recently_probed_targets()
+    test_detectors_keep_up_with_high_probe_rates()
+    print("\nAll anomaly detection tests passed!")
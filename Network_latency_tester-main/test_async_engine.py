@@ -0,0 +1,70 @@
+import asyncio
+
+import Advanced_Network_Latency_Tester as ant
+from loopback_servers import TCPStandInServer
+
+
+def test_async_engine_matches_result_shape():
+    """Async probes return the same dict keys as the blocking probe"""
+    tester = ant.AdvancedLatencyTester()
+
+    with TCPStandInServer() as server:
+        sync_result = tester.perform_single_test(*server.address)
+        async_result = asyncio.run(tester.perform_single_test_async(*server.address))
+
+    assert sync_result['success'] and async_result['success']
+    assert set(sync_result) == set(async_result)
+    assert async_result['latency_ms'] == async_result['rtt_ms']
+
+
+def test_async_engine_many_in_flight():
+    """The async engine completes every probe with a bounded in-flight limit"""
+    tester = ant.AdvancedLatencyTester(max_in_flight=200)
+
+    with TCPStandInServer() as server:
+        stats = tester.perform_parallel_tests(*server.address, num_tests=1000, timeout=5)
+
+    assert stats['total_tests'] == 1000
+    assert stats['successful_tests'] == 1000
+    assert len(stats['individual_results']) == 1000
+    print(f"Async engine: 1000 probes, avg {stats['average_latency_ms']:.3f} ms")
+
+
+def test_async_engine_refused_and_timeout():
+    """Refused and timed-out connects are reported like the thread engine does"""
+    tester = ant.AdvancedLatencyTester()
+
+    with TCPStandInServer() as server:
+        closed_port = server.port
+    refused = asyncio.run(tester.perform_single_test_async('127.0.0.1', closed_port, 1))
+    assert not refused['success']
+    assert refused['latency_ms'] is None
+
+    # A listener that never accepts stops completing handshakes once its backlog is full
+    with TCPStandInServer(backlog=0, accept=False) as server:
+        stats = tester.perform_parallel_tests(*server.address, num_tests=4, timeout=0.5)
+    timeouts = [r for r in stats['individual_results'] if r['error'] == 'Connection timeout']
+    assert timeouts
+    assert all(r['latency_ms'] == float('inf') for r in timeouts)
+
+
+def test_engines_produce_same_statistics_shape():
+    """Both engines feed calculate_statistics and record_comprehensive_result unchanged"""
+    tester = ant.AdvancedLatencyTester(max_workers=5)
+
+    with TCPStandInServer() as server:
+        async_stats = tester.perform_parallel_tests(*server.address, num_tests=20, engine='async')
+        thread_stats = tester.perform_parallel_tests(*server.address, num_tests=20, engine='thread')
+
+    assert set(async_stats) == set(thread_stats)
+    tester.record_comprehensive_result('async_run', async_stats)
+    tester.record_comprehensive_result('thread_run', thread_stats)
+    assert len(tester.test_history) == 2
+
+
+if __name__ == "__main__":
+    test_async_engine_matches_result_shape()
+    test_async_engine_many_in_flight()
+    test_async_engine_refused_and_timeout()
+    test_engines_produce_same_statistics_shape()
+    print("\nAll async engine tests passed!")
@@ -0,0 +1,68 @@
+import time
+
+import Advanced_Network_Latency_Tester as ant
+import benchmark
+from loopback_servers import TLSStandInServer, loopback_client_context
+
+
+def test_injected_accept_delay_is_measured():
+    """A delayed accept shows up in the TLS handshake phase"""
+    tester = ant.AdvancedLatencyTester(ssl_context=loopback_client_context())
+
+    with TLSStandInServer() as server:
+        prompt = [tester.perform_single_test('localhost', server.port, probe='tls') for _ in range(5)]
+    with TLSStandInServer(accept_delay=0.03, accept_jitter=0.01, seed=7) as server:
+        results = [tester.perform_single_test('localhost', server.port, probe='tls') for _ in range(5)]
+
+    # Only lower bounds and orderings: a loaded machine can add any amount of time
+    assert all(r['success'] for r in prompt + results)
+    assert all(r['tls_ms'] >= 30 for r in results)
+    assert min(r['tls_ms'] for r in results) > min(r['tls_ms'] for r in prompt)
+
+
+def test_injected_drops_are_reported_as_loss():
+    """Connections reset by the server count as failed probes"""
+    tester = ant.AdvancedLatencyTester(ssl_context=loopback_client_context())
+
+    with TLSStandInServer(drop_rate=0.5, seed=3) as server:
+        stats = tester.perform_parallel_tests('localhost', server.port, num_tests=100, probe='tls')
+        dropped = server.connections_dropped
+
+    assert 20 < dropped < 80
+    assert stats['failed_tests'] == dropped
+
+
+def test_compare_flags_regressions():
+    """Only metrics worse than their tolerance are reported"""
+    baseline = {'metrics': {'async_probes_per_second': 10000, 'bytes_per_sample': 40, 'timing_error_ms': 0.5}}
+
+    assert benchmark.compare({'async_probes_per_second': 6000, 'bytes_per_sample': 45,
+                              'timing_error_ms': 2.0}, baseline) == []
+    regressions = benchmark.compare({'async_probes_per_second': 4000, 'bytes_per_sample': 60,
+                                     'timing_error_ms': 3.0}, baseline)
+    assert len(regressions) == 3
+    assert regressions[0].startswith('async_probes_per_second')
+
+    baseline['tolerances'] = {'bytes_per_sample': (1.0, 0)}
+    assert len(benchmark.compare({'bytes_per_sample': 60}, baseline)) == 0
+
+
+def test_quick_benchmark_runs():
+    """The quick benchmark produces every metric with sane values"""
+    start = time.perf_counter()
+    results = benchmark.run_benchmarks(quick=True)
+
+    assert set(results) == set(benchmark.METRICS)
+    assert results['async_probes_per_second'] > 0
+    assert results['timing_error_ms'] >= 0
+    assert results['loss_error_pct'] == 0
+    assert results['saturation_timeout_pct'] == 100
+    print(f"Quick benchmark finished in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    test_injected_accept_delay_is_measured()
+    test_injected_drops_are_reported_as_loss()
+    test_compare_flags_regressions()
+    test_quick_benchmark_runs()
+    print("\nAll benchmark tests passed!")
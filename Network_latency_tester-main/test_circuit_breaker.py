@@ -0,0 +1,179 @@
+import time
+
+import Advanced_Network_Latency_Tester as ant
+from circuit_breaker import TRIAL, CircuitBreaker
+from loopback_servers import TCPStandInServer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_backs_off_and_recovers():
+    """Consecutive timeouts open the circuit; half-open checks back off exponentially"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, base_backoff=1, max_backoff=4, clock=clock)
+    target = 'dead:80'
+
+    for _ in range(3):
+        assert breaker.allow(target)
+        breaker.record(target, float('inf'), ant.ErrorKind.TIMEOUT)
+    assert breaker.health(target)['state'] == 'open'
+    assert not breaker.allow(target) and not breaker.allow(target)
+    assert breaker.health(target)['short_circuited'] == 2
+
+    # Each failed recovery check doubles the wait, up to max_backoff
+    for expected_backoff in (1, 2, 4, 4):
+        clock.now += expected_backoff - 0.01
+        assert not breaker.allow(target)
+        clock.now += 0.01
+        assert breaker.allow(target) == TRIAL  # the single half-open probe
+        assert not breaker.allow(target)  # concurrent probes stay short-circuited
+        breaker.record(target, float('inf'), ant.ErrorKind.TIMEOUT, TRIAL)
+        assert breaker.health(target)['retry_in_s'] == expected_backoff * 2 if expected_backoff < 4 else 4
+
+    clock.now += 4
+    assert breaker.allow(target) == TRIAL
+    breaker.record(target, 1.5, ant.ErrorKind.NONE, TRIAL)
+    health = breaker.health(target)
+    assert health['state'] == 'closed' and health['consecutive_timeouts'] == 0 and health['trips'] == 5
+    assert breaker.allow(target) and breaker.open_targets() == []
+
+    # A refusal also proves the host is answering
+    for _ in range(3):
+        breaker.record(target, float('inf'), ant.ErrorKind.TIMEOUT)
+    clock.now += 1
+    assert breaker.allow(target) == TRIAL
+    breaker.record(target, None, ant.ErrorKind.REFUSED, TRIAL)
+    assert breaker.health(target)['state'] == 'closed'
+
+    # A cancelled recovery probe gives its slot back
+    for _ in range(3):
+        breaker.record(target, float('inf'), ant.ErrorKind.TIMEOUT)
+    clock.now += 1
+    assert breaker.allow(target) == TRIAL and not breaker.allow(target)
+    breaker.release(target, True)  # only the trial's own slot can be given back
+    assert not breaker.allow(target)
+    breaker.release(target, TRIAL)
+    assert breaker.allow(target) == TRIAL
+
+
+def test_only_the_trial_probe_moves_an_open_circuit():
+    """Late results of probes started before the circuit opened leave it alone"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, base_backoff=1, clock=clock)
+    target = 'flaky:80'
+    assert breaker.allow(target) is True and breaker.allow(target) is True
+    for _ in range(2):
+        breaker.record(target, float('inf'), ant.ErrorKind.TIMEOUT)
+    assert breaker.health(target)['state'] == 'open'
+
+    # A straggler answering while open does not close the circuit
+    breaker.record(target, 3.0, ant.ErrorKind.NONE)
+    assert breaker.health(target)['state'] == 'open'
+
+    clock.now += 1
+    assert breaker.allow(target) == TRIAL
+    # Nor does a straggler's answer or timeout decide the half-open check
+    breaker.record(target, 3.0, ant.ErrorKind.NONE)
+    breaker.record(target, float('inf'), ant.ErrorKind.TIMEOUT)
+    health = breaker.health(target)
+    assert health['state'] == 'half_open' and health['consecutive_timeouts'] == 2
+    assert not breaker.allow(target)  # the trial is still in flight
+    breaker.record(target, 2.0, ant.ErrorKind.NONE, TRIAL)
+    assert breaker.health(target)['state'] == 'closed'
+
+
+def test_idle_closed_targets_are_evicted():
+    """Sweeping many targets keeps the breaker bounded without forgetting open circuits"""
+    breaker = CircuitBreaker(failure_threshold=1, base_backoff=60, max_targets=100)
+    breaker.record('dead:80', float('inf'), ant.ErrorKind.TIMEOUT)
+    breaker.record('busy:80', 1.0, ant.ErrorKind.NONE)
+    for host in range(1000):
+        breaker.record(f"10.0.{host // 256}.{host % 256}:80", 1.0, ant.ErrorKind.NONE)
+        if host % 50 == 0:
+            breaker.allow('busy:80')  # recently used targets are kept
+    assert len(breaker.targets) == 100
+    assert 'busy:80' in breaker.targets and '10.0.0.0:80' not in breaker.targets
+    assert breaker.open_targets() == ['dead:80'] and not breaker.allow('dead:80')
+
+    # Status queries do not add targets
+    assert breaker.health('unknown:80')['state'] == 'closed' and 'unknown:80' not in breaker.targets
+
+    # A blackholed range opens every circuit; the oldest open targets make way
+    for host in range(300):
+        breaker.record(f"10.1.{host // 256}.{host % 256}:80", float('inf'), ant.ErrorKind.TIMEOUT)
+    assert len(breaker.targets) == 100 and len(breaker.open_targets()) == 100
+    assert '10.1.0.199:80' not in breaker.targets and '10.1.1.43:80' in breaker.targets
+
+
+def test_adaptive_timeout_follows_latency():
+    """Timeouts shrink to srtt + 4 * rttvar once warmed up and double after each timeout"""
+    breaker = CircuitBreaker(adaptive_timeout=True, min_timeout=0.001, warmup=5)
+    target = 'live:443'
+    assert breaker.timeout_for(target, 5) == 5
+    for latency in (20, 22, 18, 20, 21, 19, 20, 20, 20, 20):
+        breaker.record(target, latency, ant.ErrorKind.NONE)
+    health = breaker.targets[target]
+    expected = (health.srtt + 4 * health.rttvar) / 1000
+    assert abs(breaker.timeout_for(target, 5) - expected) < 1e-12
+    assert 0.02 < expected < 0.06
+    assert breaker.health(target)['timeout_s'] == expected
+
+    breaker.record(target, float('inf'), ant.ErrorKind.TIMEOUT)
+    assert abs(breaker.timeout_for(target, 5) - 2 * expected) < 1e-12
+    assert breaker.timeout_for(target, 0.01) == 0.01  # never above the caller's timeout
+    assert CircuitBreaker(adaptive_timeout=True, min_timeout=0.25, warmup=1).timeout_for(target, 5) == 5
+
+    floored = CircuitBreaker(adaptive_timeout=True, min_timeout=0.25, warmup=1)
+    floored.record(target, 1, ant.ErrorKind.NONE)
+    assert floored.timeout_for(target, 5) == 0.25
+
+
+def test_dead_target_fails_fast():
+    """Probes of a blackholed target are short-circuited instead of waiting for the timeout"""
+    breaker = CircuitBreaker(failure_threshold=2, base_backoff=60)
+    tester = ant.AdvancedLatencyTester(circuit_breaker=breaker)
+
+    with TCPStandInServer(backlog=0, accept=False) as blackhole:
+        # The listen queue fills after the first connect, then connects go unanswered
+        start = time.perf_counter()
+        results = [tester.perform_single_test(*blackhole.address, timeout=0.3) for _ in range(20)]
+        elapsed = time.perf_counter() - start
+        stats = tester.perform_parallel_tests(*blackhole.address, num_tests=200, timeout=0.3)
+
+    errors = [result['error'] for result in results]
+    assert errors.count('Connection timeout') == 2
+    assert errors[-1] == 'Circuit open: target not responding'
+    assert elapsed < 2, elapsed
+    assert stats['failed_tests'] == 200
+    assert {sample.error_kind for sample in stats['individual_results']} == {ant.ErrorKind.CIRCUIT_OPEN}
+    health = breaker.health(f"{blackhole.host}:{blackhole.port}")
+    assert health['state'] == 'open'
+    assert health['short_circuited'] == 200 + errors.count('Circuit open: target not responding')
+
+
+def test_live_targets_are_unaffected():
+    """A healthy target keeps a closed circuit and probes normally"""
+    breaker = CircuitBreaker(failure_threshold=1, adaptive_timeout=True)
+    tester = ant.AdvancedLatencyTester(circuit_breaker=breaker)
+    with TCPStandInServer() as server:
+        stats = tester.perform_parallel_tests(*server.address, num_tests=100)
+    assert stats['successful_tests'] == 100
+    health = breaker.health(f"127.0.0.1:{server.port}")
+    assert health['state'] == 'closed' and health['short_circuited'] == 0
+    assert health['timeout_s'] == 0.25
+
+
+if __name__ == "__main__":
+    test_breaker_opens_backs_off_and_recovers()
+    test_only_the_trial_probe_moves_an_open_circuit()
+    test_idle_closed_targets_are_evicted()
+    test_adaptive_timeout_follows_latency()
+    test_dead_target_fails_fast()
+    test_live_targets_are_unaffected()
+    print("\nAll circuit breaker tests passed!")
@@ -0,0 +1,190 @@
+import asyncio
+import socket
+import threading
+import time
+
+import Advanced_Network_Latency_Tester as ant
+from distributed import DONE, HELLO, PROTOCOL_VERSION, Coordinator, ProbeAgent, encode_frame
+from loopback_servers import TCPStandInServer
+
+
+def _closed_port():
+    """Return a loopback port with nothing listening on it."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _agents(coordinator, names, **kwargs):
+    agents = [ProbeAgent(coordinator.address, name, reconnect_delay=0.05, **kwargs).start() for name in names]
+    coordinator.wait_for_agents(len(names), timeout=5)
+    return agents
+
+
+def test_agents_return_mergeable_aggregates():
+    """Every agent probes every target and the coordinator merges their aggregates"""
+    with TCPStandInServer() as server, Coordinator(port=0) as coordinator:
+        agents = _agents(coordinator, ['ams', 'fra', 'fra'])
+        closed = _closed_port()
+        try:
+            results = coordinator.run_plan([('127.0.0.1', server.port), ('127.0.0.1', closed)], num_tests=20,
+                                           timeout=2)
+            again = coordinator.run_plan([('127.0.0.1', server.port)], num_tests=5, timeout=2)
+        finally:
+            for agent in agents:
+                agent.stop()
+
+    assert sorted(results['agents']) == ['ams', 'fra', 'fra#2'] and results['failed_agents'] == {}
+    reachable, refused = f"127.0.0.1:{server.port}", f"127.0.0.1:{closed}"
+    for per_target in results['agents'].values():
+        assert per_target[reachable]['successful_tests'] == 20
+        assert per_target[refused]['failed_tests'] == 20
+    assert results['targets'][reachable]['successful_tests'] == 60
+    assert 0 < results['targets'][reachable]['p99_latency_ms'] < 1000
+    assert results['targets'][refused]['packet_loss_percentage'] == 100
+    # The same connections carry later plans
+    assert again['targets'][reachable]['successful_tests'] == 15
+    assert all(agent.plans_completed == 2 for agent in agents)
+
+
+def test_sample_batches_feed_coordinator_sinks():
+    """In samples mode every probe reaches the coordinator's listeners under its agent's name"""
+    tester = ant.AdvancedLatencyTester(keep_individual_results=False)
+    seen = []
+    tester.listeners.append(lambda target, latency_ms, error_kind, error, phases: seen.append(
+        (target, error_kind, error, phases)))
+    closed = _closed_port()
+    with TCPStandInServer() as server, Coordinator(port=0, tester=tester) as coordinator:
+        agents = _agents(coordinator, ['a', 'b'])
+        try:
+            results = coordinator.run_plan([('127.0.0.1', server.port), ('127.0.0.1', closed)], num_tests=50,
+                                           timeout=2, mode='samples', batch_size=8)
+        finally:
+            for agent in agents:
+                agent.stop()
+
+    target, refused = f"127.0.0.1:{server.port}", f"127.0.0.1:{closed}"
+    assert len(seen) == 200
+    assert sorted({sample[0] for sample in seen}) == sorted(
+        f"{agent}/{name}" for agent in 'ab' for name in (target, refused))
+    reached = [sample for sample in seen if sample[0].endswith(target)]
+    assert all(error_kind == ant.ErrorKind.NONE and error is None for _, error_kind, error, _ in reached)
+    # Phase timings and error messages survive the trip to the coordinator
+    assert all(phases['connect'] > 0 for *_, phases in reached)
+    failed = [sample for sample in seen if sample[0].endswith(refused)]
+    assert all(error_kind == ant.ErrorKind.REFUSED and error for _, error_kind, error, _ in failed)
+    assert results['targets'][target]['successful_tests'] == 100
+    assert results['agents']['a'][target]['successful_tests'] == 50
+
+
+def test_slow_coordinator_pauses_agents():
+    """An agent stops probing once its batch credits are used up"""
+    release = threading.Event()
+    tester = ant.AdvancedLatencyTester(keep_individual_results=False)
+    tester.listeners.append(lambda *outcome: release.wait())  # blocks the coordinator's loop
+    with TCPStandInServer() as server, Coordinator(port=0, tester=tester, window=2) as coordinator:
+        agent, = _agents(coordinator, ['slow'])
+        plan = threading.Thread(target=lambda: results.append(coordinator.run_plan(
+            [('127.0.0.1', server.port)], num_tests=2000, timeout=2, mode='samples', batch_size=10,
+            max_in_flight=4)))
+        results = []
+        plan.start()
+        try:
+            time.sleep(0.5)
+            # At most: one batch being handled, two batches of credit, one filling, probes in flight
+            assert 0 < agent.probes_sent <= 10 + 2 * 10 + 10 + 4, agent.probes_sent
+        finally:
+            release.set()
+            plan.join()
+            agent.stop()
+
+    assert results[0]['targets'][f"127.0.0.1:{server.port}"]['successful_tests'] == 2000
+
+
+def test_disconnected_agent_fails_only_its_part():
+    """A plan survives an agent dropping out, and a restarted agent rejoins"""
+    with TCPStandInServer() as server, Coordinator(port=0) as coordinator:
+        steady, leaving = _agents(coordinator, ['steady', 'leaving'])
+        stopper = threading.Timer(0.2, leaving.stop)
+        stopper.start()
+        try:
+            results = coordinator.run_plan([('127.0.0.1', server.port)], num_tests=3000, timeout=2,
+                                           agents=['steady', 'leaving'], max_in_flight=2)
+            stopper.join()
+            assert coordinator.wait_for_agents(1, timeout=5) == ['steady']
+            returning, = _agents(coordinator, ['leaving'])
+            returning.stop()
+        finally:
+            steady.stop()
+
+    assert list(results['failed_agents']) == ['leaving']
+    assert results['agents']['steady'][f"127.0.0.1:{server.port}"]['successful_tests'] == 3000
+
+
+def test_hung_agent_and_stray_frames():
+    """A silent agent fails only at the deadline, and frames for unknown plans are ignored"""
+    with TCPStandInServer() as server, Coordinator(port=0) as coordinator:
+        steady, = _agents(coordinator, ['steady'])
+        hung = socket.create_connection(coordinator.address)
+        try:
+            hung.sendall(encode_frame(HELLO, {'name': 'hung', 'version': PROTOCOL_VERSION}))
+            coordinator.wait_for_agents(2, timeout=5)
+            hung.sendall(encode_frame(DONE, {'plan_id': 999, 'error': None}))
+            results = coordinator.run_plan([('127.0.0.1', server.port)], num_tests=5, timeout=1, deadline=1)
+            # The hung agent answers the expired plan late, then a plan that never existed
+            hung.sendall(encode_frame(DONE, {'plan_id': 1, 'error': None}))
+            hung.sendall(encode_frame(DONE, {'plan_id': 12345, 'error': 'late'}))
+            # ... and one whose caller gave up
+            cancelled = asyncio.run_coroutine_threadsafe(
+                coordinator.run_plan_async([('127.0.0.1', server.port)], agents=['hung']), coordinator._loop)
+            time.sleep(0.2)
+            cancelled.cancel()
+            time.sleep(0.1)
+            hung.sendall(encode_frame(DONE, {'plan_id': 2, 'error': None}))
+            time.sleep(0.2)
+            assert sorted(coordinator.agents) == ['hung', 'steady']
+            again = coordinator.run_plan([('127.0.0.1', server.port)], num_tests=5, timeout=1,
+                                         agents=['steady'])
+        finally:
+            hung.close()
+            steady.stop()
+
+    assert list(results['failed_agents']) == ['hung'] and 'deadline' in results['failed_agents']['hung']
+    assert results['agents']['steady'][f"127.0.0.1:{server.port}"]['successful_tests'] == 5
+    assert 1 <= results['duration_s'] < 3
+    assert again['failed_agents'] == {}
+
+
+
+class _BrokenSendAgent(ProbeAgent):
+    """An agent whose plan fails to send its results"""
+
+    async def _run_plan(self, plan, send, credits):
+        raise OSError("send failed")
+
+
+def test_agent_send_failure_fails_its_share_at_once():
+    """An agent that cannot report a plan is failed immediately, not at the default deadline"""
+    with TCPStandInServer() as server, Coordinator(port=0) as coordinator:
+        steady, = _agents(coordinator, ['steady'])
+        broken = _BrokenSendAgent(coordinator.address, 'broken', reconnect_delay=5).start()
+        coordinator.wait_for_agents(2, timeout=5)
+        try:
+            # The default deadline here is 5 * 1 + PLAN_GRACE_S seconds
+            results = coordinator.run_plan([('127.0.0.1', server.port)], num_tests=5, timeout=1)
+        finally:
+            broken.stop()
+            steady.stop()
+
+    assert list(results['failed_agents']) == ['broken'] and 'deadline' not in results['failed_agents']['broken']
+    assert results['agents']['steady'][f"127.0.0.1:{server.port}"]['successful_tests'] == 5
+    assert results['duration_s'] < 5
+
+if __name__ == "__main__":
+    test_agents_return_mergeable_aggregates()
+    test_sample_batches_feed_coordinator_sinks()
+    test_slow_coordinator_pauses_agents()
+    test_disconnected_agent_fails_only_its_part()
+    test_hung_agent_and_stray_frames()
+    test_agent_send_failure_fails_its_share_at_once()
+    print("\nAll distributed probing tests passed!")
@@ -0,0 +1,84 @@
+import socket
+
+import Advanced_Network_Latency_Tester as ant
+from loopback_servers import HTTPStandInServer, TCPStandInServer
+from resolver_cache import ResolverCache
+
+
+class DualStackResolver(ResolverCache):
+    """Resolves dual.test to both loopback addresses, ::1 first as getaddrinfo usually orders them"""
+
+    def _getaddrinfo(self, host, port, family):
+        if host == 'dual.test':
+            addresses = [(socket.AF_INET6, ('::1', port, 0, 0)), (socket.AF_INET, ('127.0.0.1', port))]
+            return [address for address in addresses if family in (socket.AF_UNSPEC, address[0])]
+        return super()._getaddrinfo(host, port, family)
+
+    async def resolve_async(self, host, port, family=socket.AF_UNSPEC):
+        return self.resolve(host, port, family)
+
+
+def _closed_port():
+    with socket.socket(socket.AF_INET6) as sock:
+        sock.bind(('::1', 0))
+        return sock.getsockname()[1]
+
+
+def test_ipv6_endpoints_are_reachable():
+    """IPv6 literals and the AF_INET6 setting probe over IPv6"""
+    with TCPStandInServer('::1') as server:
+        assert ant.AdvancedLatencyTester().perform_single_test('::1', server.port)['success']
+        tester = ant.AdvancedLatencyTester(resolver=DualStackResolver(), address_family=socket.AF_INET6)
+        stats = tester.perform_parallel_tests('dual.test', server.port, num_tests=20)
+        assert stats['successful_tests'] == 20
+        # The IPv4 default keeps measuring the IPv4 address, where nothing listens
+        v4 = ant.AdvancedLatencyTester(resolver=DualStackResolver()).perform_single_test('dual.test', server.port)
+        assert not v4['success']
+
+
+def test_both_families_measured_per_address():
+    """Every address gets its own statistics and rounds are compared per family"""
+    tester = ant.AdvancedLatencyTester(resolver=DualStackResolver(), max_in_flight=10)
+    listened = []
+    tester.listeners.append(lambda target, *outcome: listened.append(target))
+
+    with TCPStandInServer() as v4, TCPStandInServer('::1', v4.port) as v6:
+        result = tester.perform_dual_stack_tests('dual.test', v4.port, num_tests=50)
+
+    assert set(result['addresses']) == {'127.0.0.1', '::1'}
+    assert result['addresses']['::1']['family'] == 'ipv6'
+    assert all(stats['successful_tests'] == 50 for stats in result['addresses'].values())
+    assert result['families']['ipv4']['total_tests'] == result['families']['ipv6']['total_tests'] == 50
+    comparison = result['comparison']
+    assert sum(comparison['round_wins'].values()) == 50
+    assert sum(comparison['happy_eyeballs_choice'].values()) == 50
+    assert comparison['winner'] in ('ipv4', 'ipv6') and comparison['median_difference_ms'] >= 0
+    assert sorted(set(listened)) == [f"dual.test:{v4.port}@127.0.0.1", f"dual.test:{v4.port}@::1"]
+
+
+def test_slower_and_broken_families():
+    """The comparison names the faster family and Happy Eyeballs falls back when IPv6 fails"""
+    tester = ant.AdvancedLatencyTester(resolver=DualStackResolver(), max_in_flight=4)
+
+    with HTTPStandInServer() as v4, HTTPStandInServer('::1', v4.port, response_delay=0.03) as v6:
+        slow_v6 = tester.perform_dual_stack_tests('dual.test', v4.port, num_tests=10, probe='http')
+    comparison = slow_v6['comparison']
+    assert comparison['winner'] == 'ipv4' and comparison['round_wins']['ipv4'] == 10
+    assert 20 < comparison['median_difference_ms'] < 200
+    # IPv6 is slower, but well within the 250 ms head start a Happy Eyeballs client gives it
+    assert comparison['happy_eyeballs_choice'] == {'ipv4': 0, 'ipv6': 10}
+
+    port = _closed_port()
+    with TCPStandInServer(port=port):
+        broken_v6 = tester.perform_dual_stack_tests('dual.test', port, num_tests=10)
+    assert broken_v6['addresses']['::1']['packet_loss_percentage'] == 100
+    assert broken_v6['comparison']['winner'] == 'ipv4'
+    assert broken_v6['comparison']['happy_eyeballs_choice'] == {'ipv4': 10, 'ipv6': 0}
+    assert broken_v6['comparison']['median_difference_ms'] is None
+
+
+if __name__ == "__main__":
+    test_ipv6_endpoints_are_reachable()
+    test_both_families_measured_per_address()
+    test_slower_and_broken_families()
+    print("\nAll dual-stack tests passed!")
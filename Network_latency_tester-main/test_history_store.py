@@ -0,0 +1,128 @@
+import os
+import random
+import tempfile
+import time
+
+import Advanced_Network_Latency_Tester as ant
+from history_store import ROLLUP_RESOLUTIONS, HistoryStore, _cover
+from loopback_servers import TCPStandInServer
+from sample_store import ErrorKind
+
+DAY = 86400
+
+
+def test_cover_uses_coarse_buckets_inside_the_range():
+    """Ranges are covered by daily buckets in the middle and finer ones at the edges"""
+    start, end = 10 * DAY + 3600 * 5 + 125, 14 * DAY + 3600 * 2 + 30
+    segments = _cover(start, end, ROLLUP_RESOLUTIONS)
+
+    assert (DAY, 11 * DAY, 14 * DAY) in segments
+    assert segments[0] == (60, 10 * DAY + 3600 * 5 + 120, 10 * DAY + 3600 * 6)
+    assert segments[-1] == (60, 14 * DAY + 3600 * 2, 14 * DAY + 3600 * 2 + 60)
+    # Consecutive segments tile the range without gaps or overlaps
+    for (_, _, previous_end), (_, next_start, _) in zip(segments, segments[1:]):
+        assert previous_end == next_start
+
+
+def test_rollup_query_matches_raw_samples():
+    """A 30-day query from the rollups agrees with the raw samples"""
+    rng = random.Random(5)
+    now = 100 * DAY
+    store = HistoryStore(':memory:', batch_size=5000)
+    latencies = []
+    for i in range(40 * 24 * 12):  # every 5 minutes for 40 days
+        timestamp = now - 40 * DAY + i * 300
+        if i % 50 == 0:
+            store.record_probe('web:443', float('inf'), ErrorKind.TIMEOUT, timestamp_ns=timestamp * 10**9)
+            failed = True
+        else:
+            latency = rng.lognormvariate(3, 0.4)
+            store.record_probe('web:443', latency, ErrorKind.NONE, timestamp_ns=timestamp * 10**9)
+            failed = False
+        if timestamp >= now - 30 * DAY:
+            latencies.append(None if failed else latency)
+
+    store.flush()
+    started = time.perf_counter()
+    summary = store.query('web:443', now - 30 * DAY, now)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    successes = sorted(latency for latency in latencies if latency is not None)
+    assert summary['count'] == len(latencies)
+    assert summary['failures'] == len(latencies) - len(successes)
+    assert abs(summary['mean_ms'] - sum(successes) / len(successes)) < 1e-6
+    true_p99 = successes[int(0.99 * (len(successes) - 1))]
+    assert abs(summary['p99_ms'] - true_p99) / true_p99 < 0.03
+    print(f"30-day rollup query took {elapsed_ms:.1f} ms")
+
+    daily = store.series('web:443', now - 30 * DAY, now, resolution=DAY)
+    assert len(daily) == 30 and all(bucket['count'] == 288 for bucket in daily)
+    assert store.query('other:80', now - DAY, now)['count'] == 0
+    store.close()
+
+
+def test_batches_persist_and_prune():
+    """Buffered results are written in batches, survive a reopen and are pruned by age"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'history.db')
+        now = time.time()
+        with HistoryStore(path, batch_size=100, retention={'raw': 3600, 60: 7200}) as store:
+            for i in range(150):
+                store.record_probe('a:80', 1.0 + i, ErrorKind.NONE, timestamp_ns=int((now - 3 * 3600 + i) * 1e9))
+            assert store._connection.execute('SELECT COUNT(*) FROM samples').fetchone()[0] == 100
+            store.record_probe('a:80', 5.0, ErrorKind.NONE)
+
+        with HistoryStore(path, retention={'raw': 3600, 60: 7200}) as store:
+            assert store.query('a:80', now - 4 * 3600)['count'] == 151
+            store.prune()
+            assert len(list(store.samples('a:80', now - 4 * 3600))) == 1
+            assert store.series('a:80', now - 4 * 3600, resolution=60)[-1]['count'] == 1
+            # Coarser rollups still answer for the pruned period
+            assert store.query('a:80', now - 4 * 3600)['count'] == 151
+
+
+def test_cli_history_is_opt_in_and_pruned():
+    """The command line only writes a history file when asked, and prunes it by age"""
+    with tempfile.TemporaryDirectory() as directory, TCPStandInServer() as server:
+        path = os.path.join(directory, 'history.db')
+        with HistoryStore(path) as store:
+            store.record_probe('old:80', 1.0, ErrorKind.NONE, timestamp_ns=int((time.time() - 30 * DAY) * 1e9))
+        sweep = ['--sweep', '127.0.0.1', '--ports', str(server.port)]
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            ant.main(sweep)
+            assert os.listdir(directory) == ['history.db']
+            ant.main(sweep + ['--history-db', path])
+        finally:
+            os.chdir(cwd)
+        with HistoryStore(path) as store:
+            assert list(store.samples('old:80', 0)) == []
+
+
+def test_tester_persists_probes_and_runs():
+    """An attached store receives every probe and the run summaries"""
+    store = HistoryStore(':memory:')
+    tester = ant.AdvancedLatencyTester(history_store=store)
+
+    with TCPStandInServer() as server:
+        target = f"127.0.0.1:{server.port}"
+        stats = tester.perform_parallel_tests(*server.address, num_tests=30)
+        tester.record_comprehensive_result('run_1', stats, target)
+
+    assert store.query(target, time.time() - 60)['count'] == 30
+    runs = store.recent_runs()
+    assert runs[0]['test_id'] == 'run_1' and runs[0]['target'] == target
+    assert runs[0]['statistics']['successful_tests'] == 30
+    assert 'individual_results' not in runs[0]['statistics']
+    tester.display_test_history()
+    store.close()
+
+
+if __name__ == "__main__":
+    test_cover_uses_coarse_buckets_inside_the_range()
+    test_rollup_query_matches_raw_samples()
+    test_batches_persist_and_prune()
+    test_cli_history_is_opt_in_and_pruned()
+    test_tester_persists_probes_and_runs()
+    print("\nAll history store tests passed!")
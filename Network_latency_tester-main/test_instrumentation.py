@@ -0,0 +1,88 @@
+import time
+import urllib.request
+
+import Advanced_Network_Latency_Tester as ant
+from instrumentation import LatencyTesterMetrics, MetricsRegistry, MetricsServer
+from loopback_servers import TCPStandInServer
+
+
+def test_prometheus_text_format():
+    """Counters, gauges and histograms render in the Prometheus text format"""
+    registry = MetricsRegistry()
+    requests = registry.counter('requests_total', 'Requests', ('path',))
+    in_flight = registry.gauge('in_flight', 'In flight')
+    duration = registry.histogram('duration_seconds', 'Duration', buckets=(0.1, 1.0))
+
+    requests.inc('/a "quoted"')
+    requests.inc('/a "quoted"', amount=2)
+    in_flight.set(3)
+    in_flight.dec()
+    for value in (0.05, 0.5, 5):
+        duration.observe(value)
+
+    text = registry.render()
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{path="/a \\"quoted\\""} 3' in text
+    assert 'in_flight 2' in text
+    assert 'duration_seconds_bucket{le="0.1"} 1' in text
+    assert 'duration_seconds_bucket{le="1.0"} 2' in text
+    assert 'duration_seconds_bucket{le="+Inf"} 3' in text
+    assert 'duration_seconds_count 3' in text
+
+
+def test_tester_hot_paths_are_instrumented():
+    """Probes, engines and statistics update the tester metrics"""
+    metrics = LatencyTesterMetrics()
+    tester = ant.AdvancedLatencyTester(max_workers=2, metrics=metrics)
+
+    with TCPStandInServer() as server:
+        tester.perform_single_test(*server.address)
+        tester.perform_parallel_tests(*server.address, num_tests=20, engine='async')
+        tester.perform_parallel_tests(*server.address, num_tests=20, engine='thread')
+        closed_port = server.port
+    tester.perform_parallel_tests('127.0.0.1', closed_port, num_tests=5)
+
+    assert metrics.probes.value('tcp', 'success') == 41
+    assert metrics.probes.value('tcp', 'refused') == 5
+    assert metrics.probes_in_flight.value() == 0
+    assert metrics.executor_queue_depth.value() == 0
+    assert metrics.probe_seconds.count('tcp') == 46
+    assert metrics.call_seconds.count('perform_parallel_tests') == 3
+    assert metrics.call_seconds.count('calculate_statistics') == 3
+    assert metrics.call_seconds.count('perform_single_test') == 1
+
+
+def test_metrics_endpoint_and_profilers():
+    """The HTTP endpoint serves metrics and switches profilers on and off"""
+    metrics = LatencyTesterMetrics()
+    tester = ant.AdvancedLatencyTester(metrics=metrics)
+
+    def post(path):
+        request = urllib.request.Request(f"http://127.0.0.1:{endpoint.port}{path}", method='POST')
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.read().decode()
+
+    with MetricsServer(metrics, port=0) as endpoint, TCPStandInServer() as server:
+        post('/profile/cprofile/start')
+        post('/profile/sampling/start?interval=0.001')
+        deadline = time.perf_counter() + 0.3
+        while time.perf_counter() < deadline:
+            tester.perform_parallel_tests(*server.address, num_tests=50)
+        stacks = post('/profile/sampling/stop')
+        report = post('/profile/cprofile/stop')
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{endpoint.port}/metrics", timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            text = response.read().decode()
+
+    assert 'latency_tester_probes_total{probe="tcp",outcome="success"}' in text
+    assert 'latency_tester_call_duration_seconds_count{call="perform_parallel_tests"}' in text
+    assert '_run_probe_async' in report
+    assert 'perform_parallel_tests' in stacks
+
+
+if __name__ == "__main__":
+    test_prometheus_text_format()
+    test_tester_hot_paths_are_instrumented()
+    test_metrics_endpoint_and_profilers()
+    print("\nAll instrumentation tests passed!")
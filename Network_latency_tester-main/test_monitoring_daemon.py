@@ -0,0 +1,86 @@
+import asyncio
+import json
+import os
+
+import Advanced_Network_Latency_Tester as ant
+from loopback_servers import TCPStandInServer
+from monitoring_daemon import MonitoringDaemon, MonitorTarget, RollingWindow, load_targets
+
+
+def test_rolling_window_expires_old_buckets():
+    """Samples older than the window span stop counting"""
+    window = RollingWindow(span=60, bucket_width=5)
+    window.add(10.0, True, now=1000)
+    window.add(20.0, True, now=1030)
+    window.add(None, False, now=1055)
+
+    stats = window.merged(now=1058).to_statistics()
+    assert stats['total_tests'] == 3 and stats['successful_tests'] == 2
+
+    stats = window.merged(now=1085).to_statistics()
+    assert stats['total_tests'] == 2 and stats['average_latency_ms'] == 20.0
+
+    # Memory is bounded by the bucket count however many samples arrive
+    for i in range(10000):
+        window.add(1.0, True, now=2000 + i)
+    assert len(window._buckets) == 12
+
+
+def test_daemon_probes_each_target_on_its_interval():
+    """Each target is probed on its own schedule and gets windowed statistics"""
+    tester = ant.AdvancedLatencyTester()
+
+    with TCPStandInServer() as fast, TCPStandInServer() as slow:
+        targets = [
+            MonitorTarget('127.0.0.1', fast.port, interval=0.05, timeout=1, name='fast'),
+            MonitorTarget('127.0.0.1', slow.port, interval=0.25, timeout=1, name='slow'),
+        ]
+        daemon = MonitoringDaemon(tester, targets, report_interval=None)
+        seen = []
+        daemon.listeners.append(lambda target, *outcome: seen.append(target.name))
+        asyncio.run(daemon.run(duration=1.0))
+
+    snapshot = daemon.snapshot()
+    fast_count = snapshot['fast']['1m']['total_tests']
+    slow_count = snapshot['slow']['1m']['total_tests']
+    assert 15 <= fast_count <= 21
+    assert 3 <= slow_count <= 5
+    assert snapshot['fast']['1h']['successful_tests'] == fast_count
+    assert seen.count('fast') == fast_count
+    # The daemon keeps nothing in the tester's unbounded result stores
+    assert not tester.results and not tester.test_history
+
+
+def test_first_probes_are_staggered():
+    """Targets with the same interval do not all fire at once"""
+    tester = ant.AdvancedLatencyTester()
+    targets = [MonitorTarget('127.0.0.1', 1000 + i, interval=10) for i in range(100)]
+    schedule = MonitoringDaemon(tester, targets)._initial_schedule(0)
+    offsets = sorted(due for due, _, _ in schedule)
+    assert offsets[-1] - offsets[0] > 8
+    assert len({round(offset, 1) for offset in offsets}) > 50
+
+
+def test_load_targets_applies_defaults():
+    """Targets files merge per-target settings over the defaults"""
+    config = {
+        'defaults': {'interval': 5, 'timeout': 2},
+        'targets': [{'host': 'example.com', 'port': 443, 'probe': 'https'},
+                    {'name': 'ssh', 'host': '10.0.0.5', 'port': 22, 'interval': 30}],
+    }
+    with open("test_targets.json", "w") as f:
+        json.dump(config, f)
+    try:
+        web, ssh = load_targets("test_targets.json")
+    finally:
+        os.remove("test_targets.json")
+    assert (web.name, web.interval, web.timeout, web.probe) == ('example.com:443', 5, 2, 'https')
+    assert (ssh.name, ssh.interval) == ('ssh', 30)
+
+
+if __name__ == "__main__":
+    test_rolling_window_expires_old_buckets()
+    test_daemon_probes_each_target_on_its_interval()
+    test_first_probes_are_staggered()
+    test_load_targets_applies_defaults()
+    print("\nAll monitoring daemon tests passed!")
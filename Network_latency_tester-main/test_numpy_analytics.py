@@ -0,0 +1,134 @@
+import math
+import os
+import random
+import tempfile
+import time
+
+import Advanced_Network_Latency_Tester as ant
+from result_log import ResultLogWriter
+from sample_store import SampleStore
+
+import pytest
+
+# numpy_analytics is optional; these tests are skipped where NumPy is not installed
+numpy = pytest.importorskip('numpy')
+from numpy_analytics import SampleColumns, grouped_statistics, time_buckets  # noqa: E402
+
+
+def _store(count, seed, loss=0.05, start_ns=0, step_ns=1000000):
+    """A SampleStore of lognormal latencies with random timeouts, one sample per step."""
+    rng = random.Random(seed)
+    store = SampleStore()
+    for index in range(count):
+        timestamp_ns = store._anchor_monotonic_ns + start_ns + index * step_ns
+        if rng.random() < loss:
+            store.append(float('inf'), ant.ErrorKind.TIMEOUT, None, timestamp_ns)
+        else:
+            store.append(rng.lognormvariate(3, 0.5), ant.ErrorKind.NONE, None, timestamp_ns)
+    return store
+
+
+def _assert_matches(expected, actual):
+    for key, value in expected.items():
+        if key.startswith('p') and key.endswith('_latency_ms') or key == 'median_latency_ms':
+            # calculate_statistics estimates percentiles within 1%
+            assert math.isclose(actual[key], value, rel_tol=0.011), (key, value, actual[key])
+        elif key not in ('test_timestamp', 'individual_results'):
+            assert math.isclose(actual[key], value, rel_tol=1e-9), (key, value, actual[key])
+
+
+def test_export_matches_calculate_statistics():
+    """Grouped statistics of an export agree with calculate_statistics for every test"""
+    tester = ant.AdvancedLatencyTester()
+    tester.results = {'steady': tester.calculate_statistics(_store(500, 1)),
+                      'lossy': tester.calculate_statistics(_store(300, 2, loss=0.4)),
+                      'dead': tester.calculate_statistics(_store(20, 3, loss=1.0))}
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'export.json')
+        tester.export_results_json(filename)
+        grouped = grouped_statistics(SampleColumns.from_export(filename))
+
+    assert list(grouped) == ['steady', 'lossy', 'dead']
+    for test_id, expected in tester.results.items():
+        _assert_matches(expected, grouped[test_id])
+    assert grouped['dead']['successful_tests'] == 0 and grouped['dead']['average_latency_ms'] == float('inf')
+
+
+def test_jitter_uses_time_order():
+    """Rows are analysed in timestamp order whatever order they were stored in"""
+    columns = SampleColumns.from_sample_store(_store(1000, 4))
+    expected = grouped_statistics(columns)['samples']
+    shuffled = numpy.random.default_rng(5).permutation(len(columns))
+    columns = SampleColumns(columns.groups, columns.group_codes[shuffled], columns.timestamps_ns[shuffled],
+                            columns.latencies_ms[shuffled], columns.success[shuffled])
+    assert grouped_statistics(columns)['samples'] == expected
+    _assert_matches(ant.AdvancedLatencyTester().calculate_statistics(_store(1000, 4)), expected)
+
+
+def test_binary_log_and_time_buckets():
+    """Binary logs load through memory maps, across rotation and id reuse, and bucket by time"""
+    long_name = 'a-very-long-hostname-' * 5 + ':8443'
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'probes.bin')
+        with ResultLogWriter(filename, 'binary', max_bytes=4096) as writer:
+            for second in range(180):
+                writer.record_probe('a:80', 10.0 + second % 2, ant.ErrorKind.NONE, timestamp_ns=second * 10**9)
+                if second % 3:
+                    writer.record_probe('b:443', None, ant.ErrorKind.REFUSED, timestamp_ns=second * 10**9)
+        with ResultLogWriter(filename, 'binary') as writer:
+            # A new writer numbers its targets from zero again
+            writer.record_probe('c:22', 5.0, ant.ErrorKind.NONE, timestamp_ns=200 * 10**9)
+            writer.record_probe(long_name, 7.0, ant.ErrorKind.NONE, timestamp_ns=200 * 10**9)
+        columns = SampleColumns.from_result_log(filename)
+
+    grouped = grouped_statistics(columns)
+    assert sorted(grouped) == sorted(['a:80', 'b:443', 'c:22', long_name])
+    assert grouped[long_name]['average_latency_ms'] == 7.0
+    assert grouped['a:80']['total_tests'] == 180 and grouped['a:80']['jitter_ms'] == 1.0
+    assert grouped['a:80']['min_latency_ms'] == 10.0 and grouped['a:80']['max_latency_ms'] == 11.0
+    assert grouped['b:443']['failed_tests'] == 120 and grouped['b:443']['packet_loss_percentage'] == 100
+    assert grouped['c:22']['total_tests'] == 1
+
+    buckets = time_buckets(columns, width_s=60)
+    assert [bucket['bucket_start'] for bucket in buckets['a:80']] == [0, 60, 120]
+    assert [bucket['count'] for bucket in buckets['b:443']] == [40, 40, 40]
+    assert buckets['b:443'][0]['loss_percentage'] == 100 and buckets['b:443'][0]['mean_ms'] is None
+    assert buckets['a:80'][1]['mean_ms'] == 10.5 and buckets['c:22'] == [
+        {'bucket_start': 180, 'count': 1, 'failures': 0, 'loss_percentage': 0.0, 'mean_ms': 5.0,
+         'p50_ms': 5.0, 'p99_ms': 5.0, 'jitter_ms': 0.0}]
+
+
+def test_vectorized_analysis_is_faster():
+    """Large inputs are analysed far faster than by calculate_statistics"""
+    store = _store(200000, 6)
+    results = store.to_list()
+    tester = ant.AdvancedLatencyTester()
+    start = time.perf_counter()
+    expected = tester.calculate_statistics(results)
+    python_time = time.perf_counter() - start
+
+    columns = SampleColumns.from_sample_store(store)
+    numpy_time = float('inf')
+    for _ in range(3):  # best of three, so a stray scheduler pause does not decide the ratio
+        start = time.perf_counter()
+        actual = grouped_statistics(columns)['samples']
+        numpy_time = min(numpy_time, time.perf_counter() - start)
+
+    _assert_matches(expected, actual)
+    assert numpy_time * 50 < python_time, (python_time, numpy_time)
+    print(f"NumPy analysis {python_time / numpy_time:.0f}x faster than calculate_statistics")
+
+    # Loading an export costs about as much as json.load: the column pass is a small part of it
+    export = {'test_results': {'run': {'individual_results': results}}}
+    start = time.perf_counter()
+    loaded = SampleColumns.from_export(export)
+    load_time = time.perf_counter() - start
+    assert len(loaded) == len(store) and load_time * 3 < python_time, (python_time, load_time)
+
+
+if __name__ == "__main__":
+    test_export_matches_calculate_statistics()
+    test_jitter_uses_time_order()
+    test_binary_log_and_time_buckets()
+    test_vectorized_analysis_is_faster()
+    print("\nAll NumPy analytics tests passed!")
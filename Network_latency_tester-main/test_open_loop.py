@@ -0,0 +1,73 @@
+import Advanced_Network_Latency_Tester as ant
+from loopback_servers import HTTPStandInServer, TCPStandInServer
+
+
+def test_open_loop_hits_requested_rate():
+    """Probes are issued at the requested rate against a fast target"""
+    tester = ant.AdvancedLatencyTester()
+
+    with TCPStandInServer() as server:
+        stats = tester.perform_rate_controlled_tests(*server.address, rate=400, duration=1.0)
+
+    load = stats['load']
+    assert load['probes_scheduled'] == 400
+    assert stats['successful_tests'] == 400
+    assert abs(load['achieved_rate'] - 400) / 400 < 0.15
+    print(f"Open loop: requested {load['requested_rate']}/s, achieved {load['achieved_rate']:.1f}/s")
+
+
+def test_coordinated_omission_correction():
+    """A slow target shows up as queueing latency instead of fewer probes"""
+    tester = ant.AdvancedLatencyTester()
+
+    # Each request takes ~20 ms but one probe at a time is allowed, so 100/s cannot be met
+    with HTTPStandInServer(response_delay=0.02) as server:
+        stats = tester.perform_rate_controlled_tests(*server.address, rate=100, duration=0.3,
+                                                     probe='http', max_in_flight=1)
+
+    load = stats['load']
+    service = stats['phase_statistics']['service']
+    assert stats['total_tests'] == 30
+    assert load['achieved_rate'] < 0.7 * load['requested_rate']
+    # Corrected latencies include the time each probe waited past its intended start
+    assert stats['max_latency_ms'] > 5 * service['max_ms']
+    assert stats['phase_statistics']['schedule_lag']['max_ms'] > 100
+
+    assert load['probes_dropped'] == 0
+
+
+def test_outstanding_probes_are_capped():
+    """Probes beyond the outstanding limit are counted as dropped instead of queueing without bound"""
+    tester = ant.AdvancedLatencyTester()
+
+    # ~50 ms per request, one at a time: at 200/s the backlog would grow to most of the run
+    with HTTPStandInServer(response_delay=0.05) as server:
+        stats = tester.perform_rate_controlled_tests(*server.address, rate=200, duration=0.5,
+                                                     probe='http', max_in_flight=1, max_outstanding=4)
+
+    load = stats['load']
+    kinds = [sample.error_kind for sample in stats['individual_results']]
+    assert stats['total_tests'] == load['probes_scheduled'] == 100
+    assert load['probes_dropped'] == kinds.count(ant.ErrorKind.DROPPED) > 50
+    assert stats['failed_tests'] == load['probes_dropped']
+    # Probes that were issued waited for at most three others, not for the whole backlog
+    assert stats['phase_statistics']['schedule_lag']['max_ms'] < 1000
+
+
+def test_open_loop_rejects_bad_parameters():
+    """Rate and duration must be positive"""
+    tester = ant.AdvancedLatencyTester()
+    try:
+        tester.perform_rate_controlled_tests('127.0.0.1', 80, rate=0, duration=1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+if __name__ == "__main__":
+    test_open_loop_hits_requested_rate()
+    test_coordinated_omission_correction()
+    test_outstanding_probes_are_capped()
+    test_open_loop_rejects_bad_parameters()
+    print("\nAll open-loop tests passed!")
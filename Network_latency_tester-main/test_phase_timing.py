@@ -0,0 +1,86 @@
+import asyncio
+
+import Advanced_Network_Latency_Tester as ant
+from loopback_servers import HTTPStandInServer, TLSStandInServer, loopback_client_context
+from sample_store import ErrorKind
+
+
+def test_tls_probe_times_connect_and_handshake():
+    """TLS probes report connect and handshake phases separately"""
+    tester = ant.AdvancedLatencyTester(ssl_context=loopback_client_context())
+
+    with TLSStandInServer() as server:
+        result = tester.perform_single_test('localhost', server.port, probe='tls')
+        stats = tester.perform_parallel_tests('localhost', server.port, num_tests=20, probe='tls')
+
+    assert result['success'], result['error']
+    assert result['tls_ms'] > 0 and result['connect_ms'] > 0
+    assert abs(result['latency_ms'] - (result['connect_ms'] + result['tls_ms'])) < 0.01
+    assert stats['successful_tests'] == 20
+    assert stats['phase_statistics']['tls']['count'] == 20
+
+
+def test_http_and_https_probes_time_first_byte():
+    """HTTP probes add a time-to-first-byte phase on both engines"""
+    tester = ant.AdvancedLatencyTester(ssl_context_factory=loopback_client_context, max_workers=4)
+
+    with HTTPStandInServer() as plain, HTTPStandInServer(tls=True) as secure:
+        http = tester.perform_single_test('127.0.0.1', plain.port, probe='http')
+        for engine in ant.ENGINES:
+            stats = tester.perform_parallel_tests('localhost', secure.port, num_tests=10,
+                                                  engine=engine, probe='https')
+            phases = stats['phase_statistics']
+            assert stats['successful_tests'] == 10
+            assert {'dns', 'connect', 'tls', 'ttfb'} <= set(phases)
+            assert phases['ttfb']['count'] == 10
+        assert plain.requests_served == 1 and secure.requests_served == 10 * len(ant.ENGINES)
+
+    assert http['success'] and http['ttfb_ms'] > 0 and 'tls_ms' not in http
+
+
+def test_tls_session_resumption():
+    """Reused sessions are resumed on later handshakes"""
+    for use_async in (False, True):
+        tester = ant.AdvancedLatencyTester(ssl_context=loopback_client_context(), tls_session_reuse=True)
+        with HTTPStandInServer(tls=True) as server:
+            if use_async:
+                async def probe_twice():
+                    return [await tester.perform_single_test_async('localhost', server.port, probe='https')
+                            for _ in range(2)]
+                first, second = asyncio.run(probe_twice())
+            else:
+                first = tester.perform_single_test('localhost', server.port, probe='https')
+                second = tester.perform_single_test('localhost', server.port, probe='https')
+        assert first['tls_resumed'] is False
+        assert second['tls_resumed'] is True
+
+
+def test_untrusted_certificate_is_a_tls_error():
+    """The default context rejects the self-signed certificate"""
+    tester = ant.AdvancedLatencyTester()
+
+    with TLSStandInServer() as server:
+        stats = tester.perform_parallel_tests('localhost', server.port, num_tests=2, probe='tls')
+
+    assert stats['failed_tests'] == 2
+    assert all(r.error_kind == ErrorKind.TLS for r in stats['individual_results'])
+
+
+def test_unknown_probe_type_rejected():
+    """Unknown probe types raise ValueError"""
+    tester = ant.AdvancedLatencyTester()
+    try:
+        tester.perform_single_test('127.0.0.1', 80, probe='icmp')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+if __name__ == "__main__":
+    test_tls_probe_times_connect_and_handshake()
+    test_http_and_https_probes_time_first_byte()
+    test_tls_session_resumption()
+    test_untrusted_certificate_is_a_tls_error()
+    test_unknown_probe_type_rejected()
+    print("\nAll phase timing tests passed!")
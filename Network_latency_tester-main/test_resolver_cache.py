@@ -0,0 +1,121 @@
+import asyncio
+import socket
+import threading
+import time
+
+import Advanced_Network_Latency_Tester as ant
+from loopback_servers import TCPStandInServer
+from resolver_cache import ResolverCache
+
+
+class CountingResolverCache(ResolverCache):
+    """ResolverCache that counts (and slows down) real lookups"""
+
+    def __init__(self, *args, delay=0.05, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lookups = 0
+        self.delay = delay
+
+    def _getaddrinfo(self, host, port, family):
+        self.lookups += 1
+        time.sleep(self.delay)
+        return super()._getaddrinfo(host, port, family)
+
+
+def test_concurrent_lookups_are_coalesced():
+    """Many threads resolving the same name trigger a single lookup"""
+    cache = CountingResolverCache()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.resolve('localhost', 80)))
+               for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.lookups == 1
+    assert len(results) == 20 and all(r == results[0] for r in results)
+
+
+def test_async_lookups_are_coalesced_and_cached():
+    """Coroutines share one in-flight lookup and later calls hit the cache"""
+    cache = ResolverCache()
+
+    async def resolve_many():
+        return await asyncio.gather(*(cache.resolve_async('localhost', 80, socket.AF_INET)
+                                      for _ in range(50)))
+
+    results = asyncio.run(resolve_many())
+    assert results[0] and all(r == results[0] for r in results)
+    assert all(family == socket.AF_INET for family, _ in results[0])
+    assert cache.resolve('localhost', 80, socket.AF_INET) == results[0]
+    assert cache.hits >= 1
+
+
+def test_address_literals_bypass_the_cache():
+    """IP addresses are converted without a lookup and leave no cache entry"""
+    cache = CountingResolverCache(delay=0)
+    assert cache.resolve('127.0.0.1', 80, socket.AF_INET) == [(socket.AF_INET, ('127.0.0.1', 80))]
+    assert asyncio.run(cache.resolve_async('::1', 443))[0][1][:2] == ('::1', 443)
+    assert cache.lookups == 0 and not cache._entries
+    try:
+        cache.resolve('::1', 80, socket.AF_INET)
+    except OSError:
+        pass
+    else:
+        raise AssertionError("an IPv6 literal should not resolve for AF_INET")
+
+
+def test_ttl_expiry_and_negative_caching():
+    """Entries expire after their TTL and failures are cached briefly"""
+    cache = CountingResolverCache(ttl=0.1, negative_ttl=0.1, delay=0)
+    cache.resolve('localhost', 80)
+    cache.resolve('localhost', 80)
+    assert cache.lookups == 1
+    time.sleep(0.15)
+    cache.resolve('localhost', 80)
+    assert cache.lookups == 2
+
+    for _ in range(2):
+        try:
+            cache.resolve('invalid-host-that-does-not-exist.invalid', 80)
+        except OSError:
+            pass
+        else:
+            raise AssertionError("resolution should fail")
+    assert cache.lookups == 3
+
+
+def test_prefetch_warms_the_cache():
+    """prefetch resolves in the background so the next probe is a hit"""
+    cache = CountingResolverCache(delay=0)
+    cache.prefetch('localhost', 80).result(timeout=5)
+    cache.resolve('localhost', 80)
+    assert cache.lookups == 1 and cache.hits == 1
+
+
+def test_dns_reported_separately_from_connect():
+    """Probes report resolution and connect time as separate phases"""
+    resolver = CountingResolverCache(delay=0.02)
+    tester = ant.AdvancedLatencyTester(resolver=resolver)
+
+    with TCPStandInServer() as server:
+        single = tester.perform_single_test('localhost', server.port)
+        stats = tester.perform_parallel_tests('localhost', server.port, num_tests=50)
+
+    assert single['dns_ms'] >= 20 and single['connect_ms'] == single['latency_ms']
+    assert single['latency_ms'] < single['dns_ms']
+    assert resolver.lookups == 1
+    phases = stats['phase_statistics']
+    assert phases['dns']['count'] == 50 and phases['connect']['count'] == 50
+    assert stats['individual_results'][0]['dns_ms'] is not None
+
+
+if __name__ == "__main__":
+    test_concurrent_lookups_are_coalesced()
+    test_async_lookups_are_coalesced_and_cached()
+    test_address_literals_bypass_the_cache()
+    test_ttl_expiry_and_negative_caching()
+    test_prefetch_warms_the_cache()
+    test_dns_reported_separately_from_connect()
+    print("\nAll resolver cache tests passed!")
@@ -0,0 +1,130 @@
+import json
+import os
+import tempfile
+import time
+
+import Advanced_Network_Latency_Tester as ant
+from loopback_servers import TCPStandInServer
+from result_log import RECORD, BinaryLogReader, ResultLogWriter, iter_ndjson, log_files
+from sample_store import ErrorKind
+
+
+def test_probes_stream_to_ndjson_log():
+    """Every probe is appended to the NDJSON log as it completes"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'results.ndjson')
+        with ResultLogWriter(path) as log:
+            tester = ant.AdvancedLatencyTester(result_log=log)
+            with TCPStandInServer() as server:
+                tester.perform_parallel_tests(*server.address, num_tests=25)
+                log.flush()
+                records = list(iter_ndjson(path))
+
+        assert len(records) == 25
+        assert all(r['success'] and r['target'] == f"127.0.0.1:{server.port}" for r in records)
+        assert all(r['connect_ms'] <= r['latency_ms'] and 'dns_ms' in r for r in records)
+
+
+def test_binary_log_scan_and_filter():
+    """The mmap reader filters by target, time and failures"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'results.bin')
+        base_ns = time.time_ns()
+        with ResultLogWriter(path, 'binary') as log:
+            for i in range(1000):
+                target = 'a:80' if i % 2 else 'b:443'
+                kind = ErrorKind.TIMEOUT if i % 10 == 0 else ErrorKind.NONE
+                latency = float('inf') if kind else float(i)
+                log.record_probe(target, latency, kind, phases={'dns': 0.1, 'connect': latency},
+                                 timestamp_ns=base_ns + i)
+
+        with BinaryLogReader(path) as reader:
+            assert len(reader) == 1002  # two target definitions
+            only_a = list(reader.scan(target='a:80'))
+            assert len(only_a) == 500 and all(r.target == 'a:80' for r in only_a)
+            window = list(reader.scan(since_ns=base_ns + 100, until_ns=base_ns + 200))
+            assert len(window) == 100
+            failures = list(reader.scan(failures_only=True))
+            assert len(failures) == 100 and all(r.error_kind == ErrorKind.TIMEOUT for r in failures)
+            first = next(reader.scan(target='a:80')).to_dict()
+            assert first['latency_ms'] == 1.0 and first['dns_ms'] == 0.1 and 'tls_ms' not in first
+
+
+def test_long_target_names_survive():
+    """Names longer than one record continue in extra records instead of being truncated"""
+    prefix = 'probe-target-' + 'x' * 60
+    first, second = f"{prefix}.example.com:443", f"{prefix}.example.org:443"
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'results.bin')
+        with ResultLogWriter(path, 'binary') as log:
+            for latency in (1.0, 2.0):
+                log.record_probe(first, latency, ErrorKind.NONE)
+                log.record_probe(second, latency + 10, ErrorKind.NONE)
+                log.record_probe('short:80', latency + 20, ErrorKind.NONE)
+
+        with BinaryLogReader(path) as reader:
+            assert [r.latency_ms for r in reader.scan(target=first)] == [1.0, 2.0]
+            assert [r.latency_ms for r in reader.scan(target=second)] == [11.0, 12.0]
+            assert [r.target for r in reader.scan()][:3] == [first, second, 'short:80']
+
+
+def test_rotation_keeps_bounded_files():
+    """The log rotates by size and keeps only backup_count old files"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'results.bin')
+        with ResultLogWriter(path, 'binary', max_bytes=RECORD.size * 100, backup_count=2) as log:
+            for i in range(1000):
+                log.record_probe('a:80', 1.0, ErrorKind.NONE)
+
+        files = log_files(path)
+        assert files == [path + '.2', path + '.1', path]
+        # Each rotated file declares its targets again, so it can be read alone
+        with BinaryLogReader(files[0]) as reader:
+            assert all(r.target == 'a:80' for r in reader.scan())
+
+
+def test_torn_records_are_recovered():
+    """A record torn by a crash is dropped and appending stays aligned"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'results.bin')
+        with ResultLogWriter(path, 'binary') as log:
+            log.record_probe('a:80', 1.0, ErrorKind.NONE)
+        with open(path, 'ab') as f:
+            f.write(b'\x01' * 10)
+        with ResultLogWriter(path, 'binary') as log:
+            log.record_probe('a:80', 2.0, ErrorKind.NONE)
+        with BinaryLogReader(path) as reader:
+            assert [r.latency_ms for r in reader.scan(target='a:80')] == [1.0, 2.0]
+
+        ndjson_path = os.path.join(directory, 'results.ndjson')
+        with open(ndjson_path, 'w') as f:
+            f.write('{"target": "a:80", "succ')
+        with ResultLogWriter(ndjson_path) as log:
+            log.record_probe('a:80', 3.0, ErrorKind.NONE)
+        assert [r['latency_ms'] for r in iter_ndjson(ndjson_path)] == [3.0]
+
+
+def test_export_omits_samples_when_logging():
+    """Whole-state exports skip per-probe results that the log already holds"""
+    with tempfile.TemporaryDirectory() as directory:
+        with ResultLogWriter(os.path.join(directory, 'results.ndjson')) as log:
+            tester = ant.AdvancedLatencyTester(result_log=log)
+            with TCPStandInServer() as server:
+                tester.record_comprehensive_result('run', tester.perform_parallel_tests(*server.address, 5))
+            export_path = os.path.join(directory, 'export.json')
+            tester.export_results_json(export_path)
+        with open(export_path) as f:
+            exported = json.load(f)
+        assert 'individual_results' not in exported['test_results']['run']
+        assert exported['test_history'][0]['test_id'] == 'run'
+        assert 'statistics' not in exported['test_history'][0]
+
+
+if __name__ == "__main__":
+    test_probes_stream_to_ndjson_log()
+    test_binary_log_scan_and_filter()
+    test_long_target_names_survive()
+    test_rotation_keeps_bounded_files()
+    test_torn_records_are_recovered()
+    test_export_omits_samples_when_logging()
+    print("\nAll result log tests passed!")
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+
+import Advanced_Network_Latency_Tester as ant
+from loopback_servers import TCPStandInServer
+from sample_store import MAX_ERROR_MESSAGES, ErrorKind, SampleStore, classify_error
+
+
+def test_sample_views_read_like_result_dicts():
+    """Sample views expose the same keys and values as result dicts"""
+    store = SampleStore()
+    store.append(12.5)
+    store.append(float('inf'), ErrorKind.TIMEOUT, 'Connection timeout')
+    store.append(None, ErrorKind.OTHER, 'Something odd')
+
+    ok, timed_out, other = store
+    assert ok['success'] and ok['latency_ms'] == ok['rtt_ms'] == 12.5 and ok['error'] is None
+    assert not timed_out['success'] and timed_out['latency_ms'] == float('inf')
+    assert timed_out['error'] == 'Connection timeout'
+    assert other['latency_ms'] is None and other['error'] == 'Something odd'
+    assert set(ok.to_dict()) == {'success', 'latency_ms', 'rtt_ms', 'timestamp', 'error'}
+    assert store[-1].error_kind == ErrorKind.OTHER
+    assert not hasattr(ok, '__dict__')
+
+
+def test_append_result_round_trip():
+    """Result dicts stored in the columns come back with their wall-clock time"""
+    tester = ant.AdvancedLatencyTester()
+    result = tester._result_dict(42.0, ErrorKind.NONE, None)
+
+    store = SampleStore()
+    store.append_result(result)
+    assert store[0]['latency_ms'] == 42.0
+    assert store[0]['timestamp'][:19] == result['timestamp'][:19]
+
+
+def test_error_classification():
+    """Exceptions map to compact error codes"""
+    assert classify_error(socket.timeout()) == ErrorKind.TIMEOUT
+    assert classify_error(asyncio.TimeoutError()) == ErrorKind.TIMEOUT
+    assert classify_error(ConnectionRefusedError()) == ErrorKind.REFUSED
+    assert classify_error(socket.gaierror()) == ErrorKind.RESOLUTION
+    assert classify_error(ValueError('bad')) == ErrorKind.OTHER
+
+
+def test_original_error_text_is_kept_once():
+    """Failures keep their own error text, each distinct text stored once and only up to the cap"""
+    store = SampleStore()
+    for _ in range(3):
+        # A fresh string object per probe, as str(exception) produces
+        store.append(None, ErrorKind.REFUSED, ' '.join(['[Errno 111]', 'Connection refused']))
+    store.append(None, ErrorKind.REFUSED, 'Connection refused')
+    store.append(float('inf'), ErrorKind.TIMEOUT, '')
+    assert [sample['error'] for sample in store] == ['[Errno 111] Connection refused'] * 3 + [
+        'Connection refused', 'Connection timeout']
+    assert store[0]['error'] is store[2]['error']
+    assert list(store.message_ids) == [1, 1, 1, 0, 0] and len(store._message_list) == 2
+    assert store.nbytes == len(store) * 19
+
+    for index in range(MAX_ERROR_MESSAGES + 10):
+        store.append(None, ErrorKind.OTHER, f"failure {index}")
+    assert len(store._message_list) == MAX_ERROR_MESSAGES + 1
+    assert store[-1]['error'] == 'Connection failed' and store[6]['error'] == 'failure 1'
+
+    merged = SampleStore()
+    merged.extend(store)
+    assert [sample['error'] for sample in merged] == [sample['error'] for sample in store]
+
+
+def test_store_is_an_order_of_magnitude_smaller():
+    """Columns use far less memory per sample than result dicts"""
+    tester = ant.AdvancedLatencyTester()
+    dicts = [tester._result_dict(float(i), ErrorKind.NONE, None) for i in range(1000)]
+    dict_bytes = sum(sys.getsizeof(d) + sys.getsizeof(d['timestamp']) + sys.getsizeof(d['latency_ms'])
+                     for d in dicts)
+
+    store = SampleStore()
+    for i in range(1000):
+        store.append(float(i))
+
+    assert store.nbytes * 10 <= dict_bytes
+    print(f"Per sample: dict {dict_bytes / 1000:.0f} B, columnar {store.nbytes / 1000:.0f} B")
+
+
+def test_engines_return_sample_store_and_export():
+    """Engine statistics hold a SampleStore that still exports to JSON"""
+    tester = ant.AdvancedLatencyTester()
+
+    with TCPStandInServer() as server:
+        stats = tester.perform_parallel_tests(*server.address, num_tests=10)
+    assert isinstance(stats['individual_results'], SampleStore)
+    assert all(r['success'] for r in stats['individual_results'])
+
+    tester.record_comprehensive_result('store_run', stats)
+    try:
+        tester.export_results_json("test_sample_store_export.json")
+        with open("test_sample_store_export.json") as f:
+            exported = json.load(f)
+        assert len(exported['test_results']['store_run']['individual_results']) == 10
+    finally:
+        os.remove("test_sample_store_export.json")
+
+
+def test_history_retention_cap():
+    """test_history and results keep only the configured number of runs"""
+    tester = ant.AdvancedLatencyTester(history_limit=3)
+    for i in range(5):
+        tester.record_comprehensive_result(f"run_{i}", tester.calculate_statistics([]))
+    assert [h['test_id'] for h in tester.test_history] == ['run_2', 'run_3', 'run_4']
+    assert list(tester.results) == ['run_2', 'run_3', 'run_4']
+    tester.record_comprehensive_result('run_2', tester.calculate_statistics([]))
+    assert list(tester.results) == ['run_3', 'run_4', 'run_2']
+
+
+if __name__ == "__main__":
+    test_sample_views_read_like_result_dicts()
+    test_append_result_round_trip()
+    test_error_classification()
+    test_original_error_text_is_kept_once()
+    test_store_is_an_order_of_magnitude_smaller()
+    test_engines_return_sample_store_and_export()
+    test_history_retention_cap()
+    print("\nAll sample store tests passed!")
@@ -0,0 +1,74 @@
+import Advanced_Network_Latency_Tester as ant
+from loopback_servers import HTTPStandInServer, TCPStandInServer, loopback_client_context
+
+
+def test_split_count():
+    """Probe counts are split into near-equal positive shards"""
+    assert ant._split_count(10, 3) == [4, 3, 3]
+    assert ant._split_count(2, 8) == [1, 1]
+    assert sum(ant._split_count(100001, 7)) == 100001
+
+
+def test_recorder_state_round_trip():
+    """Partial recorders merge to the same aggregates as one recorder"""
+    whole = ant.ProbeRecorder(keep_samples=False)
+    parts = [ant.ProbeRecorder(keep_samples=False) for _ in range(3)]
+    for i in range(300):
+        outcome = (1.0 + i % 17, ant.ErrorKind.NONE if i % 10 else ant.ErrorKind.TIMEOUT, None,
+                   {'connect': 0.5 + i % 5}, None)
+        whole.record(*outcome)
+        parts[i % 3].record(*outcome)
+
+    merged = ant.ProbeRecorder(keep_samples=False)
+    for part in parts:
+        merged.merge(ant.ProbeRecorder.from_state(part.to_state()))
+
+    assert merged.accumulator.total_tests == whole.accumulator.total_tests == 300
+    assert merged.accumulator.failed_tests == whole.accumulator.failed_tests == 30
+    assert abs(merged.accumulator.mean - whole.accumulator.mean) < 1e-9
+    assert abs(merged.accumulator.variance - whole.accumulator.variance) < 1e-9
+    assert merged.accumulator.percentile(0.99) == whole.accumulator.percentile(0.99)
+    assert merged.phase_accumulators['connect'].count == whole.phase_accumulators['connect'].count
+
+
+def test_process_engine_matches_statistics_shape():
+    """The process engine returns the calculate_statistics shape without per-probe results"""
+    tester = ant.AdvancedLatencyTester(processes=3, max_in_flight=50)
+
+    with TCPStandInServer() as server:
+        process_stats = tester.perform_parallel_tests(*server.address, num_tests=300, engine='process')
+        async_stats = tester.perform_parallel_tests(*server.address, num_tests=30, engine='async')
+
+    assert set(process_stats) == set(async_stats)
+    assert process_stats['total_tests'] == process_stats['successful_tests'] == 300
+    assert len(process_stats['individual_results']) == 0
+    assert process_stats['phase_statistics']['connect']['count'] == 300
+    print(f"Process engine: 300 probes, avg {process_stats['average_latency_ms']:.3f} ms")
+
+
+def test_sharded_targets():
+    """Every target gets its own statistics, including targets that fail"""
+    tester = ant.AdvancedLatencyTester(processes=4, max_in_flight=20,
+                                       ssl_context_factory=loopback_client_context)
+
+    with TCPStandInServer() as closed:
+        closed_port = closed.port
+    with HTTPStandInServer(tls=True) as web, TCPStandInServer() as plain:
+        stats = tester.perform_sharded_tests(
+            [('127.0.0.1', plain.port), ('127.0.0.1', closed_port)], num_tests=50, timeout=2)
+        https = tester.perform_sharded_tests([('localhost', web.port)], num_tests=8, probe='https')
+
+    assert stats[f"127.0.0.1:{plain.port}"]['successful_tests'] == 50
+    assert stats[f"127.0.0.1:{closed_port}"]['failed_tests'] == 50
+    web_stats = https[f"localhost:{web.port}"]
+    assert web_stats['successful_tests'] == 8
+    assert web_stats['phase_statistics']['ttfb']['count'] == 8
+    assert web_stats['tls_session_resumption']['handshakes'] == 8
+
+
+if __name__ == "__main__":
+    test_split_count()
+    test_recorder_state_round_trip()
+    test_process_engine_matches_statistics_shape()
+    test_sharded_targets()
+    print("\nAll sharded probing tests passed!")
@@ -0,0 +1,97 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import Advanced_Network_Latency_Tester as ant
+from loopback_servers import TCPStandInServer
+from shared_ring import SharedRingReader, SharedRingWriter
+
+# Follows the ring in a separate interpreter and checks every record it accepts
+# was written whole: the writer below stores i, i and 2 * i in one record
+READER_SCRIPT = textwrap.dedent("""
+    import json, sys
+    from shared_ring import SharedRingReader
+
+    reader = SharedRingReader(sys.argv[1])
+    cursor, seen, torn, missed, last = 0, 0, 0, 0, -1
+    while cursor < int(sys.argv[2]):
+        records, cursor, skipped = reader.read(cursor)
+        missed += skipped
+        for record in records:
+            seen += 1
+            torn += not (record.timestamp_ns == record.latency_ms and record.phases[0] == 2 * record.latency_ms)
+            torn += record.timestamp_ns <= last
+            last = record.timestamp_ns
+    reader.close()
+    print(json.dumps({'seen': seen, 'torn': torn, 'missed': missed}))
+""")
+
+
+def test_records_round_trip():
+    """Readers see targets, latencies, phases and failures in publication order"""
+    with SharedRingWriter(capacity=16) as writer:
+        writer.record_probe('a:80', 12.5, ant.ErrorKind.NONE, phases={'dns': 1.0, 'connect': 11.5})
+        writer.record_probe('b:443', float('inf'), ant.ErrorKind.TIMEOUT, 'Connection timeout')
+        writer.record_probe('a:80', None, ant.ErrorKind.REFUSED, 'Connection refused', timestamp_ns=5)
+        with SharedRingReader(writer.name) as reader:
+            records, cursor, missed = reader.read()
+            assert (cursor, missed) == (3, 0) and reader.sequence == 3
+            assert [record.target for record in records] == ['a:80', 'b:443', 'a:80']
+            assert records[0].to_dict()['connect_ms'] == 11.5 and records[0].latency_ms == 12.5
+            assert records[1].error_kind == ant.ErrorKind.TIMEOUT and records[1].latency_ms == float('inf')
+            assert records[2].latency_ms is None and records[2].timestamp_ns == 5
+            assert records[2].to_dict()['error'] == 'Connection refused'
+            assert reader.read(cursor) == ([], 3, 0)
+            assert [record.target for record in reader.latest(2)] == ['b:443', 'a:80']
+
+
+def test_slow_reader_is_told_what_it_missed():
+    """Records overwritten before a reader got to them are reported as missed"""
+    with SharedRingWriter(capacity=8) as writer, SharedRingReader(writer.name) as reader:
+        for index in range(20):
+            writer.record_probe('t:1', float(index), ant.ErrorKind.NONE)
+        records, cursor, missed = reader.read(0)
+        assert (cursor, missed) == (20, 12)
+        assert [record.latency_ms for record in records] == [float(index) for index in range(12, 20)]
+        records, cursor, missed = reader.read(15, limit=2)
+        assert [record.latency_ms for record in records] == [15.0, 16.0] and (cursor, missed) == (17, 0)
+
+
+def test_reader_process_never_sees_torn_records():
+    """A reader in another process only accepts whole records while the writer keeps going"""
+    total = 200000
+    with SharedRingWriter(capacity=1024) as writer:
+        environment = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+        reader = subprocess.Popen([sys.executable, '-c', READER_SCRIPT, writer.name, str(total)],
+                                  stdout=subprocess.PIPE, env=environment)
+        for index in range(total):
+            writer.record_probe('t:1', float(index), ant.ErrorKind.NONE, phases={'dns': 2.0 * index},
+                                timestamp_ns=index)
+        output, _ = reader.communicate(timeout=60)
+        result = json.loads(output)
+        assert result['torn'] == 0 and result['seen'] > 0
+        assert result['seen'] + result['missed'] == total, result
+        # The reader's exit left the block in place for later readers
+        with SharedRingReader(writer.name) as later:
+            assert later.sequence == total
+
+
+def test_probe_pipeline_publishes_to_the_ring():
+    """Attached as a listener, the writer receives every probe a tester runs"""
+    tester = ant.AdvancedLatencyTester()
+    with SharedRingWriter() as writer, SharedRingReader(writer.name) as reader, TCPStandInServer() as server:
+        tester.listeners.append(writer.record_probe)
+        tester.perform_parallel_tests('127.0.0.1', server.port, num_tests=25)
+        records, cursor, missed = reader.read()
+    assert cursor == 25 and missed == 0
+    assert all(record.target == f"127.0.0.1:{server.port}" and record.success for record in records)
+
+
+if __name__ == "__main__":
+    test_records_round_trip()
+    test_slow_reader_is_told_what_it_missed()
+    test_reader_process_never_sees_torn_records()
+    test_probe_pipeline_publishes_to_the_ring()
+    print("\nAll shared ring tests passed!")
@@ -0,0 +1,131 @@
+import random
+import statistics
+
+import Advanced_Network_Latency_Tester as ant
+from streaming_statistics import StreamingStatistics
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_moments_match_statistics_module():
+    """Welford mean/stdev and jitter match the list-based calculations"""
+    rng = random.Random(7)
+    latencies = [rng.lognormvariate(3, 0.5) for _ in range(5000)]
+
+    accumulator = StreamingStatistics()
+    for latency in latencies:
+        accumulator.add(latency)
+
+    differences = [abs(latencies[i] - latencies[i - 1]) for i in range(1, len(latencies))]
+    assert abs(accumulator.mean - statistics.mean(latencies)) < 1e-9
+    assert abs(accumulator.std_dev - statistics.stdev(latencies)) < 1e-9
+    assert abs(accumulator.jitter - statistics.mean(differences)) < 1e-9
+    assert accumulator.min == min(latencies) and accumulator.max == max(latencies)
+
+
+def test_percentiles_within_relative_accuracy():
+    """Histogram percentiles stay within 1% of the exact sample quantiles"""
+    rng = random.Random(11)
+    latencies = [rng.paretovariate(1.5) * 10 for _ in range(20000)]
+
+    accumulator = StreamingStatistics()
+    for latency in latencies:
+        accumulator.add(latency)
+
+    for q in (0.5, 0.9, 0.99, 0.999):
+        exact = exact_quantile(latencies, q)
+        assert abs(accumulator.percentile(q) - exact) <= exact * 0.0101
+
+
+def test_median_matches_statistics_median():
+    """Even-length runs report the interpolated median, exactly for small runs and within 1% otherwise"""
+    for latencies in ([50.0, 60.0], [10.0, 20.0, 30.0, 40.0], [1.0, 2.0, 3.0, 100.0]):
+        accumulator = StreamingStatistics()
+        for latency in latencies:
+            accumulator.add(latency)
+        assert accumulator.to_statistics()['median_latency_ms'] == statistics.median(latencies)
+    small = StreamingStatistics()
+    for latency in [1.0, 2.0, 3.0, 100.0]:
+        small.add(latency)
+    assert abs(small.percentile(0.99) - 97.09) < 1e-9
+
+    rng = random.Random(13)
+    latencies = [rng.lognormvariate(3, 0.5) for _ in range(1000)]
+    halves = [StreamingStatistics(), StreamingStatistics()]
+    for index, latency in enumerate(latencies):
+        halves[index % 2].add(latency)
+    merged = halves[0].merge(halves[1])
+    exact = statistics.median(latencies)
+    assert abs(merged.percentile(0.5) - exact) <= exact * 0.0101
+    assert abs(merged.histogram.quantile(0.5) - exact) <= exact * 0.0101
+
+
+def test_memory_is_bounded():
+    """Bucket count depends on the value range, not on the number of samples"""
+    rng = random.Random(3)
+    accumulator = StreamingStatistics()
+    for _ in range(100000):
+        accumulator.add(rng.uniform(0.01, 5000))
+    assert len(accumulator.histogram.buckets) < 1000
+
+
+def test_merge_equals_single_accumulator():
+    """Partial accumulators from different workers merge into the same totals"""
+    rng = random.Random(5)
+    results = [
+        {'success': rng.random() > 0.1, 'latency_ms': rng.uniform(1, 100)}
+        for _ in range(3000)
+    ]
+
+    combined = StreamingStatistics()
+    for result in results:
+        combined.add_result(result)
+
+    parts = [StreamingStatistics() for _ in range(3)]
+    for i, result in enumerate(results):
+        parts[i % 3].add_result(result)
+    merged = StreamingStatistics()
+    for part in parts:
+        merged.merge(StreamingStatistics.from_state(part.to_state()))
+
+    assert merged.total_tests == combined.total_tests
+    assert merged.failed_tests == combined.failed_tests
+    assert abs(merged.mean - combined.mean) < 1e-9
+    assert abs(merged.variance - combined.variance) < 1e-6
+    assert merged.histogram.buckets == combined.histogram.buckets
+
+
+def test_calculate_statistics_reports_percentiles():
+    """calculate_statistics keeps its keys and adds p50/p90/p99/p99.9"""
+    tester = ant.AdvancedLatencyTester()
+    test_results = [
+        {'success': True, 'latency_ms': 50.0, 'rtt_ms': 50.0, 'timestamp': '2023-01-01T00:00:00', 'error': None},
+        {'success': True, 'latency_ms': 60.0, 'rtt_ms': 60.0, 'timestamp': '2023-01-01T00:00:01', 'error': None},
+        {'success': False, 'latency_ms': None, 'rtt_ms': None, 'timestamp': '2023-01-01T00:00:02', 'error': 'Timeout'},
+        {'success': True, 'latency_ms': 55.0, 'rtt_ms': 55.0, 'timestamp': '2023-01-01T00:00:03', 'error': None}
+    ]
+
+    stats = tester.calculate_statistics(test_results)
+    assert stats['packet_loss_percentage'] == 25.0
+    assert stats['average_latency_ms'] == 55.0
+    assert stats['jitter_ms'] == 7.5
+    assert stats['std_dev_latency_ms'] == statistics.stdev([50.0, 60.0, 55.0])
+    assert stats['median_latency_ms'] == 55.0
+    assert 50.0 <= stats['p99_latency_ms'] <= 60.0
+    assert stats['individual_results'] is test_results
+
+    empty = tester.calculate_statistics([])
+    assert empty['total_tests'] == 0 and empty['p99_latency_ms'] == float('inf')
+
+
+if __name__ == "__main__":
+    test_moments_match_statistics_module()
+    test_percentiles_within_relative_accuracy()
+    test_median_matches_statistics_median()
+    test_memory_is_bounded()
+    test_merge_equals_single_accumulator()
+    test_calculate_statistics_reports_percentiles()
+    print("\nAll streaming statistics tests passed!")
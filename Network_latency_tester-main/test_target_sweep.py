@@ -0,0 +1,141 @@
+import os
+import socket
+import tempfile
+import tracemalloc
+
+import Advanced_Network_Latency_Tester as ant
+from loopback_servers import TCPStandInServer
+from target_sweep import iter_host_file, iter_hosts, iter_targets, parse_ports, verdict_for
+
+
+def _closed_port():
+    """Return a loopback port with nothing listening on it."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_port_and_host_expansion():
+    """Port lists, ranges and CIDR blocks expand in order"""
+    assert [list(r) for r in parse_ports('22, 80,8000-8002')] == [[22], [80], [8000, 8001, 8002]]
+    assert [list(r) for r in parse_ports([443, '8080-8081'])] == [[443], [8080, 8081]]
+    for bad in ('0', '70000', '90-80', ''):
+        try:
+            parse_ports(bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"{bad!r} was accepted")
+
+    hosts = list(iter_hosts(['192.0.2.0/30', 'example.com', '', '# comment', '2001:db8::/127']))
+    assert hosts == ['192.0.2.1', '192.0.2.2', 'example.com', '2001:db8::', '2001:db8::1']
+    assert list(iter_targets(['a', 'b'], '1,5-6')) == [('a', 1), ('a', 5), ('a', 6), ('b', 1), ('b', 5), ('b', 6)]
+
+
+def test_expansion_is_lazy():
+    """A /8 block times every port is expanded one target at a time"""
+    targets = iter_targets(iter_hosts(['10.0.0.0/8']), '1-65535')
+    assert next(targets) == ('10.0.0.1', 1)
+    assert next(targets) == ('10.0.0.1', 2)
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'hosts.txt')
+        with open(filename, 'w') as file:
+            file.write("# sweep list\nexample.com\n198.51.100.0/31  # lab\n\n")
+        assert list(iter_host_file(filename)) == ['example.com', '198.51.100.0', '198.51.100.1']
+
+
+def test_verdicts():
+    """Error kinds map to reachable, refused, filtered or error"""
+    assert verdict_for(ant.ErrorKind.NONE) == 'reachable'
+    assert verdict_for(ant.ErrorKind.REFUSED) == 'refused'
+    assert verdict_for(ant.ErrorKind.RESET) == 'refused'
+    assert verdict_for(ant.ErrorKind.TIMEOUT) == 'filtered'
+    assert verdict_for(ant.ErrorKind.UNREACHABLE) == 'filtered'
+    assert verdict_for(ant.ErrorKind.CIRCUIT_OPEN) == 'filtered'
+    assert verdict_for(ant.ErrorKind.RESOLUTION) == 'error'
+
+
+def test_sweep_streams_per_target_verdicts():
+    """Each target gets one streamed result and probes reach the listeners"""
+    tester = ant.AdvancedLatencyTester()
+    probed = []
+    tester.listeners.append(lambda target, *outcome: probed.append(target))
+    results = {}
+
+    with TCPStandInServer() as server:
+        closed = _closed_port()
+        targets = iter_targets(['127.0.0.1'], [server.port, closed])
+        targets = iter(list(targets) + [('nonexistent.invalid', 80)])
+        summary = tester.perform_sweep(targets, timeout=1, probes_per_target=2,
+                                       on_result=lambda result: results.setdefault(result.target, result))
+
+    assert summary['targets'] == 3 and summary['reachable'] == 1
+    assert summary['refused'] == 1 and summary['error'] == 1 and summary['filtered'] == 0
+    assert len(results) == 3
+    reachable = results[f"127.0.0.1:{server.port}"]
+    assert reachable.verdict == 'reachable' and 0 < reachable.latency_ms < 1000 and reachable.probes == 2
+    assert results[f"127.0.0.1:{closed}"].verdict == 'refused'
+    assert results[f"127.0.0.1:{closed}"].latency_ms is None
+    assert results['nonexistent.invalid:80'].verdict == 'error'
+    assert len(probed) == 6
+
+
+def test_sweep_holds_bounded_work():
+    """Targets are pulled as workers free up and memory does not grow with the sweep size"""
+    tester = ant.AdvancedLatencyTester(keep_individual_results=False)
+    closed = _closed_port()
+    pulled = 0
+
+    def counted(targets):
+        nonlocal pulled
+        for target in targets:
+            pulled += 1
+            yield target
+
+    in_flight_at_first_result = []
+
+    def first_result(result):
+        if not in_flight_at_first_result:
+            in_flight_at_first_result.append(pulled)
+
+    tester.perform_sweep(counted(iter_targets(iter_hosts(['127.0.0.0/24']), closed)), max_in_flight=16,
+                         on_result=first_result)
+    assert pulled == 254
+    assert in_flight_at_first_result[0] <= 17
+
+    def peak_memory(cidr):
+        tracemalloc.start()
+        try:
+            summary = tester.perform_sweep(iter_targets(iter_hosts([cidr]), closed), max_in_flight=32)
+            return summary['targets'], tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    peak_memory('127.1.0.0/28')  # warm up
+    small_count, small_peak = peak_memory('127.2.0.0/25')
+    large_count, large_peak = peak_memory('127.3.0.0/21')
+    assert (small_count, large_count) == (126, 2046)
+    assert large_peak < small_peak * 1.5 + 64 * 1024, (small_peak, large_peak)
+
+
+
+def test_tls_sessions_are_bounded():
+    """Resumable TLS sessions are kept for at most MAX_TLS_SESSIONS targets, least recently used out first"""
+    tester = ant.AdvancedLatencyTester(tls_session_reuse=True)
+    tester._remember_tls_session('busy', 443, 'first')
+    for host in range(ant.MAX_TLS_SESSIONS + 10):
+        tester._remember_tls_session(f"10.{host >> 16}.{host >> 8 & 255}.{host & 255}", 443, host)
+        if host % 1000 == 0:
+            tester._remember_tls_session('busy', 443, 'latest')
+    assert len(tester._tls_sessions) == ant.MAX_TLS_SESSIONS
+    assert tester._tls_sessions[('busy', 443)] == 'latest' and ('10.0.0.0', 443) not in tester._tls_sessions
+
+if __name__ == "__main__":
+    test_port_and_host_expansion()
+    test_expansion_is_lazy()
+    test_verdicts()
+    test_sweep_streams_per_target_verdicts()
+    test_sweep_holds_bounded_work()
+    test_tls_sessions_are_bounded()
+    print("\nAll target sweep tests passed!")
@@ -0,0 +1,84 @@
+import asyncio
+import socket
+import time
+
+import Advanced_Network_Latency_Tester as ant
+from tcp_echo import FRAME, MAGIC, TCPEchoResponder
+
+
+def _closed_port():
+    """Return a loopback port with nothing listening on it."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_echo_reuses_persistent_connections():
+    """Every sample is echoed and later runs reuse the same connections"""
+    tester = ant.AdvancedLatencyTester()
+    probed = []
+    tester.listeners.append(lambda target, *outcome: probed.append(target))
+
+    with TCPEchoResponder() as responder:
+        first = tester.perform_echo_tests('127.0.0.1', responder.port, num_tests=500, connections=3)
+        second = tester.perform_echo_tests('127.0.0.1', responder.port, num_tests=500, connections=3)
+        accepted = responder.connections_accepted
+        echoed = responder.bytes_echoed
+    tester.close_echo_connections()
+
+    for stats in (first, second):
+        assert stats['successful_tests'] == 500 and stats['failed_tests'] == 0
+        assert 0 < stats['min_latency_ms'] < 1000
+        assert stats['echo']['connections'] == 3 and stats['echo']['connections_replaced'] == 0
+    assert first['echo']['connections_opened'] == 3
+    assert second['echo']['connections_opened'] == 0
+    assert accepted == 3
+    assert echoed == 1000 * FRAME.size and FRAME.unpack(FRAME.pack(MAGIC, 7, 1))[:2] == (MAGIC, 7)
+    assert len(probed) == 1000 and set(probed) == {f"127.0.0.1:{responder.port}"}
+
+
+def test_echo_samples_faster_than_fresh_connects():
+    """Echo samples over open connections outpace a handshake per sample"""
+    tester = ant.AdvancedLatencyTester(keep_individual_results=False)
+    with TCPEchoResponder() as responder:
+        echo = tester.perform_echo_tests('127.0.0.1', responder.port, num_tests=2000, connections=4)
+        start = time.perf_counter()
+        connect = asyncio.run(tester.perform_async_tests('127.0.0.1', responder.port, num_tests=2000,
+                                                         max_in_flight=4))
+        connect_rate = 2000 / (time.perf_counter() - start)
+    tester.close_echo_connections()
+
+    assert echo['successful_tests'] == 2000 and connect['successful_tests'] == 2000
+    assert echo['echo']['samples_per_second'] > connect_rate, (echo['echo'], connect_rate)
+
+
+def test_failed_echo_replaces_the_connection():
+    """A timed-out echo is recorded as a timeout and its connection is never reused"""
+    tester = ant.AdvancedLatencyTester()
+    with TCPEchoResponder(delay=0.3) as responder:
+        stats = tester.perform_echo_tests('127.0.0.1', responder.port, num_tests=4, timeout=0.05,
+                                          connections=2)
+    tester.close_echo_connections()
+
+    assert stats['successful_tests'] == 0 and stats['failed_tests'] == 4
+    error_kinds = [result.error_kind for result in stats['individual_results']]
+    assert error_kinds == [ant.ErrorKind.TIMEOUT] * 4
+    assert stats['echo']['connections_opened'] == 4 and stats['echo']['connections_replaced'] == 4
+    assert stats['echo']['connections'] == 0
+
+
+def test_echo_without_responder_is_refused():
+    """Connection failures are classified like connect probes"""
+    tester = ant.AdvancedLatencyTester()
+    stats = tester.perform_echo_tests('127.0.0.1', _closed_port(), num_tests=3, timeout=1, connections=2)
+    assert stats['failed_tests'] == 3
+    assert [result.error_kind for result in stats['individual_results']] == [ant.ErrorKind.REFUSED] * 3
+    assert stats['echo']['connections_opened'] == 0
+
+
+if __name__ == "__main__":
+    test_echo_reuses_persistent_connections()
+    test_echo_samples_faster_than_fresh_connects()
+    test_failed_echo_replaces_the_connection()
+    test_echo_without_responder_is_refused()
+    print("\nAll TCP echo tests passed!")
@@ -0,0 +1,67 @@
+import Advanced_Network_Latency_Tester as ant
+from udp_probe import UDPEchoResponder, _Jitter
+
+
+def test_rfc3550_jitter():
+    """Jitter follows J += (|D| - J) / 16 on transit time differences"""
+    jitter = _Jitter()
+    for transit in (100, 110, 100, 110):
+        jitter.add(transit)
+    expected = 0.0
+    for _ in range(3):
+        expected += (10 - expected) / 16
+    assert abs(jitter.value - expected) < 1e-12
+
+
+def test_udp_probe_clean_path():
+    """Every packet is echoed on loopback and results use the usual statistics shape"""
+    tester = ant.AdvancedLatencyTester()
+
+    with UDPEchoResponder() as responder:
+        stats = tester.perform_udp_tests(*responder.address, rate=5000, duration=0.4, drain_timeout=0.5)
+
+    udp = stats['udp']
+    assert udp['packets_sent'] == 2000 and udp['packets_received'] == 2000
+    assert udp['duplicates'] == 0 and udp['reordered'] == 0
+    assert stats['total_tests'] == 2000 and stats['packet_loss_percentage'] == 0
+    assert len(stats['individual_results']) == 2000
+    assert udp['interarrival_jitter_ms'] >= 0 and udp['forward_jitter_ms'] >= 0
+    assert 0 < stats['average_latency_ms'] < 100
+
+
+def test_udp_probe_counts_injected_faults():
+    """Loss, duplicates and reordering match what the responder injected"""
+    tester = ant.AdvancedLatencyTester(keep_individual_results=False)
+
+    with UDPEchoResponder(drop_rate=0.05, duplicate_rate=0.02, reorder_rate=0.03, seed=4) as responder:
+        stats = tester.perform_udp_tests(*responder.address, rate=5000, duration=0.6, drain_timeout=0.5)
+
+    udp = stats['udp']
+    # A packet held for reordering at the very end of the stream is never released
+    assert responder.packets_dropped <= udp['packets_lost'] <= responder.packets_dropped + 1
+    assert udp['duplicates'] == responder.packets_duplicated
+    assert responder.packets_reordered - 1 <= udp['reordered'] <= responder.packets_reordered
+    assert stats['failed_tests'] == udp['packets_lost']
+    assert abs(stats['packet_loss_percentage'] - udp['loss_percentage']) < 1e-9
+
+
+def test_udp_probe_sustains_high_rates():
+    """Tens of thousands of packets per second go through one socket and thread"""
+    tester = ant.AdvancedLatencyTester(keep_individual_results=False)
+
+    with UDPEchoResponder() as responder:
+        stats = tester.perform_udp_tests(*responder.address, rate=20000, duration=0.5, drain_timeout=0.5)
+
+    udp = stats['udp']
+    assert udp['packets_sent'] == 10000
+    assert udp['achieved_rate'] > 15000
+    assert udp['loss_percentage'] < 1
+    print(f"UDP probe: {udp['achieved_rate']:.0f} packets/s, {udp['loss_percentage']:.2f}% loss")
+
+
+if __name__ == "__main__":
+    test_rfc3550_jitter()
+    test_udp_probe_clean_path()
+    test_udp_probe_counts_injected_faults()
+    test_udp_probe_sustains_high_rates()
+    print("\nAll UDP probe tests passed!")
@@ -0,0 +1,311 @@
+"""
+UDP probing with sequence-numbered, timestamped datagrams.
+
+UDPProber sends packets from one non-blocking socket in small batches paced
+to the requested rate, and drains the echoes between batches on the same
+thread, so tens of thousands of packets per second need no extra threads.
+Each packet carries a sequence number and the sender's send time; the
+UDPEchoResponder adds its own receive time before echoing it. From the
+echoes the prober reports:
+
+* true loss (packets never echoed), duplicates and reordered arrivals
+* round-trip times
+* RFC 3550 interarrival jitter for the round trip and for each direction.
+  One-way jitter only uses differences between consecutive packets, so the
+  unknown clock offset between the two hosts cancels out.
+
+Run a responder on the far end with:
+
+    python udp_probe.py --serve --host 0.0.0.0 --port 9000
+"""
+import random
+import select
+import socket
+import struct
+import threading
+import time
+
+MAGIC = b'NLTU'
+# magic, sequence number, sender send time (ns), responder receive time (ns)
+PACKET = struct.Struct('!4sQqq')
+SOCKET_BUFFER = 4 * 1024 * 1024
+
+
+class UDPEchoResponder:
+    def __init__(self, host='127.0.0.1', port=0, drop_rate=0, duplicate_rate=0, reorder_rate=0, seed=None):
+        """
+        Args:
+            host (str): Address to bind
+            port (int): Port to bind (0 picks an ephemeral port)
+            drop_rate (float): Fraction of probe packets silently dropped (for tests)
+            duplicate_rate (float): Fraction of probe packets echoed twice
+            reorder_rate (float): Fraction of probe packets held back and echoed
+                after the next one
+            seed (int): Seed for the injected faults
+        """
+        self.host = host
+        self.port = port
+        self.drop_rate = drop_rate
+        self.duplicate_rate = duplicate_rate
+        self.reorder_rate = reorder_rate
+        self.packets_echoed = 0
+        self.packets_dropped = 0
+        self.packets_duplicated = 0
+        self.packets_reordered = 0
+        self._random = random.Random(seed)
+        self._socket = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def address(self):
+        return self.host, self.port
+
+    def start(self):
+        """Bind the socket and echo on a daemon thread."""
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        self._socket = socket.socket(family, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+        self._socket.bind((self.host, self.port))
+        self.port = self._socket.getsockname()[1]
+        self._socket.settimeout(0.1)
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._socket is not None:
+            self._socket.close()
+
+    def serve_forever(self):
+        """Echo on the calling thread until interrupted."""
+        self.start()
+        try:
+            while self._thread.is_alive():
+                self._thread.join(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _serve(self):
+        held = None
+        faults = self.drop_rate or self.duplicate_rate or self.reorder_rate
+        while not self._stop_event.is_set():
+            try:
+                data, peer = self._socket.recvfrom(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if len(data) < PACKET.size or data[:4] != MAGIC:
+                continue
+            received_ns = time.perf_counter_ns()
+            packet = bytearray(data)
+            struct.pack_into('!q', packet, PACKET.size - 8, received_ns)
+            copies = 1
+            if faults:
+                roll = self._random.random()
+                if roll < self.drop_rate:
+                    self.packets_dropped += 1
+                    continue
+                if roll < self.drop_rate + self.duplicate_rate:
+                    self.packets_duplicated += 1
+                    copies = 2
+                elif held is None and roll < self.drop_rate + self.duplicate_rate + self.reorder_rate:
+                    self.packets_reordered += 1
+                    held = (packet, peer)
+                    continue
+            try:
+                for _ in range(copies):
+                    self._socket.sendto(packet, peer)
+                    self.packets_echoed += 1
+                if held is not None:
+                    self._socket.sendto(*held)
+                    self.packets_echoed += 1
+                    held = None
+            except OSError:
+                continue
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class _Jitter:
+    """RFC 3550 interarrival jitter estimator: J += (|D(i-1, i)| - J) / 16."""
+
+    __slots__ = ('value', '_last_transit')
+
+    def __init__(self):
+        self.value = 0.0
+        self._last_transit = None
+
+    def add(self, transit_ns):
+        if self._last_transit is not None:
+            self.value += (abs(transit_ns - self._last_transit) - self.value) / 16
+        self._last_transit = transit_ns
+
+
+class UDPProber:
+    def __init__(self, address, family=socket.AF_INET, payload_size=64, batch_interval=0.001,
+                 drain_timeout=1.0):
+        """
+        Args:
+            address (tuple): Responder socket address
+            family (int): Address family of ``address``
+            payload_size (int): Datagram size in bytes (at least PACKET.size)
+            batch_interval (float): Seconds between send batches
+            drain_timeout (float): Seconds to wait for late echoes after the last send
+        """
+        self.address = address
+        self.family = family
+        self.payload_size = max(payload_size, PACKET.size)
+        self.batch_interval = batch_interval
+        self.drain_timeout = drain_timeout
+        self.packets_sent = 0
+        self.packets_received = 0  # unique sequence numbers echoed
+        self.duplicates = 0
+        self.reordered = 0
+        self.send_errors = 0
+        self.rtt_jitter = _Jitter()
+        self.forward_jitter = _Jitter()
+        self.reverse_jitter = _Jitter()
+        self.send_duration_s = 0.0
+        self._seen = bytearray()
+        self._highest = -1
+
+    def run(self, rate, duration, on_reply=None):
+        """
+        Send ``rate * duration`` packets at ``rate`` per second and collect echoes.
+
+        Args:
+            rate (float): Packets per second
+            duration (float): Seconds to keep sending
+            on_reply (callable): Called as ``on_reply(sequence, rtt_ms)`` for
+                every first echo of a packet, in arrival order
+
+        Returns:
+            bytearray: One flag per sequence number, non-zero when it was echoed
+        """
+        if rate <= 0 or duration <= 0:
+            raise ValueError("rate and duration must be positive")
+        total = max(1, int(rate * duration))
+        self._seen = bytearray(total)
+        payload = bytearray(self.payload_size)
+        sock = socket.socket(self.family, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+            sock.connect(self.address)
+            sock.setblocking(False)
+
+            start_ns = time.perf_counter_ns()
+            interval_ns = 1e9 / rate
+            while self.packets_sent < total:
+                # Send every packet that is due by now, then read echoes until the next batch
+                due = min(total, int((time.perf_counter_ns() - start_ns) / interval_ns) + 1)
+                while self.packets_sent < due:
+                    PACKET.pack_into(payload, 0, MAGIC, self.packets_sent, time.perf_counter_ns(), 0)
+                    try:
+                        sock.send(payload)
+                    except BlockingIOError:
+                        break  # send buffer full; retry in the next batch
+                    except OSError:
+                        self.send_errors += 1
+                    self.packets_sent += 1
+                self._receive(sock, on_reply)
+                next_ns = start_ns + self.packets_sent * interval_ns
+                wait = max(0.0, min(self.batch_interval, (next_ns - time.perf_counter_ns()) / 1e9))
+                if wait:
+                    select.select([sock], [], [], wait)
+            self.send_duration_s = (time.perf_counter_ns() - start_ns) / 1e9
+
+            deadline = time.perf_counter() + self.drain_timeout
+            while self.packets_received < total:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                if select.select([sock], [], [], remaining)[0]:
+                    self._receive(sock, on_reply)
+        finally:
+            sock.close()
+        return self._seen
+
+    def _receive(self, sock, on_reply):
+        while True:
+            try:
+                data = sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return  # e.g. ICMP port unreachable reported on the connected socket
+            received_ns = time.perf_counter_ns()
+            if len(data) < PACKET.size:
+                continue
+            magic, sequence, sent_ns, responder_ns = PACKET.unpack_from(data)
+            if magic != MAGIC or sequence >= len(self._seen):
+                continue
+            if self._seen[sequence]:
+                self.duplicates += 1
+                continue
+            self._seen[sequence] = 1
+            self.packets_received += 1
+            if sequence < self._highest:
+                self.reordered += 1
+            else:
+                self._highest = sequence
+            self.rtt_jitter.add(received_ns - sent_ns)
+            self.forward_jitter.add(responder_ns - sent_ns)
+            self.reverse_jitter.add(received_ns - responder_ns)
+            if on_reply is not None:
+                on_reply(sequence, (received_ns - sent_ns) / 1e6)
+
+    def summary(self, requested_rate=None):
+        """
+        Packet-level results of the last run.
+
+        Returns:
+            dict: Sent/received/lost/duplicate/reordered counts, loss
+            percentage, RFC 3550 jitter values in ms and send rates
+        """
+        lost = self.packets_sent - self.packets_received
+        return {
+            'packets_sent': self.packets_sent,
+            'packets_received': self.packets_received,
+            'packets_lost': lost,
+            'loss_percentage': lost / self.packets_sent * 100 if self.packets_sent else 0,
+            'duplicates': self.duplicates,
+            'reordered': self.reordered,
+            'send_errors': self.send_errors,
+            'interarrival_jitter_ms': self.rtt_jitter.value / 1e6,
+            'forward_jitter_ms': self.forward_jitter.value / 1e6,
+            'reverse_jitter_ms': self.reverse_jitter.value / 1e6,
+            'requested_rate': requested_rate,
+            'achieved_rate': self.packets_sent / self.send_duration_s if self.send_duration_s else 0,
+        }
+
+
+def main(argv=None):
+    """Run a UDP echo responder for UDPProber."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="UDP echo responder for latency probes")
+    parser.add_argument('--serve', action='store_true', required=True, help="Run the echo responder")
+    parser.add_argument('--host', default='0.0.0.0', help="Address to bind")
+    parser.add_argument('--port', type=int, default=9000, help="Port to bind")
+    args = parser.parse_args(argv)
+
+    responder = UDPEchoResponder(args.host, args.port)
+    print(f"UDP echo responder on {args.host}:{args.port} (Ctrl+C to stop)")
+    responder.serve_forever()
+
+
+if __name__ == "__main__":
+    main()